@@ -1,8 +1,25 @@
 import otis_dds.communicator
 import otis_dds.security_system_adapter
 import secusys_acs.client 
+import metrics.registry
+import metrics.exporter
+import metrics.tracing
+import metrics.profiler
+import metrics.control
+import replication
 import logging
 import configparser
+import collections
+import concurrent.futures
+import contextvars
+import threading
+import functools
+import time
+import typing
+import queue
+import sqlite3
+import json
+import math
 import ipaddress
 import os 
 import sys
@@ -13,6 +30,361 @@ class Bridge:
     __CONFIG_SECTION_DDS = 'DDS'
     __CONFIG_SECTION_ACS = 'ACS'
     __CONFIG_SECTION_LOGGER = 'Logger'
+    __CONFIG_SECTION_REPLICATION = 'Replication'
+    __CONFIG_SECTION_SITES = 'Sites'
+    __DEFAULT_SITE_NAME = 'default'
+    __CONFIG_SECTION_METRICS = 'Metrics'
+    __SECUSYS_CONNECT_RETRY_INTERVAL = 5.0
+
+#-----------------------------------------------------------------------------------------------------------------------
+    class _DebugRateLimitFilter(logging.Filter):
+
+        def __init__(self, logger, maxPerSecond):
+            """ C'tor, debug records above the rate are dropped and the amount dropped is reported once logging resumes
+            Params:
+                logger: Python logging interface the filter is attached to
+                maxPerSecond: Maximum debug records per second, bursts of up to a second worth of records are allowed
+            """
+            super().__init__()
+            self.__logger = logger
+            self.__maxPerSecond = maxPerSecond
+            self.__tokens = float(maxPerSecond)
+            self.__lastTime = time.monotonic()
+            self.__dropped = 0
+            self.__lastReportTime = 0.0
+            self.__lock = threading.Lock()
+
+        def filter(self, record):
+            if record.levelno > logging.DEBUG:
+                return True
+
+            with self.__lock:
+                now = time.monotonic()
+                self.__tokens = min(self.__maxPerSecond, self.__tokens + (now - self.__lastTime) * self.__maxPerSecond)
+                self.__lastTime = now
+
+                if self.__tokens < 1.0:
+                    self.__dropped = self.__dropped + 1
+                    return False
+
+                self.__tokens = self.__tokens - 1.0
+                dropped = 0
+
+                # Report drops at most once a second so the report doesn't add to the load
+                if self.__dropped > 0 and now - self.__lastReportTime >= 1.0:
+                    dropped = self.__dropped
+                    self.__dropped = 0
+                    self.__lastReportTime = now
+
+            if dropped > 0:
+                self.__logger.warning("Debug logging rate limit was reached, records were dropped: dropped=%s " + 
+                                      "maxPerSecond=%s", dropped, self.__maxPerSecond)
+
+            return True
+
+#-----------------------------------------------------------------------------------------------------------------------
+    class _ExpiringCache:
+
+        def __init__(self, maxSize, ttl = 0.0):
+            """ C'tor
+            Params:
+                maxSize: Maximum amount of entries, least recently updated entries are evicted first
+                ttl: Seconds an entry is valid for, 0 for no expiry
+            """
+            self.__maxSize = maxSize
+            self.__ttl = ttl
+            self.__entries = collections.OrderedDict()
+            self.__lock = threading.Lock()
+            self.__sinks = []
+            self.__hits = 0
+            self.__misses = 0
+
+        @property
+        def hits(self):
+            return self.__hits
+
+        @property
+        def misses(self):
+            return self.__misses
+
+        def attachStore(self, store, storeName, encode, decode):
+            """ Load persisted entries from a store and persist every following update to it
+            Params:
+                store: _PersistentStore to load from and write to
+                storeName: Name of this cache within the store
+                encode: Function converting a value to a JSON serializable object
+                decode: Function converting a JSON deserialized object back to a value
+            """
+            # Attached first so updates done while loading are persisted too, and kept over older persisted entries
+            self.attachSink(store, storeName, encode)
+
+            return self.load(store.load(storeName), decode, overwrite = False)
+
+        def attachSink(self, sink, sinkName, encode):
+            """ Forward every following update to a sink
+            Params:
+                sink: Object implementing put(sinkName, key, value) and remove(sinkName, key)
+                sinkName: Name of this cache within the sink
+                encode: Function converting a value to a JSON serializable object
+            """
+            self.__sinks.append((sink, sinkName, encode))
+
+        def load(self, entries, decode, overwrite = True):
+            """ Load entries without forwarding them to sinks
+            Params:
+                entries: List of (key, value, age in seconds) sorted from oldest to newest
+                decode: Function converting a JSON deserialized object back to a value
+                overwrite: Whether loaded entries replace existing ones
+            Return: Amount of entries loaded, expired and skipped ones are not counted
+            """
+            loaded = 0
+
+            for key, value, age in entries:
+                if self.__ttl <= 0 or age <= self.__ttl:
+                    if self.__put(key, decode(value), time.monotonic() - age, overwrite) is not False:
+                        loaded = loaded + 1
+
+            return loaded
+
+        def entries(self, encode):
+            """ Get all entries as expected by load
+            Params:
+                encode: Function converting a value to a JSON serializable object
+            Return: List of (key, value, age in seconds) sorted from oldest to newest
+            """
+            with self.__lock:
+                entries = list(self.__entries.items())
+
+            now = time.monotonic()
+
+            return [(key, encode(value), now - updateTime) for key, (value, updateTime) in entries
+                    if self.__ttl <= 0 or now - updateTime <= self.__ttl]
+
+        def get(self, key):
+            """ Get a value, counted as a cache hit or miss
+            Return: Value if exists and not expired | None
+            """
+            with self.__lock:
+                value = self.__get(key)
+
+                if value is None:
+                    self.__misses = self.__misses + 1
+                else:
+                    self.__hits = self.__hits + 1
+
+                return value
+
+        def peek(self, key):
+            """ Get a value without counting it as a cache hit or miss
+            Return: Value if exists and not expired | None
+            """
+            with self.__lock:
+                return self.__get(key)
+
+        def __get(self, key):
+            entry = self.__entries.get(key, None)
+
+            if entry is None:
+                return None
+
+            if self.__ttl > 0 and time.monotonic() - entry[1] > self.__ttl:
+                del self.__entries[key]
+                return None
+
+            return entry[0]
+
+        def put(self, key, value):
+            evictedKey = self.__put(key, value, time.monotonic())
+
+            for sink, sinkName, encode in self.__sinks:
+                sink.put(sinkName, key, encode(value))
+
+                if evictedKey is not None:
+                    sink.remove(sinkName, evictedKey)
+
+        def remove(self, key):
+            with self.__lock:
+                isRemoved = self.__entries.pop(key, None) is not None
+
+            if isRemoved:
+                for sink, sinkName, _ in self.__sinks:
+                    sink.remove(sinkName, key)
+
+        def __put(self, key, value, updateTime, overwrite = True):
+            # Returns the evicted key if any, False if not put as the key exists and overwrite is not set
+            with self.__lock:
+                if not overwrite and key in self.__entries:
+                    return False
+
+                self.__entries[key] = (value, updateTime)
+                self.__entries.move_to_end(key)
+
+                if len(self.__entries) > self.__maxSize:
+                    return self.__entries.popitem(False)[0]
+
+            return None
+
+#-----------------------------------------------------------------------------------------------------------------------
+    class _PersistentStore:
+
+        __WRITE_BATCH_SIZE = 512
+
+        def __init__(self, logger, filePath, ttl):
+            """ C'tor, prunes expired entries and starts the background writer
+            Params:
+                logger: Python logging interface
+                filePath: SQLite database file path
+                ttl: Seconds a persisted entry is kept for
+            """
+            self.__logger = logger
+            self.__filePath = filePath
+            self.__ttl = ttl
+            self.__queue = queue.Queue()
+
+            connection = self.__connect()
+
+            try:
+                connection.execute("CREATE TABLE IF NOT EXISTS entries (cache TEXT NOT NULL, key INTEGER NOT NULL, " +
+                                   "value TEXT NOT NULL, updated REAL NOT NULL, PRIMARY KEY (cache, key))")
+                pruned = connection.execute("DELETE FROM entries WHERE updated < ?", (time.time() - self.__ttl,)).rowcount
+                connection.commit()
+
+            finally:
+                connection.close()
+
+            self.__logger.info("Opened persistent cache: filePath=%s prunedEntries=%s", filePath, pruned)
+
+            self.__writer = threading.Thread(target = self.__writerLoop, daemon = True, name = "PersistentStoreWriter")
+            self.__writer.start()
+
+        def load(self, cacheName):
+            """ Load a cache persisted entries
+            Return: List of (key, value, age in seconds) sorted from oldest to newest
+            """
+            connection = self.__connect()
+
+            try:
+                now = time.time()
+                rows = connection.execute("SELECT key, value, updated FROM entries WHERE cache = ? AND updated >= ? " +
+                                          "ORDER BY updated", (cacheName, now - self.__ttl)).fetchall()
+            finally:
+                connection.close()
+
+            return [(key, json.loads(value), max(0.0, now - updated)) for key, value, updated in rows]
+
+        def put(self, cacheName, key, value):
+            self.__queue.put((cacheName, key, json.dumps(value), time.time()))
+
+        def remove(self, cacheName, key):
+            self.__queue.put((cacheName, key, None, None))
+
+        def close(self):
+            """ Flush pending writes and stop the background writer
+            """
+            self.__queue.put(None)
+            self.__writer.join()
+
+        def __connect(self):
+            connection = sqlite3.connect(self.__filePath)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+
+            return connection
+
+        def __writerLoop(self):
+            connection = self.__connect()
+            isRunning = True
+
+            while isRunning:
+                batch = [self.__queue.get()]
+
+                # Drain whatever is pending so a burst is written in a single transaction
+                while len(batch) < self.__WRITE_BATCH_SIZE:
+                    try:
+                        batch.append(self.__queue.get_nowait())
+                    except queue.Empty:
+                        break
+
+                try:
+                    for item in batch:
+                        if item is None:
+                            isRunning = False
+
+                        elif item[2] is None:
+                            connection.execute("DELETE FROM entries WHERE cache = ? AND key = ?", item[:2])
+
+                        else:
+                            connection.execute("INSERT OR REPLACE INTO entries (cache, key, value, updated) " +
+                                               "VALUES (?, ?, ?, ?)", item)
+
+                    connection.commit()
+
+                except Exception:
+                    self.__logger.exception("Failed writing persistent cache entries: count=%s", len(batch))
+
+            connection.close()
+
+#-----------------------------------------------------------------------------------------------------------------------
+    class _Site(typing.NamedTuple):
+        ddsAdapter      : object # SecuritySystemAdapterInterface the site communicator looks up through
+        ddsCommunicator : object
+
+#-----------------------------------------------------------------------------------------------------------------------
+    class _BloomFilter:
+
+        __HASH_MASK = 0xffffffffffffffff
+
+        def __init__(self, sizeBits, expectedItems):
+            """ C'tor
+            Params:
+                sizeBits: Filter size in bits
+                expectedItems: Expected amount of items, used to pick the amount of hash functions
+            """
+            self.__sizeBits = sizeBits
+            self.__bits = bytearray((sizeBits + 7) // 8)
+            self.__hashCount = max(1, min(16, round(sizeBits / max(1, expectedItems) * math.log(2))))
+            self.__setBitsCount = 0
+            self.__itemsCount = 0
+
+        @property
+        def itemsCount(self):
+            return self.__itemsCount
+
+        @property
+        def estimatedFalsePositiveRate(self):
+            """ False positive rate as estimated from the filter fill ratio
+            """
+            return (self.__setBitsCount / self.__sizeBits) ** self.__hashCount
+
+        def add(self, key):
+            for position in self.__positions(key):
+                mask = 1 << (position & 7)
+
+                if not self.__bits[position >> 3] & mask:
+                    self.__bits[position >> 3] |= mask
+                    self.__setBitsCount = self.__setBitsCount + 1
+
+            self.__itemsCount = self.__itemsCount + 1
+
+        def __contains__(self, key):
+            bits = self.__bits
+
+            for position in self.__positions(key):
+                if not bits[position >> 3] & (1 << (position & 7)):
+                    return False
+
+            return True
+
+        def __positions(self, key):
+            # Double hashing over the two halves of a SplitMix64 finalized key, card numbers are mostly sequential
+            mixed = (key + 0x9e3779b97f4a7c15) & self.__HASH_MASK
+            mixed = ((mixed ^ (mixed >> 30)) * 0xbf58476d1ce4e5b9) & self.__HASH_MASK
+            mixed = ((mixed ^ (mixed >> 27)) * 0x94d049bb133111eb) & self.__HASH_MASK
+            mixed = mixed ^ (mixed >> 31)
+            firstHash = mixed & 0xffffffff
+            secondHash = (mixed >> 32) | 1
+
+            return [(firstHash + i * secondHash) % self.__sizeBits for i in range(self.__hashCount)]
 
 #-----------------------------------------------------------------------------------------------------------------------
     class _SecuritySystemAdapterSecusys(otis_dds.security_system_adapter.SecuritySystemAdapterInterface):
@@ -20,8 +392,73 @@ class Bridge:
         __CONFIG_SECTION_ALLOWED = 'ALLOWED'
         __CONFIG_KEY_FLOORS = 'floors'
         __SECURITY_GROUP_PREFIX = "DDS."
+        __LOOKUP_WORKERS = 4
+        __PREFETCH_WORKERS = 2
+        __CARD_FILTER_REPORT_INTERVAL = 100
+
+        # A reloaded card export with fewer cards than this ratio of the loaded one is taken for a truncated or partial 
+        # export, it would reject valid cards
+        __CARD_EXPORT_MIN_RELOAD_RATIO = 0.5
+
+        __INVALID_ACCESS_INFO = otis_dds.security_system_adapter.SecuritySystemAdapterInterface.AccessInfo(
+            False, 
+            0, 
+            otis_dds.security_system_adapter.SecuritySystemAdapterInterface.AccessInfo.DoorType.Front, 
+            [], 
+            [],
+            False,
+            0,
+            0)
+
+        class _GroupsTable(typing.NamedTuple):
+            allowedFloors     : list
+            allowedFloorsMask : int
+            groupsMasks       : dict # Group name to floors mask
+            accessInfoCache   : dict # Frozen set of matched group names to a valid AccessInfo
+
+        class _SiteAdapter(otis_dds.security_system_adapter.SecuritySystemAdapterInterface):
+            """ Adapter of a site added with addSite, cards are resolved by the adapter the site was added to and
+            mapped to floors by the site groups table
+            """
+
+            def __init__(self, adapter, siteName):
+                self.__adapter = adapter
+                self.__siteName = siteName
+
+            @property
+            def allowedFloorsFront(self):
+                return self.__adapter._getGroupsTable(self.__siteName).allowedFloors
 
-        def __init__(self, logger, secusysClient, groupsFilePath, credentialsBitsEndianity, credentialsBitsMask):
+            @property
+            def allowedFloorsFrontMask(self):
+                return self.__adapter._getGroupsTable(self.__siteName).allowedFloorsMask
+
+            @property
+            def allowedFloorsRear(self):
+                # Note we don't support rear 
+                return []
+
+            @property
+            def allowedFloorsRearMask(self):
+                # Note we don't support rear 
+                return 0
+
+            def getAccessInfo(self, credentialData, credentialSizeBits):
+                return self.__adapter._getAccessInfo(self.__siteName, credentialData, credentialSizeBits)
+
+            def getAccessInfoMany(self, credentials):
+                return self.__adapter._getAccessInfoMany(self.__siteName, credentials)
+
+            def getCachedAccessInfo(self, credentialData, credentialSizeBits):
+                return self.__adapter._getCachedAccessInfo(self.__siteName, credentialData, credentialSizeBits)
+
+            def addAllowedFloorsListener(self, listener):
+                self.__adapter._addAllowedFloorsListener(self.__siteName, listener)
+
+        def __init__(self, logger, secusysClient, groupsFilePath, credentialsBitsEndianity, credentialsBitsMask, 
+                     lookupBudget = 0.0, decisionCacheSize = 0, pipelineCacheSize = 0, pipelineCacheTtl = 0.0, 
+                     groupsReloadInterval = 0.0, persistentStore = None, cardExportPath = '', 
+                     cardExportReloadInterval = 0.0, cardFilterSizeBits = 0, lookupWorkers = 0, metricsRegistry = None):
             """ C'tor
             Params:
                 logger: Python logging interface
@@ -29,47 +466,77 @@ class Bridge:
                 groupsFilePath: Groups mapping file path
                 credentialsBitsEndianity: Expected endianity of received credentials
                 credentialsBitsMask: Mask size to use over credentials bits
+                lookupBudget: Seconds allowed for a single lookup before answering from a stale decision, 0 for no limit
+                decisionCacheSize: Maximum amount of last known decisions to keep for stale answers
+                pipelineCacheSize: Maximum amount of card to personal ID and personal ID to groups entries, 0 to disable
+                                   speculative pipelining
+                pipelineCacheTtl: Seconds a pipeline cache entry may be used for speculation, 0 for no expiry
+                groupsReloadInterval: Seconds between groups file modification checks, 0 to disable hot reload
+                persistentStore: Optional _PersistentStore to warm caches from and persist them to
+                cardExportPath: Optional Secusys card export file, cards which are not in it are rejected locally
+                cardExportReloadInterval: Seconds between card export modification checks, 0 to load only once
+                cardFilterSizeBits: Size in bits of the Bloom filter built from the card export
+                lookupWorkers: Lookups run at once, should cover all concurrent callers (async lookup workers and batch 
+                               sizes of all sites) as time waiting for a worker counts against the lookup budget. At 
+                               least 4
+                metricsRegistry: Optional MetricsRegistry to report to
             """
 
             self.__logger = logger
             self.__secusysClient = secusysClient
             self.__credentialsBitsEndianity = credentialsBitsEndianity
             self.__credentialsBitsMask = credentialsBitsMask
-            self.__groups = {}
-            
-            configParser = configparser.ConfigParser()
-
-            try:
-                configParser.read(groupsFilePath)
-
-                # Get allowed floors and remove this section
-                allowedPath = (self.__CONFIG_SECTION_ALLOWED, self.__CONFIG_KEY_FLOORS)
-                self.__allowedFloors = self.__parseFloorList(configParser.get(*allowedPath), "%s.%s" % allowedPath)
-                configParser.remove_section(self.__CONFIG_SECTION_ALLOWED)
-
-                # Get the rest of the groups
-                for section in configParser.sections():
-                    for key, val in configParser.items(section):
-                        if key == self.__CONFIG_KEY_FLOORS:
-                            floorsList = self.__parseFloorList(val, "%s.%s" % (section, key))
-
-                            # Verify there is no overlap between allowed and other groups floors
-                            for i in self.__allowedFloors:
-                             
-                                if i in floorsList:
-                                    raise ValueError("%s.%s list must not overlap with %s.%s. Found %s" % 
-                                                     (section, key, *allowedPath, i))
-                           
-                            self.__groups[section] = floorsList
-
-            except Exception as e:
-                self.__logger.exception("Failed parsing groups file: groupsFilePath=%s", groupsFilePath)
-                raise
+            # Groups tables by site name, None for the adapter's own
+            self.__groupsFilePaths = {None : groupsFilePath}
+            self.__allowedFloorsListeners = collections.defaultdict(list)
+            self.__groupsTables = {None : self.__loadGroupsTable(groupsFilePath)}
+            self.__groupsReloadInterval = groupsReloadInterval
+            self.__watchers = []
+            self.__watchersStopEvent = threading.Event()
+            self.__cardExportPath = cardExportPath
+            self.__cardFilterSizeBits = cardFilterSizeBits
+            self.__cardFilter = None
+            self.__cardFilterCards = 0
+            self.__cardFilterRejects = 0
+            self.__cardFilterPasses = 0
+            self.__cardFilterFalsePositives = 0
+            self.__cardFilterLock = threading.Lock()
+            self.__lookupBudget = lookupBudget
+            self.__decisionCache = Bridge._ExpiringCache(decisionCacheSize) if decisionCacheSize > 0 else None
+            self.__personalIdCache = None
+            self.__securityGroupsCache = None
+            self.__prefetchExecutor = None
+            self.__prefetchPending = set()
+            self.__prefetchLock = threading.Lock()
+
+            if pipelineCacheSize > 0:
+                self.__personalIdCache = Bridge._ExpiringCache(pipelineCacheSize, pipelineCacheTtl)
+                self.__securityGroupsCache = Bridge._ExpiringCache(pipelineCacheSize, pipelineCacheTtl)
+                self.__prefetchExecutor = concurrent.futures.ThreadPoolExecutor(max_workers = self.__PREFETCH_WORKERS, 
+                                                                                thread_name_prefix = "SecusysPrefetch")
+
+            self.__persistentStore = persistentStore
+            self.__cardExportReloadInterval = cardExportReloadInterval
+            self.__bindMetrics(metricsRegistry or metrics.registry.MetricsRegistry())
+
+            # Used for budgeted lookups and for resolving batches concurrently
+            self.__lookupExecutor = concurrent.futures.ThreadPoolExecutor(max_workers = max(self.__LOOKUP_WORKERS, 
+                                                                                            lookupWorkers), 
+                                                                          thread_name_prefix = "SecusysLookup")
+
+            if groupsReloadInterval > 0:
+                self.__startFileWatcher(groupsFilePath, groupsReloadInterval, 
+                                        functools.partial(self.__reloadGroupsTable, None))
            
 #----------------------------------------------------------------------------------------------------------------------- 
         @property
         def allowedFloorsFront(self):
-            return self.__allowedFloors 
+            return self.__groupsTables[None].allowedFloors 
+
+#----------------------------------------------------------------------------------------------------------------------- 
+        @property
+        def allowedFloorsFrontMask(self):
+            return self.__groupsTables[None].allowedFloorsMask
 
 #----------------------------------------------------------------------------------------------------------------------- 
         @property
@@ -77,37 +544,587 @@ class Bridge:
             # Note we don't support rear 
             return []
 
+#----------------------------------------------------------------------------------------------------------------------- 
+        @property
+        def allowedFloorsRearMask(self):
+            # Note we don't support rear 
+            return 0
+
+#----------------------------------------------------------------------------------------------------------------------- 
+        @property
+        def _replicatedCaches(self):
+            """ Dictionary of name to (_ExpiringCache, encode, decode) of the caches a standby bridge is warmed up with
+            """
+            if self.__decisionCache is None:
+                return {}
+
+            return {'decisions' : (self.__decisionCache, sorted, frozenset)}
+
+#----------------------------------------------------------------------------------------------------------------------- 
+        def shutdown(self):
+            """ Release lookup workers and file watchers, lookups which are still in flight are left to complete
+            """
+            self.__watchersStopEvent.set()
+
+            for watcher in self.__watchers:
+                watcher.join()
+
+            self.__watchers = []
+
+            self.__lookupExecutor.shutdown(wait = False)
+
+            if self.__prefetchExecutor is not None:
+                self.__prefetchExecutor.shutdown(wait = False)
+
+#----------------------------------------------------------------------------------------------------------------------- 
+        def addSite(self, siteName, groupsFilePath):
+            """ Add a site sharing the Secusys client, caches and lookup workers of this adapter, with its own groups
+            table. Must be called before lookups start.
+            Params:
+                siteName: Site name, unique within the adapter
+                groupsFilePath: Groups mapping file path of the site
+            Return: SecuritySystemAdapterInterface of the site
+            """
+            if siteName is None or siteName in self.__groupsTables:
+                raise ValueError("Site name must be unique. Got '%s'" % siteName)
+
+            self.__groupsFilePaths[siteName] = groupsFilePath
+            self.__groupsTables[siteName] = self.__loadGroupsTable(groupsFilePath)
+
+            if self.__groupsReloadInterval > 0:
+                self.__startFileWatcher(groupsFilePath, self.__groupsReloadInterval, 
+                                        functools.partial(self.__reloadGroupsTable, siteName))
+
+            return self._SiteAdapter(self, siteName)
+
+#----------------------------------------------------------------------------------------------------------------------- 
+        def loadPersistedCaches(self):
+            """ Warm the caches from the persistent store and persist them from now on, may run while serving lookups
+            """
+            if self.__persistentStore is not None:
+                self.__attachPersistentStore(self.__persistentStore)
+
+#----------------------------------------------------------------------------------------------------------------------- 
+        def loadCardFilter(self):
+            """ Load the card filter from the card export and watch it, may run while serving lookups which are not 
+            filtered until loaded
+            """
+            if self.__cardExportPath:
+                self.__reloadCardFilter()
+
+                if self.__cardExportReloadInterval > 0:
+                    self.__startFileWatcher(self.__cardExportPath, self.__cardExportReloadInterval, 
+                                            self.__reloadCardFilter)
+
 #----------------------------------------------------------------------------------------------------------------------- 
         def getAccessInfo(self,credentialData, credentialSizeBits):
+            return self._getAccessInfo(None, credentialData, credentialSizeBits)
 
-            cardNo = int.from_bytes(credentialData, self.__credentialsBitsEndianity)
+#----------------------------------------------------------------------------------------------------------------------- 
+        def getAccessInfoMany(self, credentials):
+            return self._getAccessInfoMany(None, credentials)
+
+#----------------------------------------------------------------------------------------------------------------------- 
+        def getCachedAccessInfo(self, credentialData, credentialSizeBits):
+            return self._getCachedAccessInfo(None, credentialData, credentialSizeBits)
+
+#----------------------------------------------------------------------------------------------------------------------- 
+        def addAllowedFloorsListener(self, listener):
+            """ Add a callable taking no arguments, called from the file watcher once a reloaded groups file had changed
+            the ALLOWED floors, e.g. DdsCommunicator.reconfigureDecs
+            """
+            self._addAllowedFloorsListener(None, listener)
 
+#----------------------------------------------------------------------------------------------------------------------- 
+        def _addAllowedFloorsListener(self, siteName, listener):
+            self.__allowedFloorsListeners[siteName].append(listener)
+
+#----------------------------------------------------------------------------------------------------------------------- 
+        def _getGroupsTable(self, siteName):
+            return self.__groupsTables[siteName]
+
+#----------------------------------------------------------------------------------------------------------------------- 
+        def _getAccessInfo(self, siteName, credentialData, credentialSizeBits):
+            cardNo = self.__getCardNo(credentialData, credentialSizeBits)
+            future = None
+
+            if self.__isDefinitelyUnknown(cardNo):
+                self.__logger.info("Access requested, rejected by card filter: cardNo=%s", cardNo)
+                self.__setTraceAttribute('cardFilterReject', True)
+                return self.__INVALID_ACCESS_INFO
+
+            if self.__lookupBudget > 0 and self.__secusysClient.isAvailable:
+                # An overrun lookup keeps running in the background and refreshes the decision cache when done
+                future = self.__lookupExecutor.submit(contextvars.copy_context().run, self.__lookupSignature, cardNo)
+
+            return self.__resolveAccessInfo(siteName, cardNo, future, time.monotonic() + self.__lookupBudget)
+
+#----------------------------------------------------------------------------------------------------------------------- 
+        def _getAccessInfoMany(self, siteName, credentials):
+            cardNos = [self.__getCardNo(*x) for x in credentials]
+            uniqueCardNos = []
+            accessInfoByCardNo = {}
+
+            for cardNo in collections.OrderedDict.fromkeys(cardNos):
+                if self.__isDefinitelyUnknown(cardNo):
+                    self.__logger.info("Access requested, rejected by card filter: cardNo=%s", cardNo)
+                    accessInfoByCardNo[cardNo] = self.__INVALID_ACCESS_INFO
+                else:
+                    uniqueCardNos.append(cardNo)
+
+            if len(uniqueCardNos) == 1:
+                index = cardNos.index(uniqueCardNos[0])
+                accessInfoByCardNo[uniqueCardNos[0]] = self._getAccessInfo(siteName, *credentials[index])
+
+            elif uniqueCardNos:
+                # Each distinct card is looked up once, all lookups run concurrently under a shared budget
+                deadline = time.monotonic() + self.__lookupBudget
+                isAvailable = self.__secusysClient.isAvailable
+                futures = [self.__lookupExecutor.submit(contextvars.copy_context().run, self.__lookupSignature, x) 
+                           if isAvailable else None for x in uniqueCardNos]
+
+                for cardNo, future in zip(uniqueCardNos, futures):
+                    accessInfoByCardNo[cardNo] = self.__resolveAccessInfo(siteName, cardNo, future, deadline, 
+                                                                          isAvailable)
+
+            return [accessInfoByCardNo[x] for x in cardNos]
+
+#----------------------------------------------------------------------------------------------------------------------- 
+        def _getCachedAccessInfo(self, siteName, credentialData, credentialSizeBits):
+            cardNo = self.__getCardNo(credentialData, credentialSizeBits)
+
+            if self.__isDefinitelyUnknown(cardNo):
+                accessInfo = self.__INVALID_ACCESS_INFO
+
+            else:
+                signature = self.__decisionCache.get(cardNo) if self.__decisionCache is not None else None
+
+                if signature is None:
+                    return None
+
+                accessInfo = self.__getValidAccessInfo(self.__groupsTables[siteName], signature)._replace(isStale = True)
+
+            self.__logger.info("Access requested under overload, answering from last known decision: cardNumber=%s, " +
+                               "accessInfo=%s", cardNo, accessInfo)
+
+            return accessInfo
+
+#----------------------------------------------------------------------------------------------------------------------- 
+        def __getCardNo(self, credentialData, credentialSizeBits):
+            return self.__maskCardNo(int.from_bytes(credentialData, self.__credentialsBitsEndianity), credentialSizeBits)
+
+#----------------------------------------------------------------------------------------------------------------------- 
+        def __maskCardNo(self, cardNo, credentialSizeBits):
             if self.__credentialsBitsMask > 0 and self.__credentialsBitsMask <= credentialSizeBits:
                 cardNo = cardNo & (0xffffffff >> (32 - self.__credentialsBitsMask))
 
-            isValid = False
+            return cardNo
+
+#----------------------------------------------------------------------------------------------------------------------- 
+        def __resolveAccessInfo(self, siteName, cardNo, future, deadline, isAvailable = True):
+            try:
+                if future is not None:
+                    signature = future.result(max(0.0, deadline - time.monotonic()) if self.__lookupBudget > 0 else None)
+
+                elif self.__lookupBudget > 0 or not isAvailable:
+                    # Don't wait on the budget when we already know Secusys is down
+                    raise secusys_acs.client.SecusysClient.UnavailableError("Circuit breaker is open")
+
+                else:
+                    signature = self.__lookupSignature(cardNo)
+
+                if signature is None:
+                    accessInfo = self.__INVALID_ACCESS_INFO
+                else:
+                    accessInfo = self.__getValidAccessInfo(self.__groupsTables[siteName], signature)
+
+            except (concurrent.futures.TimeoutError, secusys_acs.client.SecusysClient.UnavailableError) as e:
+                accessInfo = self.__getStaleAccessInfo(siteName, cardNo)
+                self.__staleAnswers.inc()
+                self.__setTraceAttribute('staleAnswer', True)
+                self.__logger.warning("Secusys lookup was not available in time, answering from last known decision: " +
+                                      "cardNumber=%s, reason=%s", cardNo, repr(e))
+
+            self.__logger.info("Access requested: carNumber=%s, accessInfo=%s", cardNo, accessInfo)
+
+            return accessInfo
+
+#----------------------------------------------------------------------------------------------------------------------- 
+        def __setTraceAttribute(self, key, value):
+            trace = metrics.tracing.currentTrace()
+
+            if trace is not None:
+                trace.setAttribute(key, value)
+
+#----------------------------------------------------------------------------------------------------------------------- 
+        def __lookupSignature(self, cardNo):
+            # Resolves to the card's groups signature, None for an unknown card, shared by all sites
+            personalId, securityGroups = self.__resolveSecurityGroups(cardNo)
+            signature = None
+
+            if personalId:
+                signature = frozenset(x for x in securityGroups if x.startswith(self.__SECURITY_GROUP_PREFIX))
+            else:
+                self.__onCardNotFound(cardNo)
+
+            # Decisions are kept by groups signature so they always resolve against the current groups table
+            if self.__decisionCache is not None:
+                if signature is not None:
+                    self.__decisionCache.put(cardNo, signature)
+                else:
+                    self.__decisionCache.remove(cardNo)
+
+            return signature
+
+#----------------------------------------------------------------------------------------------------------------------- 
+        def __getValidAccessInfo(self, groupsTable, signature):
+            accessInfo = groupsTable.accessInfoCache.get(signature, None)
+
+            if accessInfo is None:
+                floorsMask = 0
+
+                for group in signature:
+                    floorsMask |= groupsTable.groupsMasks.get(group, 0)
+
+                accessInfo = otis_dds.security_system_adapter.SecuritySystemAdapterInterface.AccessInfo(
+                    True, 
+                    0, 
+                    otis_dds.security_system_adapter.SecuritySystemAdapterInterface.AccessInfo.DoorType.Front, 
+                    self.floorMaskToList(floorsMask), 
+                    [], # Not supporting rear
+                    False,
+                    floorsMask,
+                    0)
+
+                groupsTable.accessInfoCache[signature] = accessInfo
+
+            return accessInfo
+
+#----------------------------------------------------------------------------------------------------------------------- 
+        def __resolveSecurityGroups(self, cardNo):
+            # Every swipe waits on exactly one fresh SOAP call when caches are warm, the other stage is served from
+            # cache and refreshed in the background for the next swipe
+            if self.__personalIdCache is None:
+                personalId = self.__secusysClient.getPersonalIdByCardNo(cardNo)
+                
+                return (personalId, self.__secusysClient.getPersonSecurityGroupsByPersonalId(personalId) 
+                                    if personalId else [])
+
+            personalId = self.__personalIdCache.get(cardNo)
+
+            if personalId is not None:
+                # Known card, go straight to the groups call and re-validate the card in the background
+                self.__prefetch(('card', cardNo), self.__refreshPersonalId, cardNo)
+
+                return (personalId, self.__fetchSecurityGroups(personalId))
+
+            personalId = self.__refreshPersonalId(cardNo)
+
+            if not personalId:
+                return (personalId, [])
+
+            securityGroups = self.__securityGroupsCache.get(personalId)
+
+            if securityGroups is None:
+                securityGroups = self.__fetchSecurityGroups(personalId)
+            else:
+                self.__prefetch(('groups', personalId), self.__fetchSecurityGroups, personalId)
+
+            return (personalId, securityGroups)
+
+#----------------------------------------------------------------------------------------------------------------------- 
+        def __refreshPersonalId(self, cardNo):
+            previousPersonalId = self.__personalIdCache.peek(cardNo)
             personalId = self.__secusysClient.getPersonalIdByCardNo(cardNo)
 
-            floors = []
-            
             if personalId:
-                isValid = True
-                securityGroups = self.__secusysClient.getPersonSecurityGroupsByPersonalId(personalId)
+                self.__personalIdCache.put(cardNo, personalId)
 
-                for group in securityGroups:
-                    if group.startswith(self.__SECURITY_GROUP_PREFIX):
-                        floors.extend(self.__groups.get(group, []))
+                # Card was re-assigned while cached, warm the groups of its new owner for the next swipe
+                if previousPersonalId is not None and previousPersonalId != personalId:
+                    self.__prefetch(('groups', personalId), self.__fetchSecurityGroups, personalId)
+            else:
+                self.__personalIdCache.remove(cardNo)
 
-            accessInfo = otis_dds.security_system_adapter.SecuritySystemAdapterInterface.AccessInfo(
-                isValid, 
-                0, 
-                otis_dds.security_system_adapter.SecuritySystemAdapterInterface.AccessInfo.DoorType.Front, 
-                floors, 
-                []) # Not supporting rear
+            return personalId
 
-            self.__logger.info("Access requested: carNumber=%s, accessInfo=%s", cardNo, accessInfo)
+#----------------------------------------------------------------------------------------------------------------------- 
+        def __fetchSecurityGroups(self, personalId):
+            securityGroups = self.__secusysClient.getPersonSecurityGroupsByPersonalId(personalId)
+            self.__securityGroupsCache.put(personalId, securityGroups)
+
+            return securityGroups
+
+#----------------------------------------------------------------------------------------------------------------------- 
+        def __prefetch(self, key, function, *args):
+            # Skip if the same refresh is already in flight
+            with self.__prefetchLock:
+                if key in self.__prefetchPending:
+                    return
+
+                self.__prefetchPending.add(key)
+
+            try:
+                future = self.__prefetchExecutor.submit(function, *args)
+            except RuntimeError:
+                # Executor was shut down
+                with self.__prefetchLock:
+                    self.__prefetchPending.discard(key)
+                return
+
+            future.add_done_callback(functools.partial(self.__onPrefetchDone, key))
+
+#----------------------------------------------------------------------------------------------------------------------- 
+        def __onPrefetchDone(self, key, future):
+            with self.__prefetchLock:
+                self.__prefetchPending.discard(key)
+
+            exception = future.exception()
+
+            if exception is not None:
+                self.__logger.debug("Speculative prefetch failed: key=%s exception=%s", key, repr(exception))
+
+#----------------------------------------------------------------------------------------------------------------------- 
+        def __getStaleAccessInfo(self, siteName, cardNo):
+            signature = self.__decisionCache.get(cardNo) if self.__decisionCache is not None else None
+
+            # No previous valid decision, deny
+            if signature is None:
+                accessInfo = self.__INVALID_ACCESS_INFO
+            else:
+                accessInfo = self.__getValidAccessInfo(self.__groupsTables[siteName], signature)
+
+            return accessInfo._replace(isStale = True)
+
+#-----------------------------------------------------------------------------------------------------------------------  
+        def __attachPersistentStore(self, persistentStore):
+            if self.__decisionCache is not None:
+                loaded = self.__decisionCache.attachStore(persistentStore, 'decisions', sorted, frozenset)
+                self.__logger.info("Loaded persisted decisions: count=%s", loaded)
+
+            if self.__personalIdCache is not None:
+                loaded = self.__personalIdCache.attachStore(persistentStore, 'personalIds', int, int)
+                self.__logger.info("Loaded persisted card to personal ID entries: count=%s", loaded)
+
+            if self.__securityGroupsCache is not None:
+                loaded = self.__securityGroupsCache.attachStore(persistentStore, 'securityGroups', list, list)
+                self.__logger.info("Loaded persisted personal ID to security groups entries: count=%s", loaded)
+
+#-----------------------------------------------------------------------------------------------------------------------  
+        def __bindMetrics(self, metricsRegistry):
+            self.__staleAnswers = metricsRegistry.counter('acs_stale_answers_total', 
+                                                          'Swipes answered from the last known decision').labels()
+            self.__cardFilterRejectsTotal = metricsRegistry.counter('acs_card_filter_rejects_total', 
+                                                                    'Swipes rejected by the card filter').labels()
+            self.__cardFilterFalsePositivesTotal = metricsRegistry.counter(
+                'acs_card_filter_false_positives_total', 
+                'Swipes passed by the card filter but unknown to Secusys').labels()
+
+            # Cache counters are kept by the caches themselves and only read when metrics are rendered
+            cacheLookups = metricsRegistry.counter('acs_cache_lookups_total', 'Cache lookups by cache and result', 
+                                                   ('cache', 'result'))
+            caches = (('decisions', self.__decisionCache), 
+                      ('personalIds', self.__personalIdCache), 
+                      ('securityGroups', self.__securityGroupsCache))
+
+            for name, cache in caches:
+                if cache is not None:
+                    cacheLookups.bind(lambda cache = cache: cache.hits, name, 'hit')
+                    cacheLookups.bind(lambda cache = cache: cache.misses, name, 'miss')
+
+#-----------------------------------------------------------------------------------------------------------------------  
+        def __getFileStamp(self, filePath):
+            try:
+                stat = os.stat(filePath)
+                return (stat.st_mtime_ns, stat.st_size)
+            except OSError:
+                return None
+
+#-----------------------------------------------------------------------------------------------------------------------  
+        def __startFileWatcher(self, filePath, interval, onChange):
+            # Polling modification time, as inotify is not available on the Windows service host
+            watcher = threading.Thread(target = self.__watchFile, args = (filePath, interval, onChange), daemon = True, 
+                                       name = "FileWatcher")
+            self.__watchers.append(watcher)
+            watcher.start()
+
+#-----------------------------------------------------------------------------------------------------------------------  
+        def __watchFile(self, filePath, interval, onChange):
+            lastStamp = self.__getFileStamp(filePath)
+            changedStamp = None
+
+            while not self.__watchersStopEvent.wait(interval):
+                try:
+                    stamp = self.__getFileStamp(filePath)
+
+                    if stamp is None or stamp == lastStamp:
+                        changedStamp = None
+
+                    elif stamp != changedStamp:
+                        # A file which is still being written parses as a valid yet truncated one, a change is only 
+                        # taken once the file had stayed the same for a whole interval
+                        changedStamp = stamp
+
+                    else:
+                        lastStamp = stamp
+                        changedStamp = None
+                        onChange()
+
+                except Exception:
+                    self.__logger.exception("Failed watching file: filePath=%s", filePath)
+
+#-----------------------------------------------------------------------------------------------------------------------  
+        def __reloadCardFilter(self):
+            cardNos = []
+
+            try:
+                with open(self.__cardExportPath) as cardExportFile:
+                    for line in cardExportFile:
+                        # Plain or CSV export, card number is the first field, headers and comments are skipped
+                        field = line.split(',', 1)[0].strip()
+
+                        if field.isdigit():
+                            cardNos.append(self.__maskCardNo(int(field), 32))
+
+            except Exception:
+                self.__logger.exception("Failed loading card export, keeping previous card filter: cardExportPath=%s", 
+                                        self.__cardExportPath)
+                return
+
+            if not cardNos or len(cardNos) < self.__cardFilterCards * self.__CARD_EXPORT_MIN_RELOAD_RATIO:
+                self.__logger.error("Card export is empty or implausibly smaller than the loaded one, keeping previous " +
+                                    "card filter: cardExportPath=%s cards=%s loadedCards=%s", 
+                                    self.__cardExportPath, len(cardNos), self.__cardFilterCards)
+                return
+
+            cardFilter = Bridge._BloomFilter(self.__cardFilterSizeBits, len(cardNos))
+
+            for cardNo in cardNos:
+                cardFilter.add(cardNo)
+
+            with self.__cardFilterLock:
+                self.__cardFilter = cardFilter
+                self.__cardFilterCards = len(cardNos)
+                self.__cardFilterRejects = 0
+                self.__cardFilterPasses = 0
+                self.__cardFilterFalsePositives = 0
+
+            self.__logger.info("Card filter loaded: cardExportPath=%s cards=%s sizeBits=%s estimatedFalsePositiveRate=%.6f", 
+                               self.__cardExportPath, len(cardNos), self.__cardFilterSizeBits, 
+                               cardFilter.estimatedFalsePositiveRate)
+
+#-----------------------------------------------------------------------------------------------------------------------  
+        def __isDefinitelyUnknown(self, cardNo):
+            cardFilter = self.__cardFilter
+
+            if cardFilter is None:
+                return False
+
+            # Counted from several lookup threads
+            if cardNo in cardFilter:
+                with self.__cardFilterLock:
+                    self.__cardFilterPasses = self.__cardFilterPasses + 1
+
+                return False
+
+            with self.__cardFilterLock:
+                self.__cardFilterRejects = self.__cardFilterRejects + 1
+
+            self.__cardFilterRejectsTotal.inc()
+
+            return True
+
+#-----------------------------------------------------------------------------------------------------------------------  
+        def __onCardNotFound(self, cardNo):
+            # A card which passed the filter but isn't known to Secusys is a false positive (or issued since the export)
+            if self.__cardFilter is not None:
+                with self.__cardFilterLock:
+                    self.__cardFilterFalsePositives = self.__cardFilterFalsePositives + 1
+                    falsePositives = self.__cardFilterFalsePositives
+                    passes = self.__cardFilterPasses
+                    rejects = self.__cardFilterRejects
+
+                self.__cardFilterFalsePositivesTotal.inc()
+
+                if falsePositives % self.__CARD_FILTER_REPORT_INTERVAL == 0:
+                    self.__logger.info("Card filter false positives: observedRate=%.6f estimatedRate=%.6f " + 
+                                       "passes=%s rejects=%s", 
+                                       falsePositives / max(1, passes), 
+                                       self.__cardFilter.estimatedFalsePositiveRate,
+                                       passes, rejects)
+
+#-----------------------------------------------------------------------------------------------------------------------  
+        def __reloadGroupsTable(self, siteName):
+            groupsFilePath = self.__groupsFilePaths[siteName]
+            self.__logger.info("Groups file was modified, reloading: groupsFilePath=%s", groupsFilePath)
+
+            try:
+                newTable = self.__loadGroupsTable(groupsFilePath)
+            except Exception:
+                self.__logger.error("Keeping previous groups table as reloaded groups file is invalid")
+                return
+
+            oldTable = self.__groupsTables[siteName]
+            changedGroups = {x for x in set(oldTable.groupsMasks) | set(newTable.groupsMasks) 
+                             if oldTable.groupsMasks.get(x, 0) != newTable.groupsMasks.get(x, 0)}
+
+            # Carry over memoized decisions which don't depend on a changed group
+            for signature, accessInfo in list(oldTable.accessInfoCache.items()):
+                if signature.isdisjoint(changedGroups):
+                    newTable.accessInfoCache[signature] = accessInfo
+
+            # Single reference assignment, lookups see either the old or the new table as a whole
+            self.__groupsTables[siteName] = newTable
+
+            self.__logger.info("Groups table reloaded: changedGroups=%s keptDecisions=%s", sorted(changedGroups), 
+                               len(newTable.accessInfoCache))
+
+            # ALLOWED floors are part of the DECs operation mode, online DECs are configured again
+            if oldTable.allowedFloorsMask != newTable.allowedFloorsMask:
+                self.__logger.warning("ALLOWED floors had changed, re-configuring online DECs: allowedFloors=%s", 
+                                      newTable.allowedFloors)
+
+                for listener in self.__allowedFloorsListeners[siteName]:
+                    try:
+                        listener()
+                    except Exception:
+                        self.__logger.exception("Failed notifying ALLOWED floors change")
+
+#-----------------------------------------------------------------------------------------------------------------------  
+        def __loadGroupsTable(self, groupsFilePath):
+            groupsMasks = {}
+            configParser = configparser.ConfigParser()
+
+            try:
+                configParser.read(groupsFilePath)
+
+                # Get allowed floors and remove this section
+                allowedPath = (self.__CONFIG_SECTION_ALLOWED, self.__CONFIG_KEY_FLOORS)
+                allowedFloors = self.__parseFloorList(configParser.get(*allowedPath), "%s.%s" % allowedPath)
+                configParser.remove_section(self.__CONFIG_SECTION_ALLOWED)
+
+                # Get the rest of the groups
+                for section in configParser.sections():
+                    for key, val in configParser.items(section):
+                        if key == self.__CONFIG_KEY_FLOORS:
+                            floorsList = self.__parseFloorList(val, "%s.%s" % (section, key))
+
+                            # Verify there is no overlap between allowed and other groups floors
+                            for i in allowedFloors:
+                             
+                                if i in floorsList:
+                                    raise ValueError("%s.%s list must not overlap with %s.%s. Found %s" % 
+                                                     (section, key, *allowedPath, i))
+
+                            # Only groups with the security group prefix can ever match
+                            if section.startswith(self.__SECURITY_GROUP_PREFIX):
+                                groupsMasks[section] = self.floorListToMask(floorsList)
+
+            except Exception as e:
+                self.__logger.exception("Failed parsing groups file: groupsFilePath=%s", groupsFilePath)
+                raise
 
-            return accessInfo
+            return self._GroupsTable(allowedFloors, self.floorListToMask(allowedFloors), groupsMasks, {})
 
 #-----------------------------------------------------------------------------------------------------------------------  
         def __parseFloorList(self, rawFloorList, fieldName):
@@ -138,11 +1155,17 @@ class Bridge:
 
 #-----------------------------------------------------------------------------------------------------------------------
     def __init__(self, logger, configFilePath):
+        self.__constructionTime = time.perf_counter()
         self.__logger = logger
         self.__isRunning = False
+        self.__isDdsStarted = False
+        self.__ddsLock = threading.Lock()
+        self.__isFirstHeartbeatRecorded = False
+        self.__firstHeartbeatLock = threading.Lock()
+        self.__secusysConnectStopEvent = threading.Event()
+        self.__secusysConnectDaemon = None
 
         configParser = configparser.ConfigParser()
-        ddsCommunicatorConfig = otis_dds.communicator.DdsCommunicator.Configuration()
         secusysAcsConfig = secusys_acs.client.SecusysClient.Configuration()
 
         try:
@@ -156,135 +1179,393 @@ class Bridge:
             if val not in ['E','W','I','D']:
                 raise ValueError("%s.level must be one of E, W, I, D. Got '%s'" % (configSection, val))
 
+            val = debugRateLimit = configParser.getint(configSection, "debugRateLimit", fallback = 0)
+
+            if val < 0:
+                raise ValueError("%s.debugRateLimit must be at least 0. Got '%s'" % (configSection, val))
+
             # DDS Config section
-            configSection = self.__CONFIG_SECTION_DDS
+            ddsCommunicatorConfig, interactiveAsyncLookups = self.__parseDdsConfig(configParser)
 
-            val = ddsCommunicatorConfig.heartbeatReceiveMcGroup = configParser.get(configSection, "heartbeatReceiveMcGroup")
+            # ACS Config section
+            configSection = self.__CONFIG_SECTION_ACS
 
-            try:
-                ipaddress.ip_address(val)
-            except:
-                raise ValueError("%s.heartbeatReceiveMcGroup must be a valid IP address. Got '%s'" % (configSection, val))
+            val = secusysAcsConfig.userName = configParser.get(configSection, "userName")
 
-            val = ddsCommunicatorConfig.heartbeatReceivePort = configParser.getint(configSection, "heartbeatReceivePort")
+            if not val:
+                raise ValueError("%s.userName must be provided. Got '%s'" % (configSection, val))
 
-            if val < 1 or val > 65535:
-                raise ValueError("%s.heartbeatReceivePort must be a valid UDP port. Got '%s'" % (configSection, val))
+            val = secusysAcsConfig.password = configParser.get(configSection, "password")
+
+            if not val:
+                raise ValueError("%s.password must be provided. Got '%s'" % (configSection, val))
+
+            val = secusysAcsConfig.wsdl = configParser.get(configSection, "wsdl")
+
+            if not val:
+                raise ValueError("%s.wsdl must be provided. Got '%s'" % (configSection, val))
+
+            groupsFilePath = self.__parseGroupsFilePath(configParser)
+
+            val = credentialsBitsEndianity = configParser.get(configSection, "credentialsBitsEndianity")
+
+            if val not in ('little', 'big'):
+                raise ValueError("%s.credentialsBitsEndianity must be one of little, big. Got '%s'" % (configSection, val))
+
+            val = credentialsBitsMask = configParser.getint(configSection, "credentialsBitsMask")
 
-            val = ddsCommunicatorConfig.heartbeatReceiveTimeout = configParser.getfloat(configSection, "heartbeatReceiveTimeout")
+            if val < 0 or val > 32:
+                raise ValueError("%s.credentialsBitsMask must be between 0 to 32. Got '%s'" % (configSection, val))
+
+            secusysAcsConfig.fastPath = configParser.getboolean(configSection, "fastPath", fallback = False)
+
+            val = secusysAcsConfig.requestTimeout = configParser.getfloat(configSection, "requestTimeout", fallback = 0.0)
+
+            if val < 0.0:
+                raise ValueError("%s.requestTimeout must be at least 0.0. Got '%s'" % (configSection, val))
+
+            val = secusysAcsConfig.breakerFailureThreshold = configParser.getint(configSection, "breakerFailureThreshold", 
+                                                                                 fallback = 0)
+
+            if val < 0:
+                raise ValueError("%s.breakerFailureThreshold must be at least 0. Got '%s'" % (configSection, val))
+
+            val = secusysAcsConfig.breakerResetTimeout = configParser.getfloat(configSection, "breakerResetTimeout", 
+                                                                               fallback = 10.0)
+
+            if val < 1.0:
+                raise ValueError("%s.breakerResetTimeout must be at least 1.0. Got '%s'" % (configSection, val))
+
+            val = lookupBudget = configParser.getfloat(configSection, "lookupBudget", fallback = 0.0)
+
+            if val < 0.0:
+                raise ValueError("%s.lookupBudget must be at least 0.0. Got '%s'" % (configSection, val))
+
+            val = decisionCacheSize = configParser.getint(configSection, "decisionCacheSize", fallback = 0)
+
+            if val < 0:
+                raise ValueError("%s.decisionCacheSize must be at least 0. Got '%s'" % (configSection, val))
+
+            val = pipelineCacheSize = configParser.getint(configSection, "pipelineCacheSize", fallback = 0)
+
+            if val < 0:
+                raise ValueError("%s.pipelineCacheSize must be at least 0. Got '%s'" % (configSection, val))
+
+            val = pipelineCacheTtl = configParser.getfloat(configSection, "pipelineCacheTtl", fallback = 0.0)
+
+            if val < 0.0:
+                raise ValueError("%s.pipelineCacheTtl must be at least 0.0. Got '%s'" % (configSection, val))
+
+            val = groupsReloadInterval = configParser.getfloat(configSection, "groupsReloadInterval", fallback = 0.0)
+
+            if val < 0.0:
+                raise ValueError("%s.groupsReloadInterval must be at least 0.0. Got '%s'" % (configSection, val))
+
+            persistentCachePath = configParser.get(configSection, "persistentCachePath", fallback = '')
+
+            # In case of local directory, extend it to full path
+            if persistentCachePath.startswith(os.path.curdir):
+                persistentCachePath = os.path.join(os.path.dirname(sys.executable), persistentCachePath)
+
+            val = persistentCacheTtl = configParser.getfloat(configSection, "persistentCacheTtl", fallback = 86400.0)
 
             if val < 1.0:
-                raise ValueError("%s.heartbeatReceiveTimeout must be a at least 1.0. Got '%s'" % (configSection, val))
-            
-            val = ddsCommunicatorConfig.heartbeatSendMcGroup = configParser.get(configSection, "heartbeatSendMcGroup")
+                raise ValueError("%s.persistentCacheTtl must be at least 1.0. Got '%s'" % (configSection, val))
+
+            cardExportPath = configParser.get(configSection, "cardExportPath", fallback = '')
+
+            # In case of local directory, extend it to full path
+            if cardExportPath.startswith(os.path.curdir):
+                cardExportPath = os.path.join(os.path.dirname(sys.executable), cardExportPath)
+
+            val = cardExportReloadInterval = configParser.getfloat(configSection, "cardExportReloadInterval", 
+                                                                   fallback = 0.0)
+
+            if val < 0.0:
+                raise ValueError("%s.cardExportReloadInterval must be at least 0.0. Got '%s'" % (configSection, val))
+
+            val = cardFilterSizeBits = configParser.getint(configSection, "cardFilterSizeBits", fallback = 1 << 20)
+
+            if val < 8:
+                raise ValueError("%s.cardFilterSizeBits must be at least 8. Got '%s'" % (configSection, val))
+
+            # Metrics Config section
+            configSection = self.__CONFIG_SECTION_METRICS
+
+            val = metricsListenIp = configParser.get(configSection, "listenIp", fallback = '127.0.0.1')
 
             try:
                 ipaddress.ip_address(val)
             except:
-                raise ValueError("%s.heartbeatSendMcGroup must be a valid IP address. Got '%s'" % (configSection, val))
-            
-            val = ddsCommunicatorConfig.heartbeatSendPort = configParser.getint(configSection, "heartbeatSendPort")
+                raise ValueError("%s.listenIp must be a valid IP address. Got '%s'" % (configSection, val))
 
-            if val < 1 or val > 65535:
-                raise ValueError("%s.heartbeatSendPort must be a valid UDP port. Got '%s'" % (configSection, val))
-            
-            val = ddsCommunicatorConfig.heartbeatSendInterval = configParser.getfloat(configSection, "heartbeatSendInterval")
+            val = metricsListenPort = configParser.getint(configSection, "listenPort", fallback = 0)
 
-            if val < 1.0:
-                raise ValueError("%s.heartbeatSendInterval must be a at least 1.0. Got '%s'" % (configSection, val))
+            if val < 0 or val > 65535:
+                raise ValueError("%s.listenPort must be a valid TCP port or 0. Got '%s'" % (configSection, val))
 
-            val = ddsCommunicatorConfig.interactiveReceivePortDes = configParser.getint(configSection, "interactiveReceivePortDes")
+            traceSinkPath = configParser.get(configSection, "traceSinkPath", fallback = '')
 
-            if val < 1 or val > 65535:
-                raise ValueError("%s.interactiveReceivePortDes must be a valid UDP port. Got '%s'" % (configSection, val))
-            
-            val = ddsCommunicatorConfig.interactiveReceivePortDec = configParser.getint(configSection, "interactiveReceivePortDec")
+            # In case of local directory, extend it to full path
+            if traceSinkPath.startswith(os.path.curdir):
+                traceSinkPath = os.path.join(os.path.dirname(sys.executable), traceSinkPath)
 
-            if val < 1 or val > 65535:
-                raise ValueError("%s.interactiveReceivePortDec must be a valid UDP port. Got '%s'" % (configSection, val))
-            
-            val = ddsCommunicatorConfig.interactiveSendPortDes = configParser.getint(configSection, "interactiveSendPortDes")
+            val = traceSampleRate = configParser.getfloat(configSection, "traceSampleRate", fallback = 0.01)
 
-            if val < 1 or val > 65535:
-                raise ValueError("%s.interactiveSendPortDes must be a valid UDP port. Got '%s'" % (configSection, val))
-            
-            val = ddsCommunicatorConfig.interactiveSendPortDec = configParser.getint(configSection, "interactiveSendPortDec")
+            if val < 0.0 or val > 1.0:
+                raise ValueError("%s.traceSampleRate must be between 0.0 and 1.0. Got '%s'" % (configSection, val))
 
-            if val < 1 or val > 65535:
-                raise ValueError("%s.interactiveSendPortDec must be a valid UDP port. Got '%s'" % (configSection, val))
-            
-            val = ddsCommunicatorConfig.interactiveDuplicatesCacheSize = configParser.getint(configSection, "interactiveDuplicatesCacheSize")
+            val = traceSinkMaxBytes = configParser.getint(configSection, "traceSinkMaxBytes", fallback = 10485760)
 
-            if val < 1 or val > 100:
-                raise ValueError("%s.interactiveDuplicatesCacheSize must be between 1 and 100. Got '%s'" % (configSection, val))
-            
-            val = ddsCommunicatorConfig.interactiveSendRetryIntreval = configParser.getfloat(configSection, "interactiveSendRetryIntreval")
+            if val < 0:
+                raise ValueError("%s.traceSinkMaxBytes must be at least 0. Got '%s'" % (configSection, val))
 
-            if val < 1.0:
-                raise ValueError("%s.interactiveSendRetryIntreval must be a at least 1.0. Got '%s'" % (configSection, val))
-            
-            val = ddsCommunicatorConfig.interactiveSendMaxRetries = configParser.getint(configSection, "interactiveSendMaxRetries")
+            val = traceSlowThreshold = configParser.getfloat(configSection, "traceSlowThreshold", fallback = 1.0)
+
+            if val < 0.0:
+                raise ValueError("%s.traceSlowThreshold must be at least 0.0. Got '%s'" % (configSection, val))
+
+            # Swipes overrunning the budget are all answered at it, a threshold within it writes every swipe of an outage
+            if val > 0.0 and val <= lookupBudget:
+                raise ValueError("%s.traceSlowThreshold must be greater than %s.lookupBudget. Got '%s'" % 
+                                 (configSection, self.__CONFIG_SECTION_ACS, val))
+
+            val = controlListenPort = configParser.getint(configSection, "controlListenPort", fallback = 0)
+
+            if val < 0 or val > 65535:
+                raise ValueError("%s.controlListenPort must be a valid TCP port or 0. Got '%s'" % (configSection, val))
+
+            profilerOutputPath = configParser.get(configSection, "profilerOutputPath", fallback = os.path.curdir)
+
+            # In case of local directory, extend it to full path
+            if profilerOutputPath.startswith(os.path.curdir):
+                profilerOutputPath = os.path.join(os.path.dirname(sys.executable), profilerOutputPath)
 
-            if val < 1:
-                raise ValueError("%s.interactiveSendMaxRetries must be a at least 1. Got '%s'" % (configSection, val))
+            val = profilerFrequency = configParser.getint(configSection, "profilerFrequency", fallback = 100)
 
-            val = ddsCommunicatorConfig.localIp = configParser.get(configSection, "localIp")
+            if val < 1 or val > 1000:
+                raise ValueError("%s.profilerFrequency must be between 1 and 1000. Got '%s'" % (configSection, val))
+
+            val = profilerMaxDuration = configParser.getfloat(configSection, "profilerMaxDuration", fallback = 300.0)
+
+            if val < 0.0:
+                raise ValueError("%s.profilerMaxDuration must be at least 0.0. Got '%s'" % (configSection, val))
+
+            # Replication Config section
+            configSection = self.__CONFIG_SECTION_REPLICATION
+
+            val = replicationRole = configParser.get(configSection, "role", fallback = 'none')
+
+            if val not in ('none', 'active', 'standby'):
+                raise ValueError("%s.role must be one of none, active, standby. Got '%s'" % (configSection, val))
+
+            val = replicationListenIp = configParser.get(configSection, "listenIp", 
+                                                         fallback = ddsCommunicatorConfig.localIp)
 
             try:
                 ipaddress.ip_address(val)
             except:
-                raise ValueError("%s.localIp must be a valid IP address. Got '%s'" % (configSection, val))
+                raise ValueError("%s.listenIp must be a valid IP address. Got '%s'" % (configSection, val))
 
-            val = ddsCommunicatorConfig.decOperationMode = configParser.getint(configSection, "decOperationMode")
+            val = replicationPort = configParser.getint(configSection, "port", fallback = 9466)
 
-            if val < 1 or val > 4:
-                raise ValueError("%s.decOperationMode must be between 1 to 4. Got '%s'" % (configSection, val))
+            if val < 1 or val > 65535:
+                raise ValueError("%s.port must be a valid TCP port. Got '%s'" % (configSection, val))
 
-            # ACS Config section
-            configSection = self.__CONFIG_SECTION_ACS
+            val = replicationPeerIp = configParser.get(configSection, "peerIp", fallback = '')
 
-            val = secusysAcsConfig.userName = configParser.get(configSection, "userName")
+            if replicationRole != 'none':
+                try:
+                    ipaddress.ip_address(val)
+                except:
+                    raise ValueError("%s.peerIp must be a valid IP address for an active or a standby. Got '%s'" % 
+                                     (configSection, val))
 
-            if not val:
-                raise ValueError("%s.userName must be provided. Got '%s'" % (configSection, val))
+            val = replicationInterval = configParser.getfloat(configSection, "interval", fallback = 0.25)
 
-            val = secusysAcsConfig.password = configParser.get(configSection, "password")
+            if val < 0.01:
+                raise ValueError("%s.interval must be at least 0.01. Got '%s'" % (configSection, val))
 
-            if not val:
-                raise ValueError("%s.password must be provided. Got '%s'" % (configSection, val))
+            val = replicationFailoverTimeout = configParser.getfloat(configSection, "failoverTimeout", fallback = 1.0)
 
-            val = secusysAcsConfig.wsdl = configParser.get(configSection, "wsdl")
+            if val <= replicationInterval:
+                raise ValueError("%s.failoverTimeout must be greater than %s.interval. Got '%s'" % 
+                                 (configSection, configSection, val))
 
-            if not val:
-                raise ValueError("%s.wsdl must be provided. Got '%s'" % (configSection, val))
+            val = replicationStartupTimeout = configParser.getfloat(configSection, "startupTimeout", fallback = 10.0)
 
-            val = groupsFilePath = configParser.get(configSection, "groupsFilePath")
+            if val < replicationFailoverTimeout:
+                raise ValueError("%s.startupTimeout must be at least %s.failoverTimeout. Got '%s'" % 
+                                 (configSection, configSection, val))
 
-            if not val:
-                raise ValueError("%s.groupsFilePath must be provided. Got '%s'" % (configSection, val))
+            val = replicationFenceTimeout = configParser.getfloat(configSection, "fenceTimeout", fallback = 2.5)
 
-            # In case of local directory, extend it to full path
-            if groupsFilePath.startswith(os.path.curdir):
-                groupsFilePath = os.path.join(os.path.dirname(sys.executable), groupsFilePath)
+            if val <= ddsCommunicatorConfig.heartbeatSendInterval:
+                raise ValueError("%s.fenceTimeout must be greater than %s.heartbeatSendInterval. Got '%s'" % 
+                                 (configSection, self.__CONFIG_SECTION_DDS, val))
 
-            val = credentialsBitsEndianity = configParser.get(configSection, "credentialsBitsEndianity")
+            # DESs consider a silent bridge gone after about heartbeatReceiveTimeout, taking over is not held back past it
+            if val >= ddsCommunicatorConfig.heartbeatReceiveTimeout:
+                raise ValueError("%s.fenceTimeout must be less than %s.heartbeatReceiveTimeout. Got '%s'" % 
+                                 (configSection, self.__CONFIG_SECTION_DDS, val))
 
-            if val not in ('little', 'big'):
-                raise ValueError("%s.credentialsBitsEndianity must be one of little, big. Got '%s'" % (configSection, val))
+            # Sites Config section
+            configSection = self.__CONFIG_SECTION_SITES
+            siteConfigs = collections.OrderedDict()
+            siteConfigs[self.__DEFAULT_SITE_NAME] = (ddsCommunicatorConfig, interactiveAsyncLookups, groupsFilePath)
 
-            val = credentialsBitsMask = configParser.getint(configSection, "credentialsBitsMask")
+            if configParser.has_section(configSection):
+                for siteName, siteConfigFilePath in configParser.items(configSection):
+                    if siteName in siteConfigs:
+                        raise ValueError("%s site names must be unique and other than %s. Got '%s'" % 
+                                         (configSection, self.__DEFAULT_SITE_NAME, siteName))
 
-            if val < 0 or val > 32:
-                raise ValueError("%s.credentialsBitsMask must be between 0 to 32. Got '%s'" % (configSection, val))
+                    # In case of local directory, extend it to full path
+                    if siteConfigFilePath.startswith(os.path.curdir):
+                        siteConfigFilePath = os.path.join(os.path.dirname(sys.executable), siteConfigFilePath)
+
+                    try:
+                        siteConfigs[siteName] = self.__parseSiteConfig(siteConfigFilePath)
+                    except Exception as e:
+                        raise ValueError("%s.%s is invalid: %s" % (configSection, siteName, e))
+
+            # Sites share the host, sockets bound by one site must not be bound by another
+            listenTuples = {}
+
+            for siteName, (siteDdsConfig, _, _) in siteConfigs.items():
+                for port in (siteDdsConfig.heartbeatReceivePort, siteDdsConfig.interactiveReceivePortDes, 
+                             siteDdsConfig.interactiveReceivePortDec):
+                    otherSiteName = listenTuples.setdefault((siteDdsConfig.localIp, port), siteName)
+
+                    if otherSiteName != siteName:
+                        raise ValueError("%s.%s must not listen on the DDS ports of site %s. Got '%s'" % 
+                                         (configSection, siteName, otherSiteName, (siteDdsConfig.localIp, port)))
         
         except Exception as e:
             self.__logger.exception("Failed parsing configuration file: configFilePath=%s", configFilePath)
             raise
 
         self.__configureLogLevel(rawLogLevel)
-        self.__secusysAcsClient = secusys_acs.client.SecusysClient(logger, secusysAcsConfig)
-        ssAdapter = self._SecuritySystemAdapterSecusys(logger, self.__secusysAcsClient, groupsFilePath, credentialsBitsEndianity, credentialsBitsMask)
-        self.__ddsCommunicator = otis_dds.communicator.DdsCommunicator(logger, ddsCommunicatorConfig, ssAdapter)
+
+        if debugRateLimit > 0:
+            self.__logger.addFilter(self._DebugRateLimitFilter(logger, debugRateLimit))
+        self.__metricsRegistry = metrics.registry.MetricsRegistry()
+        self.__startupPhaseSeconds = self.__metricsRegistry.gauge('bridge_startup_phase_seconds', 
+                                                                  'Time spent in each startup phase', ('phase',))
+        self.__metricsExporter = None
+
+        if metricsListenPort > 0:
+            self.__metricsExporter = metrics.exporter.MetricsExporter(logger, self.__metricsRegistry, 
+                                                                      (metricsListenIp, metricsListenPort))
+
+        self.__profiler = metrics.profiler.SamplingProfiler(logger, profilerOutputPath, profilerFrequency, 
+                                                            profilerMaxDuration)
+        self.__controlServer = None
+
+        if controlListenPort > 0:
+            self.__controlServer = metrics.control.ControlServer(logger, (metricsListenIp, controlListenPort), 
+                                                                 {'profile start'  : self.__startProfiler,
+                                                                  'profile stop'   : self.__stopProfiler,
+                                                                  'profile status' : self.__getProfilerStatus})
+
+        self.__tracer = None
+
+        if traceSinkPath:
+            self.__tracer = metrics.tracing.Tracer(logger, traceSinkPath, traceSampleRate, traceSlowThreshold, 
+                                                   traceSinkMaxBytes)
+
+        self.__secusysAcsClient = secusys_acs.client.SecusysClient(logger, secusysAcsConfig, self.__metricsRegistry)
+        self.__persistentStore = None
+
+        if persistentCachePath:
+            self.__persistentStore = self._PersistentStore(logger, persistentCachePath, persistentCacheTtl)
+
+        # Lookup workers are shared by all sites, each site has up to its async lookups or else a batch in flight
+        lookupWorkers = sum(siteAsyncLookups or siteDdsConfig.interactiveReceiveBatchSize 
+                            for siteDdsConfig, siteAsyncLookups, _ in siteConfigs.values())
+
+        self.__ssAdapter = self._SecuritySystemAdapterSecusys(logger, self.__secusysAcsClient, groupsFilePath, 
+                                                              credentialsBitsEndianity, credentialsBitsMask, 
+                                                              lookupBudget, decisionCacheSize, pipelineCacheSize, 
+                                                              pipelineCacheTtl, groupsReloadInterval, 
+                                                              self.__persistentStore, cardExportPath, 
+                                                              cardExportReloadInterval, cardFilterSizeBits, 
+                                                              lookupWorkers, self.__metricsRegistry)
+
+        # Each site has its own communicator and groups table, Secusys client, caches and lookup workers are shared
+        self.__sites = collections.OrderedDict()
+
+        for siteName, (siteDdsConfig, siteAsyncLookups, siteGroupsFilePath) in siteConfigs.items():
+            siteAdapter = self.__ssAdapter
+
+            if siteName != self.__DEFAULT_SITE_NAME:
+                siteAdapter = self.__ssAdapter.addSite(siteName, siteGroupsFilePath)
+
+            siteDdsAdapter = siteAdapter
+
+            if siteAsyncLookups > 0:
+                siteDdsAdapter = otis_dds.security_system_adapter.SyncToAsyncSecuritySystemAdapter(siteAdapter, 
+                                                                                                   siteAsyncLookups)
+
+            # Single site metrics are kept unlabeled
+            siteMetricsRegistry = self.__metricsRegistry
+
+            if len(siteConfigs) > 1:
+                siteMetricsRegistry = self.__metricsRegistry.scoped('site', siteName)
+
+            siteDdsCommunicator = otis_dds.communicator.DdsCommunicator(logger, siteDdsConfig, siteDdsAdapter, 
+                                                                        siteMetricsRegistry, self.__tracer)
+            siteAdapter.addAllowedFloorsListener(siteDdsCommunicator.reconfigureDecs)
+            siteDdsCommunicator.addFirstHeartbeatListener(self.__onFirstHeartbeat)
+            self.__sites[siteName] = self._Site(siteDdsAdapter, siteDdsCommunicator)
+
+        if len(self.__sites) > 1:
+            self.__logger.info("Hosting sites: sites=%s", list(self.__sites))
+
+        self.__recordStartupPhase('init', time.perf_counter() - self.__constructionTime)
+
+        # Both roles publish once running DDS and follow once not, so a former active can step down and follow the 
+        # one took over. The epoch counts the takeovers followed, of two bridges sending SS heartbeats the one with the
+        # lower epoch steps down
+        self.__replicationPublisher = None
+        self.__replicationSubscriber = None
+        self.__peerHeartbeatMonitor = None
+        self.__isStandbyStart = replicationRole == 'standby'
+        self.__epoch = 1 if replicationRole == 'active' else 0
+        self.__localIp = ddsCommunicatorConfig.localIp
+        self.__replicationListenIp = replicationListenIp
+        self.__replicationPeerTuple = (replicationPeerIp, replicationPort)
+        self.__replicationProbeTimeout = replicationFailoverTimeout
+        self.__replicationFenceTimeout = replicationFenceTimeout
+        self.__nextPeerCheckTime = 0.0
+
+        if replicationRole != 'none':
+            replicatedCaches = self.__ssAdapter._replicatedCaches
+            self.__peerHeartbeatMonitor = replication.PeerHeartbeatMonitor(logger, 
+                                                                           ddsCommunicatorConfig.localIp, 
+                                                                           ddsCommunicatorConfig.heartbeatSendMcGroup,
+                                                                           ddsCommunicatorConfig.heartbeatSendPort,
+                                                                           replicationPeerIp, 
+                                                                           replicationFenceTimeout,
+                                                                           self.__onPeerHeartbeat)
+            self.__replicationPublisher = replication.ReplicationPublisher(logger, 
+                                                                           (replicationListenIp, replicationPort), 
+                                                                           replicationPeerIp,
+                                                                           replicationInterval, 
+                                                                           lambda: self.__epoch,
+                                                                           self.__exportDdsState,
+                                                                           {name : (cache, encode) for name, 
+                                                                            (cache, encode, _) in replicatedCaches.items()})
+            self.__replicationSubscriber = replication.ReplicationSubscriber(logger, 
+                                                                             replicationListenIp,
+                                                                             self.__replicationPeerTuple, 
+                                                                             replicationFailoverTimeout, 
+                                                                             replicationStartupTimeout, 
+                                                                             lambda: self.__peerHeartbeatMonitor.isPeerAlive,
+                                                                             self.__importDdsState,
+                                                                             {name : (cache, decode) for name, 
+                                                                              (cache, _, decode) in replicatedCaches.items()},
+                                                                             self.__takeOver)
 
 #-----------------------------------------------------------------------------------------------------------------------
     def start(self):
@@ -292,10 +1573,54 @@ class Bridge:
         """
         if not self.__isRunning :
             self.__logger.info("Starting Bridge")
-            self.__secusysAcsClient.connect()
-            self.__ddsCommunicator.start()
+            startTime = time.perf_counter()
             self.__isRunning = True
 
+            try:
+                # DDS goes first so heartbeats are published right away, swipes are answered from the last known 
+                # decisions until Secusys is connected
+                if self.__peerHeartbeatMonitor is not None:
+                    self.__peerHeartbeatMonitor.start()
+
+                if not self.__isStandbyStart:
+                    self.__runStartupPhase('dds', self.__startDds)
+
+                else:
+                    # DDS is started on taking over from the active bridge
+                    self.__replicationSubscriber.start()
+
+                if self.__metricsExporter is not None:
+                    try:
+                        self.__metricsExporter.start()
+                    except:
+                        # Metrics are not worth failing access control for
+                        self.__logger.exception("Failed starting metrics endpoint, continuing without it")
+
+                if self.__controlServer is not None:
+                    try:
+                        self.__controlServer.start()
+                    except:
+                        self.__logger.exception("Failed starting control socket, continuing without it")
+
+                # The WSDL load (and SOAP stack import) and cache and card export loads are independent of each other
+                startupPhases = (('caches', self.__ssAdapter.loadPersistedCaches),
+                                 ('card_filter', self.__ssAdapter.loadCardFilter))
+
+                with concurrent.futures.ThreadPoolExecutor(max_workers = len(startupPhases) + 1, 
+                                                           thread_name_prefix = "Startup") as executor:
+                    futures = [executor.submit(self.__runStartupPhase, *x) for x in startupPhases]
+                    futures.append(executor.submit(self.__connectSecusys))
+
+                for future in futures:
+                    future.result()
+
+            except:
+                self.__logger.exception("Failed starting Bridge")
+                self.stop()
+                raise
+
+            self.__logger.info("Bridge started: duration=%.3f", time.perf_counter() - startTime)
+
         else:
             self.__logger.warning("Trying to start an already running Bridge")
 
@@ -305,13 +1630,374 @@ class Bridge:
         """
         if self.__isRunning :
             self.__logger.info("Stopping Bridge")
-            self.__ddsCommunicator.stop()
+
+            if self.__metricsExporter is not None:
+                self.__metricsExporter.stop()
+
+            if self.__controlServer is not None:
+                self.__controlServer.stop()
+
+            self.__profiler.stop()
+
+            # Stopped first, it may be stepping down this bridge and start following
+            if self.__peerHeartbeatMonitor is not None:
+                self.__peerHeartbeatMonitor.stop()
+
+            if self.__replicationSubscriber is not None:
+                self.__replicationSubscriber.stop()
+
+            with self.__ddsLock:
+                if self.__isDdsStarted:
+                    if self.__replicationPublisher is not None:
+                        self.__replicationPublisher.stop()
+
+                    for site in self.__sites.values():
+                        site.ddsCommunicator.stop()
+
+                    self.__isDdsStarted = False
+
+            for site in self.__sites.values():
+                if isinstance(site.ddsAdapter, otis_dds.security_system_adapter.SyncToAsyncSecuritySystemAdapter):
+                    site.ddsAdapter.shutdown()
+
+            self.__ssAdapter.shutdown()
+
+            if self.__persistentStore is not None:
+                self.__persistentStore.close()
+
+            if self.__secusysConnectDaemon is not None:
+                self.__secusysConnectStopEvent.set()
+                self.__secusysConnectDaemon.join()
+                self.__secusysConnectDaemon = None
+
             self.__secusysAcsClient.disconnect()
+
+            if self.__tracer is not None:
+                self.__tracer.close()
+
             self.__isRunning = False
 
         else:
             self.__logger.warning("Trying to start an already running Bridge")
 
+#-----------------------------------------------------------------------------------------------------------------------    
+    def __startDds(self):
+        with self.__ddsLock:
+            if self.__isDdsStarted or not self.__isRunning:
+                return
+
+            for site in self.__sites.values():
+                site.ddsCommunicator.start()
+
+            self.__isDdsStarted = True
+
+            if self.__replicationPublisher is not None:
+                try:
+                    self.__replicationPublisher.start()
+                except:
+                    # Running without a standby is better than not running
+                    self.__logger.exception("Failed starting replication publisher, continuing without it")
+
+#-----------------------------------------------------------------------------------------------------------------------    
+    def __onFirstHeartbeat(self):
+        # Called from the heartbeat thread of each site, the first of them counts. Not under the DDS lock, stopping DDS
+        # joins the heartbeat threads while holding it
+        with self.__firstHeartbeatLock:
+            if self.__isFirstHeartbeatRecorded:
+                return
+
+            self.__isFirstHeartbeatRecorded = True
+
+        timeToFirstHeartbeat = time.perf_counter() - self.__constructionTime
+        self.__metricsRegistry.gauge('bridge_time_to_first_heartbeat_seconds', 
+                                     'Time from bridge construction to its first SS heartbeat').bind(
+                                         lambda: timeToFirstHeartbeat)
+        self.__logger.info("First heartbeat was sent: timeToFirstHeartbeat=%.3f", timeToFirstHeartbeat)
+
+#-----------------------------------------------------------------------------------------------------------------------    
+    def __connectSecusys(self):
+        # DDS is running already and answers swipes from the last known decisions, a Secusys API which is down at 
+        # start is connected to in the background rather than stopping the bridge
+        startTime = time.perf_counter()
+
+        try:
+            self.__secusysAcsClient.connect()
+
+        except Exception as e:
+            self.__logger.exception("Failed connecting to Secusys API, retrying in the background: retryInterval=%s", 
+                                    self.__SECUSYS_CONNECT_RETRY_INTERVAL)
+            self.__secusysConnectStopEvent.clear()
+            self.__secusysConnectDaemon = threading.Thread(target = self.__retryConnectSecusys, args = (startTime,), 
+                                                           daemon = True, name = "SecusysConnect")
+            self.__secusysConnectDaemon.start()
+            return
+
+        self.__recordStartupPhase('secusys', time.perf_counter() - startTime)
+
+#-----------------------------------------------------------------------------------------------------------------------    
+    def __retryConnectSecusys(self, startTime):
+        while not self.__secusysConnectStopEvent.wait(self.__SECUSYS_CONNECT_RETRY_INTERVAL):
+            try:
+                self.__secusysAcsClient.connect()
+
+            except Exception as e:
+                self.__logger.warning("Failed connecting to Secusys API, retrying: reason=%r", e)
+                continue
+
+            self.__recordStartupPhase('secusys', time.perf_counter() - startTime)
+            return
+
+#-----------------------------------------------------------------------------------------------------------------------    
+    def __runStartupPhase(self, phase, function):
+        startTime = time.perf_counter()
+        function()
+        self.__recordStartupPhase(phase, time.perf_counter() - startTime)
+
+#-----------------------------------------------------------------------------------------------------------------------    
+    def __recordStartupPhase(self, phase, duration):
+        self.__startupPhaseSeconds.bind(lambda: duration, phase)
+        self.__logger.info("Startup phase completed: phase=%s duration=%.3f", phase, duration)
+
+#-----------------------------------------------------------------------------------------------------------------------    
+    def __exportDdsState(self):
+        return {siteName : site.ddsCommunicator.exportState() for siteName, site in self.__sites.items()}
+
+#-----------------------------------------------------------------------------------------------------------------------    
+    def __importDdsState(self, state):
+        for siteName, siteState in state.items():
+            site = self.__sites.get(siteName, None)
+
+            # The active bridge may host a site this one doesn't, nothing to warm up then
+            if site is not None:
+                site.ddsCommunicator.importState(siteState)
+
+#-----------------------------------------------------------------------------------------------------------------------    
+    def __takeOver(self):
+        self.__epoch = max(self.__epoch, self.__replicationSubscriber.epoch) + 1
+        self.__logger.warning("Taking over as the active bridge: epoch=%s", self.__epoch)
+        self.__startDds()
+
+#-----------------------------------------------------------------------------------------------------------------------    
+    def __onPeerHeartbeat(self):
+        # Only the active bridge needs to check, and only once in a while as the other keeps sending
+        now = time.monotonic()
+
+        if not self.__isDdsStarted or now < self.__nextPeerCheckTime:
+            return
+
+        self.__nextPeerCheckTime = now + self.__replicationFenceTimeout
+
+        try:
+            peerEpoch = replication.probeEpoch(self.__replicationListenIp, self.__replicationPeerTuple, 
+                                               self.__replicationProbeTimeout)
+
+        except Exception as e:
+            self.__logger.error("Peer bridge sends SS heartbeats too but doesn't publish its epoch: peerTuple=%s " +
+                                "reason=%r", self.__replicationPeerTuple, e)
+            return
+
+        # On a tie the bridge with the higher IP address steps down, both bridges decide alike
+        peerIp = self.__replicationPeerTuple[0]
+
+        if (peerEpoch, ipaddress.ip_address(self.__localIp)) > (self.__epoch, ipaddress.ip_address(peerIp)):
+            self.__logger.warning("Peer bridge is active too, stepping down: epoch=%s peerEpoch=%s peerIp=%s", 
+                                  self.__epoch, peerEpoch, peerIp)
+            self.__stepDown()
+
+        else:
+            self.__logger.warning("Peer bridge is active too, staying active: epoch=%s peerEpoch=%s peerIp=%s", 
+                                  self.__epoch, peerEpoch, peerIp)
+
+#-----------------------------------------------------------------------------------------------------------------------    
+    def __stepDown(self):
+        with self.__ddsLock:
+            if not self.__isDdsStarted:
+                return
+
+            self.__replicationPublisher.stop()
+
+            for site in self.__sites.values():
+                site.ddsCommunicator.stop()
+
+            self.__isDdsStarted = False
+
+        self.__replicationSubscriber.start()
+
+#-----------------------------------------------------------------------------------------------------------------------    
+    def toggleProfiler(self):
+        """ Start a profiling session or stop the running one and write its profile
+        """
+        self.__profiler.toggle()
+
+#-----------------------------------------------------------------------------------------------------------------------    
+    def __startProfiler(self):
+        if not self.__profiler.start():
+            return "Profiler is already running"
+
+        return "Profiler started"
+
+#-----------------------------------------------------------------------------------------------------------------------    
+    def __stopProfiler(self):
+        if not self.__profiler.isRunning:
+            return "Profiler is not running"
+
+        return "Profiler stopped: profilePath=%s" % self.__profiler.stop()
+
+#-----------------------------------------------------------------------------------------------------------------------    
+    def __getProfilerStatus(self):
+        return "Profiler is %s: lastProfilePath=%s" % ('running' if self.__profiler.isRunning else 'stopped', 
+                                                      self.__profiler.lastProfilePath)
+
+#-----------------------------------------------------------------------------------------------------------------------    
+    def __parseDdsConfig(self, configParser):
+        configSection = self.__CONFIG_SECTION_DDS
+        ddsCommunicatorConfig = otis_dds.communicator.DdsCommunicator.Configuration()
+
+        val = ddsCommunicatorConfig.heartbeatReceiveMcGroup = configParser.get(configSection, "heartbeatReceiveMcGroup")
+
+        try:
+            ipaddress.ip_address(val)
+        except:
+            raise ValueError("%s.heartbeatReceiveMcGroup must be a valid IP address. Got '%s'" % (configSection, val))
+
+        val = ddsCommunicatorConfig.heartbeatReceivePort = configParser.getint(configSection, "heartbeatReceivePort")
+
+        if val < 1 or val > 65535:
+            raise ValueError("%s.heartbeatReceivePort must be a valid UDP port. Got '%s'" % (configSection, val))
+
+        val = ddsCommunicatorConfig.heartbeatReceiveTimeout = configParser.getfloat(configSection, "heartbeatReceiveTimeout")
+
+        if val < 1.0:
+            raise ValueError("%s.heartbeatReceiveTimeout must be a at least 1.0. Got '%s'" % (configSection, val))
+        
+        val = ddsCommunicatorConfig.heartbeatSendMcGroup = configParser.get(configSection, "heartbeatSendMcGroup")
+
+        try:
+            ipaddress.ip_address(val)
+        except:
+            raise ValueError("%s.heartbeatSendMcGroup must be a valid IP address. Got '%s'" % (configSection, val))
+        
+        val = ddsCommunicatorConfig.heartbeatSendPort = configParser.getint(configSection, "heartbeatSendPort")
+
+        if val < 1 or val > 65535:
+            raise ValueError("%s.heartbeatSendPort must be a valid UDP port. Got '%s'" % (configSection, val))
+        
+        val = ddsCommunicatorConfig.heartbeatSendInterval = configParser.getfloat(configSection, "heartbeatSendInterval")
+
+        if val < 1.0:
+            raise ValueError("%s.heartbeatSendInterval must be a at least 1.0. Got '%s'" % (configSection, val))
+
+        val = ddsCommunicatorConfig.interactiveReceivePortDes = configParser.getint(configSection, "interactiveReceivePortDes")
+
+        if val < 1 or val > 65535:
+            raise ValueError("%s.interactiveReceivePortDes must be a valid UDP port. Got '%s'" % (configSection, val))
+        
+        val = ddsCommunicatorConfig.interactiveReceivePortDec = configParser.getint(configSection, "interactiveReceivePortDec")
+
+        if val < 1 or val > 65535:
+            raise ValueError("%s.interactiveReceivePortDec must be a valid UDP port. Got '%s'" % (configSection, val))
+        
+        val = ddsCommunicatorConfig.interactiveSendPortDes = configParser.getint(configSection, "interactiveSendPortDes")
+
+        if val < 1 or val > 65535:
+            raise ValueError("%s.interactiveSendPortDes must be a valid UDP port. Got '%s'" % (configSection, val))
+        
+        val = ddsCommunicatorConfig.interactiveSendPortDec = configParser.getint(configSection, "interactiveSendPortDec")
+
+        if val < 1 or val > 65535:
+            raise ValueError("%s.interactiveSendPortDec must be a valid UDP port. Got '%s'" % (configSection, val))
+        
+        val = ddsCommunicatorConfig.interactiveDuplicatesCacheSize = configParser.getint(configSection, "interactiveDuplicatesCacheSize")
+
+        if val < 1 or val > 100:
+            raise ValueError("%s.interactiveDuplicatesCacheSize must be between 1 and 100. Got '%s'" % (configSection, val))
+
+        val = ddsCommunicatorConfig.interactiveReceiveBatchSize = configParser.getint(configSection, 
+                                                                                      "interactiveReceiveBatchSize", 
+                                                                                      fallback = 1)
+
+        if val < 1 or val > 256:
+            raise ValueError("%s.interactiveReceiveBatchSize must be between 1 and 256. Got '%s'" % (configSection, val))
+
+        val = ddsCommunicatorConfig.interactiveAdmissionQueueSize = configParser.getint(configSection, 
+                                                                                        "interactiveAdmissionQueueSize", 
+                                                                                        fallback = 0)
+
+        if val < 0 or val > 65536:
+            raise ValueError("%s.interactiveAdmissionQueueSize must be between 0 and 65536. Got '%s'" % (configSection, 
+                                                                                                         val))
+
+        val = ddsCommunicatorConfig.interactiveOverloadPolicy = configParser.get(configSection, 
+                                                                                 "interactiveOverloadPolicy", 
+                                                                                 fallback = 'deny')
+
+        if val not in otis_dds.communicator.DdsCommunicator.OVERLOAD_POLICIES:
+            raise ValueError("%s.interactiveOverloadPolicy must be one of %s. Got '%s'" % 
+                             (configSection, ', '.join(otis_dds.communicator.DdsCommunicator.OVERLOAD_POLICIES), val))
+
+        val = interactiveAsyncLookups = configParser.getint(configSection, "interactiveAsyncLookups", fallback = 0)
+
+        if val < 0 or val > 64:
+            raise ValueError("%s.interactiveAsyncLookups must be between 0 and 64. Got '%s'" % (configSection, val))
+        
+        val = ddsCommunicatorConfig.interactiveSendRetryIntreval = configParser.getfloat(configSection, "interactiveSendRetryIntreval")
+
+        if val < 1.0:
+            raise ValueError("%s.interactiveSendRetryIntreval must be a at least 1.0. Got '%s'" % (configSection, val))
+        
+        val = ddsCommunicatorConfig.interactiveSendMaxRetries = configParser.getint(configSection, "interactiveSendMaxRetries")
+
+        if val < 1:
+            raise ValueError("%s.interactiveSendMaxRetries must be a at least 1. Got '%s'" % (configSection, val))
+
+        val = ddsCommunicatorConfig.localIp = configParser.get(configSection, "localIp")
+
+        try:
+            ipaddress.ip_address(val)
+        except:
+            raise ValueError("%s.localIp must be a valid IP address. Got '%s'" % (configSection, val))
+
+        val = ddsCommunicatorConfig.decOperationMode = configParser.getint(configSection, "decOperationMode")
+
+        if val < 1 or val > 4:
+            raise ValueError("%s.decOperationMode must be between 1 to 4. Got '%s'" % (configSection, val))
+
+        capturePath = configParser.get(configSection, "capturePath", fallback = '')
+
+        # In case of local directory, extend it to full path
+        if capturePath.startswith(os.path.curdir):
+            capturePath = os.path.join(os.path.dirname(sys.executable), capturePath)
+
+        ddsCommunicatorConfig.capturePath = capturePath
+
+        return (ddsCommunicatorConfig, interactiveAsyncLookups)
+
+#-----------------------------------------------------------------------------------------------------------------------    
+    def __parseSiteConfig(self, siteConfigFilePath):
+        configParser = configparser.ConfigParser()
+
+        if not configParser.read(siteConfigFilePath):
+            raise ValueError("Site configuration file could not be read. Got '%s'" % siteConfigFilePath)
+
+        ddsCommunicatorConfig, interactiveAsyncLookups = self.__parseDdsConfig(configParser)
+
+        return (ddsCommunicatorConfig, interactiveAsyncLookups, self.__parseGroupsFilePath(configParser))
+
+#-----------------------------------------------------------------------------------------------------------------------    
+    def __parseGroupsFilePath(self, configParser):
+        configSection = self.__CONFIG_SECTION_ACS
+
+        val = groupsFilePath = configParser.get(configSection, "groupsFilePath")
+
+        if not val:
+            raise ValueError("%s.groupsFilePath must be provided. Got '%s'" % (configSection, val))
+
+        # In case of local directory, extend it to full path
+        if groupsFilePath.startswith(os.path.curdir):
+            groupsFilePath = os.path.join(os.path.dirname(sys.executable), groupsFilePath)
+
+        return groupsFilePath
+
 #-----------------------------------------------------------------------------------------------------------------------    
     def __configureLogLevel(self, rawLogLevel):
         level = None
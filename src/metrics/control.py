@@ -0,0 +1,88 @@
+import socketserver
+import threading
+
+#======================================================================================================================
+class ControlServer:
+    """ Local TCP control socket taking one command per line (e.g. 'profile start') and answering each with one line,
+    any netcat-like client will do. Commands are matched as a whole, 'help' lists them.
+    """
+
+#-----------------------------------------------------------------------------------------------------------------------
+    class _ControlRequestHandler(socketserver.StreamRequestHandler):
+
+        __MAX_LINE_SIZE = 1024
+
+        def handle(self):
+            while True:
+                line = self.rfile.readline(self.__MAX_LINE_SIZE)
+
+                if not line:
+                    break
+
+                command = ' '.join(line.decode('utf-8', 'replace').split())
+
+                if not command:
+                    continue
+
+                self.wfile.write((self.server.execute(command) + '\n').encode('utf-8'))
+
+#-----------------------------------------------------------------------------------------------------------------------
+    def __init__(self, logger, listenTuple, commands):
+        """ C'tor
+        Params:
+            logger: Python logging interface
+            listenTuple: (ip, port) to listen on, should be a local address as the socket is not authenticated
+            commands: Dictionary of command to callable taking no arguments and returning a reply string
+        """
+        self.__logger = logger
+        self.__listenTuple = listenTuple
+        self.__commands = commands
+        self.__server = None
+        self.__daemon = None
+
+#-----------------------------------------------------------------------------------------------------------------------
+    def start(self):
+        """ Start accepting commands
+        """
+        if self.__server is None:
+            self.__logger.info("Starting control socket: tuple=%s commands=%s", self.__listenTuple,
+                               list(self.__commands))
+            self.__server = socketserver.ThreadingTCPServer(self.__listenTuple, self._ControlRequestHandler)
+            self.__server.daemon_threads = True
+            self.__server.execute = self.__execute
+            self.__daemon = threading.Thread(target = self.__server.serve_forever, daemon = True, name = "Control")
+            self.__daemon.start()
+
+        else:
+            self.__logger.warning("Control socket is already started")
+
+#-----------------------------------------------------------------------------------------------------------------------
+    def stop(self):
+        """ Stop accepting commands
+        """
+        if self.__server is not None:
+            self.__logger.info("Stopping control socket")
+            self.__server.shutdown()
+            self.__server.server_close()
+            self.__daemon.join()
+            self.__server = None
+            self.__daemon = None
+
+#-----------------------------------------------------------------------------------------------------------------------
+    def __execute(self, command):
+        if command == 'help':
+            return ', '.join(sorted(self.__commands))
+
+        function = self.__commands.get(command, None)
+
+        if function is None:
+            return "Unknown command '%s', try 'help'" % command
+
+        self.__logger.info("Control command was received: command=%s", command)
+
+        try:
+            return function()
+
+        except Exception as e:
+            self.__logger.exception("Failed executing control command: command=%s", command)
+            return "Failed: %r" % e
@@ -0,0 +1,75 @@
+import http.server
+import threading
+
+#======================================================================================================================
+class MetricsExporter:
+    """ Local HTTP endpoint serving a MetricsRegistry in the Prometheus text exposition format on /metrics
+    """
+
+#-----------------------------------------------------------------------------------------------------------------------
+    class _MetricsRequestHandler(http.server.BaseHTTPRequestHandler):
+
+        __CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+        def do_GET(self):
+            if self.path.split('?', 1)[0] != '/metrics':
+                self.send_error(404)
+                return
+
+            try:
+                body = self.server.registry.render().encode('utf-8')
+            except:
+                self.server.logger.exception("Failed rendering metrics")
+                self.send_error(500)
+                return
+
+            self.send_response(200)
+            self.send_header('Content-Type', self.__CONTENT_TYPE)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            self.server.logger.debug("Metrics request: " + format, *args)
+
+#-----------------------------------------------------------------------------------------------------------------------
+    def __init__(self, logger, registry, listenTuple):
+        """ C'tor
+        Params:
+            logger: Python logging interface
+            registry: MetricsRegistry to serve
+            listenTuple: (ip, port) to listen on, should be a local address as the endpoint is not authenticated
+        """
+        self.__logger = logger
+        self.__registry = registry
+        self.__listenTuple = listenTuple
+        self.__server = None
+        self.__daemon = None
+
+#-----------------------------------------------------------------------------------------------------------------------
+    def start(self):
+        """ Start serving metrics
+        """
+        if self.__server is None:
+            self.__logger.info("Starting metrics endpoint: tuple=%s", self.__listenTuple)
+            self.__server = http.server.ThreadingHTTPServer(self.__listenTuple, self._MetricsRequestHandler)
+            self.__server.daemon_threads = True
+            self.__server.registry = self.__registry
+            self.__server.logger = self.__logger
+            self.__daemon = threading.Thread(target = self.__server.serve_forever, daemon = True, name = "Metrics")
+            self.__daemon.start()
+
+        else:
+            self.__logger.warning("Metrics endpoint is already started")
+
+#-----------------------------------------------------------------------------------------------------------------------
+    def stop(self):
+        """ Stop serving metrics
+        """
+        if self.__server is not None:
+            self.__logger.info("Stopping metrics endpoint")
+            self.__server.shutdown()
+            self.__server.server_close()
+            self.__daemon.join()
+            self.__server = None
+            self.__daemon = None
@@ -0,0 +1,159 @@
+import collections
+import datetime
+import os
+import sys
+import threading
+import time
+
+#======================================================================================================================
+class SamplingProfiler:
+    """ In-process sampling profiler, samples the stacks of all threads at a fixed frequency and writes them aggregated
+    as folded stacks (one 'thread;outer;...;inner count' line per distinct stack, as consumed by flamegraph.pl and
+    speedscope). Nothing runs and nothing is hooked while the profiler is stopped.
+    """
+
+#-----------------------------------------------------------------------------------------------------------------------
+    def __init__(self, logger, outputPath, frequency, maxDuration):
+        """ C'tor
+        Params:
+            logger: Python logging interface
+            outputPath: Directory to write profiles to, one file per profiling session
+            frequency: Samples per second
+            maxDuration: Seconds after which a session is stopped and written on its own, 0 for no limit
+        """
+        self.__logger = logger
+        self.__outputPath = outputPath
+        self.__interval = 1.0 / frequency
+        self.__maxDuration = maxDuration
+        self.__lock = threading.Lock()
+        self.__sampler = None
+        self.__stopEvent = None
+        self.__lastProfilePath = None
+
+#-----------------------------------------------------------------------------------------------------------------------
+    @property
+    def isRunning(self):
+        return self.__sampler is not None
+
+#-----------------------------------------------------------------------------------------------------------------------
+    @property
+    def lastProfilePath(self):
+        """ Path of the last profile written, None if none was
+        """
+        return self.__lastProfilePath
+
+#-----------------------------------------------------------------------------------------------------------------------
+    def start(self):
+        """ Start a profiling session
+        Return: True if started, False if a session is already running
+        """
+        with self.__lock:
+            if self.__sampler is not None:
+                return False
+
+            self.__stopEvent = threading.Event()
+            self.__sampler = threading.Thread(target = self.__sampleLoop, args = (self.__stopEvent,), daemon = True,
+                                              name = "Profiler")
+            self.__sampler.start()
+
+        return True
+
+#-----------------------------------------------------------------------------------------------------------------------
+    def stop(self):
+        """ Stop the profiling session and write its profile
+        Return: Profile path, None if no session was running or the profile could not be written
+        """
+        with self.__lock:
+            sampler = self.__sampler
+
+            if sampler is None:
+                return None
+
+            self.__stopEvent.set()
+
+        sampler.join()
+
+        return self.__lastProfilePath
+
+#-----------------------------------------------------------------------------------------------------------------------
+    def toggle(self):
+        """ Start a profiling session or stop the running one
+        """
+        if not self.start():
+            self.stop()
+
+#-----------------------------------------------------------------------------------------------------------------------
+    def __sampleLoop(self, stopEvent):
+        stacks = collections.Counter()
+        frameLabels = {}
+        samplesCount = 0
+        startTime = time.monotonic()
+        startDateTime = datetime.datetime.now()
+        selfId = threading.get_ident()
+
+        self.__logger.info("Profiling started: frequency=%s maxDuration=%s", round(1.0 / self.__interval),
+                           self.__maxDuration)
+
+        try:
+            nextTime = startTime
+
+            while not stopEvent.is_set():
+                threadNames = {x.ident : x.name for x in threading.enumerate()}
+
+                for threadId, frame in sys._current_frames().items():
+                    if threadId == selfId:
+                        continue
+
+                    labels = []
+
+                    while frame is not None:
+                        code = frame.f_code
+                        label = frameLabels.get(code, None)
+
+                        if label is None:
+                            label = frameLabels[code] = '%s (%s)' % (code.co_name, os.path.basename(code.co_filename))
+
+                        labels.append(label)
+                        frame = frame.f_back
+
+                    labels.append(threadNames.get(threadId, str(threadId)))
+                    stacks[';'.join(reversed(labels))] += 1
+
+                samplesCount += 1
+
+                if self.__maxDuration > 0 and time.monotonic() - startTime >= self.__maxDuration:
+                    self.__logger.warning("Profiling reached its maximal duration, stopping: maxDuration=%s",
+                                          self.__maxDuration)
+                    break
+
+                # Sample on a fixed schedule, skipping missed slots rather than bursting to catch up
+                nextTime += self.__interval
+                now = time.monotonic()
+
+                if nextTime < now:
+                    nextTime = now
+
+                stopEvent.wait(nextTime - now)
+
+            self.__lastProfilePath = self.__writeProfile(stacks, startDateTime)
+            self.__logger.info("Profiling stopped: samples=%s duration=%.3f profilePath=%s", samplesCount,
+                               time.monotonic() - startTime, self.__lastProfilePath)
+
+        except Exception as e:
+            self.__lastProfilePath = None
+            self.__logger.exception("Failed profiling")
+
+        finally:
+            with self.__lock:
+                self.__sampler = None
+                self.__stopEvent = None
+
+#-----------------------------------------------------------------------------------------------------------------------
+    def __writeProfile(self, stacks, startDateTime):
+        profilePath = os.path.join(self.__outputPath, 'profile-%s.folded' % startDateTime.strftime('%Y%m%d-%H%M%S'))
+
+        with open(profilePath, 'w') as profileFile:
+            for stack, count in stacks.most_common():
+                profileFile.write('%s %s\n' % (stack, count))
+
+        return profilePath
@@ -0,0 +1,261 @@
+import bisect
+import collections
+import threading
+
+#======================================================================================================================
+class MetricsRegistry:
+    """ In-process registry of counters and histograms rendered in the Prometheus text exposition format.
+    Updates take a single uncontended lock, values which are already tracked elsewhere can be bound as callbacks
+    and are only read when rendered.
+    """
+
+    # Seconds, from sub millisecond socket work up to SOAP calls hitting their timeout
+    LATENCY_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+#-----------------------------------------------------------------------------------------------------------------------
+    class _Counter:
+
+        def __init__(self):
+            self.__value = 0
+            self.__lock = threading.Lock()
+
+        def inc(self, amount = 1):
+            with self.__lock:
+                self.__value = self.__value + amount
+
+        def _samples(self, name, labels):
+            return [(name, labels, self.__value)]
+
+#-----------------------------------------------------------------------------------------------------------------------
+    class _Histogram:
+
+        def __init__(self, buckets):
+            self.__buckets = buckets
+            self.__counts = [0] * (len(buckets) + 1)
+            self.__sum = 0.0
+            self.__lock = threading.Lock()
+
+        def observe(self, value):
+            index = bisect.bisect_left(self.__buckets, value)
+
+            with self.__lock:
+                self.__counts[index] = self.__counts[index] + 1
+                self.__sum = self.__sum + value
+
+        def _samples(self, name, labels):
+            with self.__lock:
+                counts = list(self.__counts)
+                total = self.__sum
+
+            samples = []
+            cumulative = 0
+
+            for bound, count in zip(self.__buckets + (float('inf'),), counts):
+                cumulative = cumulative + count
+                samples.append((name + '_bucket', labels + (('le', MetricsRegistry._s_formatValue(bound)),),
+                                cumulative))
+
+            samples.append((name + '_sum', labels, total))
+            samples.append((name + '_count', labels, cumulative))
+
+            return samples
+
+#-----------------------------------------------------------------------------------------------------------------------
+    class _Callback:
+
+        def __init__(self, callback):
+            self.__callback = callback
+
+        def _samples(self, name, labels):
+            return [(name, labels, self.__callback())]
+
+#-----------------------------------------------------------------------------------------------------------------------
+    class _Family:
+
+        def __init__(self, name, help, metricType, labelNames, childFactory):
+            self.name = name
+            self.help = help
+            self.metricType = metricType
+            self.labelNames = tuple(labelNames)
+            self.__childFactory = childFactory
+            self.__children = collections.OrderedDict()
+            self.__lock = threading.Lock()
+
+        def labels(self, *labelValues):
+            """ Get the metric of a label values combination, created on first use
+            Params:
+                labelValues: Values in the order of the family label names
+            Return: Counter or histogram
+            """
+            labelValues = tuple(str(x) for x in labelValues)
+            child = self.__children.get(labelValues, None)
+
+            if child is None:
+                if len(labelValues) != len(self.labelNames):
+                    raise ValueError("Expecting %s label values for %s. Got '%s'" %
+                                     (len(self.labelNames), self.name, labelValues))
+
+                with self.__lock:
+                    child = self.__children.setdefault(labelValues, self.__childFactory())
+
+            return child
+
+        def bind(self, callback, *labelValues):
+            """ Bind a label values combination to a callback, read only when the registry is rendered
+            Params:
+                callback: Callable returning the current value
+                labelValues: Values in the order of the family label names
+            """
+            with self.__lock:
+                self.__children[tuple(str(x) for x in labelValues)] = MetricsRegistry._Callback(callback)
+
+        def _samples(self):
+            with self.__lock:
+                children = list(self.__children.items())
+
+            samples = []
+
+            for labelValues, child in children:
+                samples.extend(child._samples(self.name, tuple(zip(self.labelNames, labelValues))))
+
+            return samples
+
+#-----------------------------------------------------------------------------------------------------------------------
+    class _ScopedFamily:
+
+        def __init__(self, family, labelValue):
+            self.__family = family
+            self.__labelValue = labelValue
+
+        def labels(self, *labelValues):
+            return self.__family.labels(self.__labelValue, *labelValues)
+
+        def bind(self, callback, *labelValues):
+            self.__family.bind(callback, self.__labelValue, *labelValues)
+
+#-----------------------------------------------------------------------------------------------------------------------
+    class _Scope:
+        """ Registry view prepending a constant label to every family it creates, see MetricsRegistry.scoped
+        """
+
+        def __init__(self, registry, labelName, labelValue):
+            self.__registry = registry
+            self.__labelName = labelName
+            self.__labelValue = labelValue
+
+        def counter(self, name, help, labelNames = ()):
+            return MetricsRegistry._ScopedFamily(self.__registry.counter(name, help, (self.__labelName,) + 
+                                                                         tuple(labelNames)), self.__labelValue)
+
+        def gauge(self, name, help, labelNames = ()):
+            return MetricsRegistry._ScopedFamily(self.__registry.gauge(name, help, (self.__labelName,) + 
+                                                                       tuple(labelNames)), self.__labelValue)
+
+        def histogram(self, name, help, labelNames = (), buckets = None):
+            buckets = MetricsRegistry.LATENCY_BUCKETS if buckets is None else buckets
+            return MetricsRegistry._ScopedFamily(self.__registry.histogram(name, help, (self.__labelName,) + 
+                                                                           tuple(labelNames), buckets), 
+                                                 self.__labelValue)
+
+#-----------------------------------------------------------------------------------------------------------------------
+    def __init__(self):
+        """ C'tor
+        """
+        self.__families = collections.OrderedDict()
+        self.__lock = threading.Lock()
+
+#-----------------------------------------------------------------------------------------------------------------------
+    def counter(self, name, help, labelNames = ()):
+        """ Get or create a counter family
+        Params:
+            name: Metric name
+            help: Metric description
+            labelNames: Names of the family labels
+        Return: Metric family, use labels() to get a counter
+        """
+        return self.__getFamily(name, help, 'counter', labelNames, self._Counter)
+
+#-----------------------------------------------------------------------------------------------------------------------
+    def gauge(self, name, help, labelNames = ()):
+        """ Get or create a gauge family, gauges are only supported through bind()
+        Params:
+            name: Metric name
+            help: Metric description
+            labelNames: Names of the family labels
+        Return: Metric family
+        """
+        return self.__getFamily(name, help, 'gauge', labelNames, None)
+
+#-----------------------------------------------------------------------------------------------------------------------
+    def histogram(self, name, help, labelNames = (), buckets = LATENCY_BUCKETS):
+        """ Get or create a histogram family
+        Params:
+            name: Metric name
+            help: Metric description
+            labelNames: Names of the family labels
+            buckets: Sorted bucket upper bounds, +Inf is implied
+        Return: Metric family, use labels() to get a histogram
+        """
+        return self.__getFamily(name, help, 'histogram', labelNames, lambda: self._Histogram(tuple(buckets)))
+
+#-----------------------------------------------------------------------------------------------------------------------
+    def scoped(self, labelName, labelValue):
+        """ Get a view of the registry for one of several instances of a component reporting the same metrics
+        Params:
+            labelName: Name of the label telling the instances apart, prepended to the families label names
+            labelValue: Value of the label for this instance
+        Return: Object with the counter, gauge and histogram methods of the registry
+        """
+        return self._Scope(self, labelName, str(labelValue))
+
+#-----------------------------------------------------------------------------------------------------------------------
+    def render(self):
+        """ Render all metrics in the Prometheus text exposition format (version 0.0.4)
+        Return: Rendered metrics as string
+        """
+        with self.__lock:
+            families = list(self.__families.values())
+
+        lines = []
+
+        for family in families:
+            lines.append('# HELP %s %s' % (family.name, family.help.replace('\\', '\\\\').replace('\n', '\\n')))
+            lines.append('# TYPE %s %s' % (family.name, family.metricType))
+
+            for name, labels, value in family._samples():
+                if labels:
+                    name = '%s{%s}' % (name, ','.join('%s="%s"' % (k, MetricsRegistry._s_escapeLabelValue(v))
+                                                      for k, v in labels))
+
+                lines.append('%s %s' % (name, MetricsRegistry._s_formatValue(value)))
+
+        return '\n'.join(lines) + '\n'
+
+#-----------------------------------------------------------------------------------------------------------------------
+    def __getFamily(self, name, help, metricType, labelNames, childFactory):
+        with self.__lock:
+            family = self.__families.get(name, None)
+
+            if family is None:
+                family = self._Family(name, help, metricType, labelNames, childFactory)
+                self.__families[name] = family
+
+            elif family.metricType != metricType or family.labelNames != tuple(labelNames):
+                raise ValueError("Metric %s is already registered as %s%s" % (name, family.metricType,
+                                                                             family.labelNames))
+
+        return family
+
+#-----------------------------------------------------------------------------------------------------------------------
+    def _s_formatValue(value):
+        if value == float('inf'):
+            return '+Inf'
+
+        if isinstance(value, float) and value.is_integer():
+            return repr(value)
+
+        return str(value)
+
+#-----------------------------------------------------------------------------------------------------------------------
+    def _s_escapeLabelValue(value):
+        return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
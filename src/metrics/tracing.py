@@ -0,0 +1,264 @@
+import contextlib
+import contextvars
+import json
+import os
+import queue
+import random
+import threading
+import time
+
+# Trace of the swipe being handled, contexts are copied into executors by whoever hands work over to them
+_currentTrace = contextvars.ContextVar('currentTrace', default = None)
+
+#======================================================================================================================
+class Trace:
+
+#-----------------------------------------------------------------------------------------------------------------------
+    def __init__(self, tracer, name, startTime, attributes):
+        """ C'tor, use Tracer.startTrace
+        Params:
+            tracer: Tracer the trace is finished to
+            name: Trace name
+            startTime: time.perf_counter() the trace starts at
+            attributes: Dictionary of trace attributes
+        """
+        self.__tracer = tracer
+        self.__name = name
+        self.__attributes = attributes
+        self.__spans = []
+        self.__traceId = '%016x' % random.getrandbits(64)
+        self.__startTime = startTime
+        self.__startWallTime = time.time() - (time.perf_counter() - startTime)
+        self.__duration = None
+
+    @property
+    def traceId(self):
+        return self.__traceId
+
+    @property
+    def duration(self):
+        return self.__duration
+
+    def setAttribute(self, key, value):
+        self.__attributes[key] = value
+
+    def addSpan(self, name, startTime, endTime, attributes = None):
+        """ Record a span
+        Params:
+            name: Span name
+            startTime: time.perf_counter() of the span start
+            endTime: time.perf_counter() of the span end
+            attributes: Optional dictionary of span attributes
+        """
+        # Late spans (e.g. an overrun lookup completing in the background) are still recorded until the trace is written
+        self.__spans.append((name, startTime, endTime, attributes, threading.current_thread().name))
+
+    def finish(self):
+        if self.__duration is None:
+            self.__duration = time.perf_counter() - self.__startTime
+            self.__tracer._finish(self)
+
+    def _toDict(self):
+        return {'traceId'    : self.__traceId,
+                'name'       : self.__name,
+                'start'      : self.__startWallTime,
+                'durationMs' : round(self.__duration * 1000, 3),
+                'attributes' : self.__attributes,
+                'spans'      : [{'name'       : name,
+                                 'offsetMs'   : round((startTime - self.__startTime) * 1000, 3),
+                                 'durationMs' : round((endTime - startTime) * 1000, 3),
+                                 'thread'     : threadName,
+                                 'attributes' : attributes or {}}
+                                for name, startTime, endTime, attributes, threadName in list(self.__spans)]}
+
+#======================================================================================================================
+class TraceGroup:
+    """ Fans spans and attributes out to several traces, for work done once on behalf of all of them (e.g. a batch)
+    """
+
+#-----------------------------------------------------------------------------------------------------------------------
+    def __init__(self, traces):
+        self.__traces = traces
+
+    def setAttribute(self, key, value):
+        for trace in self.__traces:
+            trace.setAttribute(key, value)
+
+    def addSpan(self, name, startTime, endTime, attributes = None):
+        for trace in self.__traces:
+            trace.addSpan(name, startTime, endTime, attributes)
+
+#======================================================================================================================
+class _Span:
+
+    def __init__(self, trace, name, attributes):
+        self.__trace = trace
+        self.__name = name
+        self.__attributes = attributes
+        self.__startTime = None
+
+    def __enter__(self):
+        self.__startTime = time.perf_counter()
+        return self
+
+    def __exit__(self, excType, excValue, traceback):
+        if excType is not None:
+            self.__attributes['error'] = excType.__name__
+
+        self.__trace.addSpan(self.__name, self.__startTime, time.perf_counter(), self.__attributes)
+
+    def setAttribute(self, key, value):
+        self.__attributes[key] = value
+
+#======================================================================================================================
+class _NullSpan:
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, excType, excValue, traceback):
+        pass
+
+    def setAttribute(self, key, value):
+        pass
+
+_NULL_SPAN = _NullSpan()
+
+#======================================================================================================================
+@contextlib.contextmanager
+def activate(trace):
+    """ Make a trace (or TraceGroup) the current one within a block
+    Params:
+        trace: Trace, TraceGroup or None for no current trace
+    """
+    token = _currentTrace.set(trace)
+
+    try:
+        yield trace
+    finally:
+        _currentTrace.reset(token)
+
+#======================================================================================================================
+def currentTrace():
+    """ Get the current trace
+    Return: Trace or TraceGroup | None
+    """
+    return _currentTrace.get()
+
+#======================================================================================================================
+def span(name, **attributes):
+    """ Time a block as a span of the current trace, a no-op when there is none
+    Params:
+        name: Span name
+        attributes: Span attributes
+    Return: Context manager, setAttribute() may be called on it within the block
+    """
+    trace = _currentTrace.get()
+
+    if trace is None:
+        return _NULL_SPAN
+
+    return _Span(trace, name, attributes)
+
+#======================================================================================================================
+class Tracer:
+    """ Creates traces and writes the sampled ones as JSON lines from a background thread. Traces at least as slow as
+    the slow threshold are always written, so tail latency is never sampled away.
+    """
+
+    # Full sinks kept aside as <sinkPath>.1 (the latest) to <sinkPath>.N
+    __SINK_BACKUP_COUNT = 3
+
+#-----------------------------------------------------------------------------------------------------------------------
+    def __init__(self, logger, sinkPath, sampleRate, slowThreshold, sinkMaxBytes = 0):
+        """ C'tor
+        Params:
+            logger: Python logging interface
+            sinkPath: JSON lines file to append traces to
+            sampleRate: Ratio of traces written regardless of their duration
+            slowThreshold: Seconds from which a trace is always written, 0 to disable
+            sinkMaxBytes: Size from which the sink is rotated aside, 0 for no limit
+        """
+        self.__logger = logger
+        self.__sinkPath = sinkPath
+        self.__sinkMaxBytes = sinkMaxBytes
+        self.__sampleRate = sampleRate
+        self.__slowThreshold = slowThreshold
+        self.__queue = queue.SimpleQueue()
+        self.__writer = threading.Thread(target = self.__writerLoop, daemon = True, name = "TraceWriter")
+        self.__writer.start()
+
+#-----------------------------------------------------------------------------------------------------------------------
+    def startTrace(self, name, startTime = None, **attributes):
+        """ Start a trace, it isn't made current
+        Params:
+            name: Trace name
+            startTime: Optional time.perf_counter() the trace had started at, defaults to now
+            attributes: Trace attributes
+        Return: Trace
+        """
+        return Trace(self, name, time.perf_counter() if startTime is None else startTime, attributes)
+
+#-----------------------------------------------------------------------------------------------------------------------
+    def close(self):
+        """ Write pending traces and stop the writer
+        """
+        self.__queue.put(None)
+        self.__writer.join()
+
+#-----------------------------------------------------------------------------------------------------------------------
+    def _finish(self, trace):
+        if (self.__slowThreshold > 0 and trace.duration >= self.__slowThreshold) or random.random() < self.__sampleRate:
+            self.__queue.put(trace)
+
+#-----------------------------------------------------------------------------------------------------------------------
+    def __writerLoop(self):
+        self.__logger.info("Writing sampled traces: sinkPath=%s sampleRate=%s slowThreshold=%s sinkMaxBytes=%s", 
+                           self.__sinkPath, self.__sampleRate, self.__slowThreshold, self.__sinkMaxBytes)
+
+        sinkFile = self.__openSink()
+
+        while True:
+            trace = self.__queue.get()
+
+            if trace is None:
+                break
+
+            if sinkFile is None:
+                continue
+
+            try:
+                sinkFile.write(json.dumps(trace._toDict(), default = str) + '\n')
+
+                # Flush once caught up, so traces are readable while the bridge runs
+                if self.__queue.empty():
+                    sinkFile.flush()
+
+                if self.__sinkMaxBytes > 0 and sinkFile.tell() >= self.__sinkMaxBytes:
+                    sinkFile.close()
+                    self.__rotateSink()
+                    sinkFile = self.__openSink()
+
+            except Exception:
+                self.__logger.exception("Failed writing trace: traceId=%s", trace.traceId)
+
+        if sinkFile is not None:
+            sinkFile.close()
+
+#-----------------------------------------------------------------------------------------------------------------------
+    def __openSink(self):
+        try:
+            return open(self.__sinkPath, 'a')
+        except Exception:
+            self.__logger.exception("Failed opening trace sink, traces are discarded: sinkPath=%s", self.__sinkPath)
+            return None
+
+#-----------------------------------------------------------------------------------------------------------------------
+    def __rotateSink(self):
+        for i in range(self.__SINK_BACKUP_COUNT - 1, 0, -1):
+            backupPath = '%s.%s' % (self.__sinkPath, i)
+
+            if os.path.exists(backupPath):
+                os.replace(backupPath, '%s.%s' % (self.__sinkPath, i + 1))
+
+        os.replace(self.__sinkPath, self.__sinkPath + '.1')
@@ -0,0 +1,177 @@
+import enum
+import os
+import socket
+import struct
+import threading
+import time
+import typing
+
+#======================================================================================================================
+class CaptureDirection(enum.IntEnum):
+    In  = 0
+    Out = 1
+
+#======================================================================================================================
+class CaptureChannel(enum.IntEnum):
+    HeartbeatReceive = 0
+    HeartbeatSend    = 1
+    Des              = 2
+    Dec              = 3
+
+#======================================================================================================================
+class CaptureRecord(typing.NamedTuple):
+    time      : float # Seconds since capture start
+    direction : CaptureDirection
+    channel   : CaptureChannel
+    peerTuple : tuple # Remote (ip, port), the destination for sent datagrams
+    localPort : int   # Bridge port the datagram was received on or sent from
+    data      : bytes
+
+#======================================================================================================================
+class CaptureWriter:
+    """ Writes datagrams to a capture file.
+    File layout is a header (magic, wall clock start time) followed by records, each being a fixed header (time since
+    start, direction, channel, peer IPv4, peer port, local port, length) and the datagram itself, all little endian.
+    """
+
+    MAGIC = b'DDSCAP\x00\x01'
+    FILE_HEADER = struct.Struct('<8sd')
+    RECORD_HEADER = struct.Struct('<dBB4sHHH')
+
+    # Previous captures kept aside as <filePath>.1 (the latest) to <filePath>.N, a restart after a crash must not wipe
+    # the traffic which led to it
+    __BACKUP_COUNT = 5
+
+#-----------------------------------------------------------------------------------------------------------------------
+    def __init__(self, filePath):
+        """ C'tor, an existing file is rotated aside
+        Params:
+            filePath: Capture file path
+        """
+        self.__rotate(filePath)
+        self.__file = open(filePath, 'wb')
+        self.__file.write(self.FILE_HEADER.pack(self.MAGIC, time.time()))
+        self.__startTime = time.monotonic()
+        self.__lock = threading.Lock()
+
+#-----------------------------------------------------------------------------------------------------------------------
+    def write(self, direction, channel, peerTuple, localPort, data):
+        """ Append a datagram
+        Params:
+            direction: CaptureDirection
+            channel: CaptureChannel
+            peerTuple: Remote (ip, port)
+            localPort: Local port of the bridge socket
+            data: Datagram bytes
+        """
+        header = self.RECORD_HEADER.pack(time.monotonic() - self.__startTime, direction, channel,
+                                         socket.inet_aton(peerTuple[0]), peerTuple[1], localPort, len(data))
+
+        with self.__lock:
+            self.__file.write(header)
+            self.__file.write(data)
+
+#-----------------------------------------------------------------------------------------------------------------------
+    def close(self):
+        with self.__lock:
+            self.__file.close()
+
+#-----------------------------------------------------------------------------------------------------------------------
+    def __rotate(self, filePath):
+        if not os.path.exists(filePath):
+            return
+
+        for i in range(self.__BACKUP_COUNT - 1, 0, -1):
+            backupPath = '%s.%s' % (filePath, i)
+
+            if os.path.exists(backupPath):
+                os.replace(backupPath, '%s.%s' % (filePath, i + 1))
+
+        os.replace(filePath, filePath + '.1')
+
+#======================================================================================================================
+class CaptureReader:
+    """ Iterates the CaptureRecords of a capture file
+    """
+
+#-----------------------------------------------------------------------------------------------------------------------
+    def __init__(self, filePath):
+        """ C'tor
+        Params:
+            filePath: Capture file path
+        """
+        self.__filePath = filePath
+
+        with open(filePath, 'rb') as captureFile:
+            magic, self.__startWallTime = CaptureWriter.FILE_HEADER.unpack(
+                captureFile.read(CaptureWriter.FILE_HEADER.size))
+
+        if magic != CaptureWriter.MAGIC:
+            raise ValueError("Not a DDS capture file: filePath=%s" % filePath)
+
+#-----------------------------------------------------------------------------------------------------------------------
+    @property
+    def startWallTime(self):
+        """ Wall clock time (seconds since epoch) the capture had started at
+        """
+        return self.__startWallTime
+
+#-----------------------------------------------------------------------------------------------------------------------
+    def __iter__(self):
+        headerSize = CaptureWriter.RECORD_HEADER.size
+
+        with open(self.__filePath, 'rb') as captureFile:
+            captureFile.seek(CaptureWriter.FILE_HEADER.size)
+
+            while True:
+                header = captureFile.read(headerSize)
+
+                # A truncated trailing record is expected if the bridge was killed while capturing
+                if len(header) < headerSize:
+                    break
+
+                recordTime, direction, channel, peerIp, peerPort, localPort, length = \
+                    CaptureWriter.RECORD_HEADER.unpack(header)
+                data = captureFile.read(length)
+
+                if len(data) < length:
+                    break
+
+                yield CaptureRecord(recordTime, CaptureDirection(direction), CaptureChannel(channel),
+                                    (socket.inet_ntoa(peerIp), peerPort), localPort, data)
+
+#======================================================================================================================
+class _CapturingSocket:
+    """ UDP socket proxy recording every datagram received or sent through it
+    """
+
+#-----------------------------------------------------------------------------------------------------------------------
+    def __init__(self, udpSocket, captureWriter, channel):
+        """ C'tor, the socket must already be bound
+        Params:
+            udpSocket: Socket to proxy
+            captureWriter: CaptureWriter to record to
+            channel: CaptureChannel of the socket
+        """
+        self.__socket = udpSocket
+        self.__captureWriter = captureWriter
+        self.__channel = channel
+        self.__localPort = udpSocket.getsockname()[1]
+
+#-----------------------------------------------------------------------------------------------------------------------
+    def recvfrom(self, bufferSize):
+        data, peerTuple = self.__socket.recvfrom(bufferSize)
+        self.__captureWriter.write(CaptureDirection.In, self.__channel, peerTuple, self.__localPort, data)
+
+        return data, peerTuple
+
+#-----------------------------------------------------------------------------------------------------------------------
+    def sendto(self, data, peerTuple):
+        res = self.__socket.sendto(data, peerTuple)
+        self.__captureWriter.write(CaptureDirection.Out, self.__channel, peerTuple, self.__localPort, data)
+
+        return res
+
+#-----------------------------------------------------------------------------------------------------------------------
+    def __getattr__(self, name):
+        return getattr(self.__socket, name)
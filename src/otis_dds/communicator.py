@@ -1,3 +1,4 @@
+import ctypes
 import socket
 import struct
 import sys
@@ -9,8 +10,15 @@ import functools
 import dataclasses
 import logging
 import threading
+import queue
+import select
+
+import metrics.registry
+import metrics.tracing
 
 from . import packets
+from . import security_system_adapter
+from . import capture
 
 #======================================================================================================================
 class DdsCommunicator:
@@ -19,8 +27,47 @@ class DdsCommunicator:
     ICD_MINOR = 0x0
 
     __PACKET_RECV_BUFFER_SIZE = 4096
-    __PACKET_RECV_SOCKET_TIMEOUT = 0.001
+    __RECEIVE_WAIT_TIMEOUT = 0.001
+    __RECEIVE_BURST_SIZE = 64
+    __RETRANSMIT_CHECK_INTERVAL = 0.01
+
+    # Received credential and configuration work kept waiting at most, about what a default socket buffer holds. Work 
+    # beyond is dropped as the kernel would have, while the sockets are still drained for heartbeats and ACKs
+    __WORK_QUEUE_MAX_SIZE = 1024
+    __PEER_CACHE_MAX_SIZE = 4096
+    __THREAD_PRIORITY_HIGHEST = 2
+
+    # Handling of credentials received while the admission queue is full: 
+    #   deny - Answer with a deny
+    #   cache - Answer from the adapter's last known decision, see getCachedAccessInfo, deny if there is none
+    #   dropOldest - Drop the oldest queued credential (the received one if none is queued) unanswered, its DEC re-sends 
+    #                it
+    OVERLOAD_POLICIES = ('deny', 'cache', 'dropOldest')
+
+    # Answer to credentials denied under overload
+    __OVERLOAD_ACCESS_INFO = security_system_adapter.SecuritySystemAdapterInterface.AccessInfo(
+        False, 
+        0, 
+        security_system_adapter.SecuritySystemAdapterInterface.AccessInfo.DoorType.Front, 
+        [], 
+        [],
+        False,
+        0,
+        0)
+
+    # Packet IDs skipped on taking over from replicated state, covering IDs allocated after the last replicated one
+    __IMPORTED_PACKET_ID_MARGIN = 1 << 16
     
+#-----------------------------------------------------------------------------------------------------------------------
+    class _WorkClass(enum.IntEnum):
+        """ Classes of work done by the DDS thread, in priority order
+        """
+        Heartbeat     = 0 # Received DES heartbeats
+        Ack           = 1 # Received ACKs, clearing the backlog
+        Credential    = 2 # Received credentials and completed lookups, answered with access info
+        Configuration = 3 # Any other received packet (e.g. DEC online status, answered by configuration pushes) and 
+                          # retransmits
+
 #-----------------------------------------------------------------------------------------------------------------------
     @dataclasses.dataclass
     class Configuration():
@@ -45,20 +92,32 @@ class DdsCommunicator:
         interactiveSendPortDec           : int = 0
 
         interactiveDuplicatesCacheSize   : int = 0
+        interactiveReceiveBatchSize      : int = 1
+        interactiveAdmissionQueueSize    : int = 0      # Credentials queued or looked up at once, 0 for no limit
+        interactiveOverloadPolicy        : str = 'deny' # deny, cache or dropOldest, see OVERLOAD_POLICIES
 
         decOperationMode                 : int = 0      
 
+        capturePath                      : str = ''
+
 #-----------------------------------------------------------------------------------------------------------------------
-    def __init__(self, logger, configuration, securitySystemAdapter):
+    def __init__(self, logger, configuration, securitySystemAdapter, metricsRegistry = None, tracer = None):
         """ C'tor
         Params:
             logger: Python logging interface
             configuration: DdsCommunicator configuration
             securitySystemAdapter: Adapter twards the security system
+            metricsRegistry: Optional MetricsRegistry to report to
+            tracer: Optional metrics.tracing.Tracer to trace swipes with
         """
 
         self.__shouldRun = False
         self.__daemon = None
+        self.__heartbeatDaemon = None
+        self.__heartbeatStopEvent = threading.Event()
+        self.__isFirstHeartbeatSent = False
+        self.__firstHeartbeatListeners = []
+        self.__desStateLock = threading.Lock()
         self.__logger = logger
         self.__configuration = configuration
         self.__securitySystemAdapter = securitySystemAdapter
@@ -66,12 +125,31 @@ class DdsCommunicator:
         self.__heartbeatSendSocket = None
         self.__interactiveSocketDes = None
         self.__interactiveSocketDec = None
+        self.__captureWriter = None
+        self.__tracer = tracer
+        self.__importedState = None
         self.__packetIdAllocator = packets._IdAllocator()
+        self.__isAsyncAdapter = isinstance(securitySystemAdapter, 
+                                           security_system_adapter.AsyncSecuritySystemAdapterInterface)
+        self.__completedLookups = queue.Queue()
+        self.__receiveSockets = ()
+        self.__workQueues = tuple(collections.deque() for _ in self._WorkClass)
+
+        # Heartbeats and ACKs are bounded by the amount of peers and of sent packets, and are served first
+        self.__workQueueMaxSizes = [sys.maxsize] * len(self._WorkClass)
+        self.__workQueueMaxSizes[self._WorkClass.Credential] = max(self.__WORK_QUEUE_MAX_SIZE, 
+                                                                   configuration.interactiveAdmissionQueueSize)
+        self.__workQueueMaxSizes[self._WorkClass.Configuration] = self.__WORK_QUEUE_MAX_SIZE
+        self.__workClassByPacketType = {}
+        self.__nextRetransmitTime = 0.0
+        self.__inFlightLookups = {}
+        self.__isReconfigureRequested = False
 
         self.__interactivePacketClasses = {}
         self.__interactivePacketsRectors = {}
+        self.__interactivePacketsRectorsByPeerIp = {}
+        self.__lastHeartbeatByDesIp = {}
 
-        self.__heartbeatSendNextTime = time.monotonic() + self.__configuration.heartbeatSendInterval
         self.__heartbeatSendPacket = packets._PacketHeartbeat(packets._PacketHeartbeat.SourceType.SS, 
                                                              self.ICD_MAJOR, 
                                                              self.ICD_MINOR, 
@@ -87,6 +165,32 @@ class DdsCommunicator:
         self.__registerPacketClass(packets._PacketInteractiveDecSecurityOperationModeV2)
         self.__registerPacketClass(packets._PacketInteractiveDecSecurityAutorizedDefaultFloorV2)
 
+        metricsRegistry = metricsRegistry or metrics.registry.MetricsRegistry()
+        self.__metrics = packets._DdsMetrics(metricsRegistry, self.__interactivePacketClasses)
+
+        workQueueDepth = metricsRegistry.gauge('dds_work_queue_depth', 'Work waiting for the DDS thread by class', 
+                                               ('class',))
+
+        for workClass in self._WorkClass:
+            workQueue = self.__workQueues[workClass]
+
+            if workClass == self._WorkClass.Credential:
+                workQueueDepth.bind(lambda workQueue = workQueue: len(workQueue) + self.__completedLookups.qsize(), 
+                                    workClass.name)
+            else:
+                workQueueDepth.bind(lambda workQueue = workQueue: len(workQueue), workClass.name)
+
+        workDropped = metricsRegistry.counter('dds_work_dropped_total', 'Received work dropped for its queue being full ' +
+                                              'by class', ('class',))
+        self.__workDropped = tuple(workDropped.labels(x.name) for x in self._WorkClass)
+
+        self.__credentialsAttached = metricsRegistry.counter('dds_credentials_attached_total', 
+                                                             'Credentials answered by the in-flight lookup of the ' +
+                                                             'same DEC and credential').labels()
+        self.__credentialsShed = metricsRegistry.counter('dds_credentials_shed_total', 
+                                                         'Credentials not admitted for the admission queue being ' +
+                                                         'full by overload policy', 
+                                                         ('policy',)).labels(configuration.interactiveOverloadPolicy)
 
 #-----------------------------------------------------------------------------------------------------------------------  
     def start(self):
@@ -105,7 +209,7 @@ class DdsCommunicator:
             
             self.__heartbeatReceiveSocket.setsockopt(socket.IPPROTO_IP, socket.IP_ADD_MEMBERSHIP, mreq)
             self.__heartbeatReceiveSocket.bind(listenTuple)
-            self.__heartbeatReceiveSocket.settimeout(self.__PACKET_RECV_SOCKET_TIMEOUT)
+            self.__heartbeatReceiveSocket.setblocking(False)
             
             # Initialize send MCast socket
             self.__logger.info("Initializing send MCast socket: ip=%s", self.__configuration.localIp)
@@ -118,7 +222,7 @@ class DdsCommunicator:
             self.__logger.info("Initializing interactive DES socket: tuple=%s", listenTuple)
             self.__interactiveSocketDes = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
             self.__interactiveSocketDes.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
-            self.__interactiveSocketDes.settimeout(self.__PACKET_RECV_SOCKET_TIMEOUT)
+            self.__interactiveSocketDes.setblocking(False)
             self.__interactiveSocketDes.bind(listenTuple)
 
             # Initializing Interactive DEC socket
@@ -126,19 +230,41 @@ class DdsCommunicator:
             self.__logger.info("Initializing interactive DEC socket: tuple=%s", listenTuple)
             self.__interactiveSocketDec = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
             self.__interactiveSocketDec.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
-            self.__interactiveSocketDec.settimeout(self.__PACKET_RECV_SOCKET_TIMEOUT)
+            self.__interactiveSocketDec.setblocking(False)
             self.__interactiveSocketDec.bind(listenTuple)
 
+            if self.__configuration.capturePath:
+                self.__startCapture()
+
+            self.__receiveSockets = (self.__heartbeatReceiveSocket, self.__interactiveSocketDes, 
+                                     self.__interactiveSocketDec)
+
+            if self.__importedState is not None:
+                self.__applyImportedState()
+
             self.__shouldRun = True
 
+            self.__heartbeatStopEvent.clear()
+
             try:
-                self.__daemon = threading.Thread(target = self.__mainLoop, daemon = True)
+                self.__daemon = threading.Thread(target = self.__mainLoop, daemon = True, name = "DdsCommunicator")
                 self.__daemon.start()
 
+                # Heartbeats have their own thread so interactive load can't delay them
+                self.__heartbeatDaemon = threading.Thread(target = self.__heartbeatLoop, daemon = True, 
+                                                          name = "DdsHeartbeat")
+                self.__heartbeatDaemon.start()
+
             except Exception as e:
                 self.__logger.exception("Failed spawning daemon thread")
                 self.__shouldRun = False
+                self.__heartbeatStopEvent.set()
+
+                if self.__daemon is not None:
+                    self.__daemon.join()
+
                 self.__daemon = None
+                self.__heartbeatDaemon = None
                 raise
         
         else:
@@ -151,14 +277,21 @@ class DdsCommunicator:
         if self.__shouldRun:
             self.__logger.info("Stopping DDS Communicator...")
             self.__shouldRun = False
+            self.__heartbeatStopEvent.set()
             self.__daemon.join()
+            self.__heartbeatDaemon.join()
             self.__daemon = None
+            self.__heartbeatDaemon = None
 
             self.__heartbeatReceiveSocket.close()
             self.__heartbeatSendSocket.close()
             self.__interactiveSocketDes.close()
             self.__interactiveSocketDec.close()
 
+            if self.__captureWriter is not None:
+                self.__captureWriter.close()
+                self.__captureWriter = None
+
             self.__logger.info("DDS Communicator stopped!")
         else:
            self.__logger.warning("DDS Communicator is already stopped") 
@@ -168,125 +301,566 @@ class DdsCommunicator:
         self.__logger.info("DDS Communicator started!")
 
         while self.__shouldRun:
-            self.__handleHeartbeatSend()
-            self.__handleHeartbeatReceive()
-            self.__handleInteractive(self.__interactiveSocketDes)
-            self.__handleInteractive(self.__interactiveSocketDec)
+            # Wait for datagrams only when there is nothing left to do
+            hasWork = any(self.__workQueues) or not self.__completedLookups.empty()
+            self.__receiveWork(0.0 if hasWork else self.__RECEIVE_WAIT_TIMEOUT)
+            self.__dispatchWork()
+
+#-----------------------------------------------------------------------------------------------------------------------
+    def __receiveWork(self, timeout):
+        # Drain readable sockets into the work queues of their classes, bounded per socket so one flooded socket 
+        # can't hold the others back
+        readableSockets = select.select(self.__receiveSockets, [], [], timeout)[0]
+
+        for denSocket in readableSockets:
+            isHeartbeatSocket = denSocket is self.__heartbeatReceiveSocket
+
+            try:
+                for _ in range(self.__RECEIVE_BURST_SIZE):
+                    packetRaw, peerTuple = denSocket.recvfrom(self.__PACKET_RECV_BUFFER_SIZE)
+                    receiveTime = time.perf_counter()
+
+                    if isHeartbeatSocket:
+                        workClass = self._WorkClass.Heartbeat
+                    else:
+                        workClass = self.__workClassByPacketType.get(packetRaw[4:6], self._WorkClass.Configuration)
+
+                    workQueue = self.__workQueues[workClass]
+
+                    if workClass == self._WorkClass.Credential and self.__isOverloaded():
+                        self.__shedCredential(packetRaw, peerTuple, receiveTime)
+
+                    elif len(workQueue) >= self.__workQueueMaxSizes[workClass]:
+                        self.__workDropped[workClass].inc()
+                        self.__logger.debug("Work queue is full, dropping packet: packetRaw=%s peerTuple=%s", 
+                                            packetRaw, peerTuple)
+
+                    else:
+                        workQueue.append((packetRaw, peerTuple, receiveTime))
+
+            except BlockingIOError:
+                pass
+
+            except OSError as e:
+                self.__logger.exception("Failed receiving packets")
+
+#-----------------------------------------------------------------------------------------------------------------------
+    def __dispatchWork(self):
+        # Strict priority, a class is served only while all classes above it are empty. Credential and configuration 
+        # work may take long (e.g. a synchronous lookup), sockets are polled after each so heartbeats and ACKs which 
+        # arrived meanwhile go first
+        heartbeatWork, ackWork, credentialWork, configurationWork = self.__workQueues
+
+        while self.__shouldRun:
+            # Sockets being polled keep the queues filled under load, scheduled work is checked on every round
+            self.__handleScheduledWork()
+
+            if heartbeatWork:
+                self.__handleHeartbeat(*heartbeatWork.popleft())
+
+            elif ackWork:
+                packetRaw, peerTuple, receiveTime = ackWork.popleft()
+                self.__handleInteractivePacket(packetRaw, peerTuple, None, receiveTime)
+
+            elif credentialWork or not self.__completedLookups.empty():
+                self.__handleCredentialWork(credentialWork)
+                self.__receiveWork(0.0)
+
+            elif configurationWork:
+                packetRaw, peerTuple, receiveTime = configurationWork.popleft()
+                self.__handleInteractivePacket(packetRaw, peerTuple, None, receiveTime)
+                self.__receiveWork(0.0)
+
+            else:
+                break
+
+#-----------------------------------------------------------------------------------------------------------------------
+    def __handleScheduledWork(self):
+        # DEC re-configuration and retransmits come last in priority, yet are done on their own schedule so a busy DDS 
+        # thread still does them
+        if self.__isReconfigureRequested:
+            self.__isReconfigureRequested = False
+
+            for reactor in list(self.__interactivePacketsRectors.values()):
+                try:
+                    reactor._configureOnlineDecs()
+                except Exception as e:
+                    self.__logger.exception("Failed re-configuring DECs: desIp=%s", reactor.desIp)
+
+        now = time.perf_counter()
+
+        if now >= self.__nextRetransmitTime:
+            self.__nextRetransmitTime = now + self.__RETRANSMIT_CHECK_INTERVAL
+
+            try:
+                for reactor in self.__interactivePacketsRectors.values():
+                    reactor._handleUnAckedPackets()
+          
+            except Exception as e:
+                self.__logger.exception("Failed handling send un-acked packets")
+
+#-----------------------------------------------------------------------------------------------------------------------  
+    def addFirstHeartbeatListener(self, listener):
+        """ Add a listener called once the first SS heartbeat was sent, from the heartbeat thread. Add listeners before 
+        starting.
+        Params:
+            listener: Callable taking no arguments
+        """
+        self.__firstHeartbeatListeners.append(listener)
+
+#-----------------------------------------------------------------------------------------------------------------------  
+    def reconfigureDecs(self):
+        """ Send the operation mode to all online DECs again, e.g. once the ALLOWED floors had changed. May be called 
+        from any thread, the DDS thread sends them along with its configuration work.
+        """
+        self.__isReconfigureRequested = True
+
+#-----------------------------------------------------------------------------------------------------------------------  
+    def exportState(self):
+        """ Get the runtime state a standby bridge takes over with, see importState. May be called from any thread.
+        Return: JSON serializable dictionary
+        """
+        with self.__desStateLock:
+            reactors = list(self.__interactivePacketsRectors.values())
+
+        return {'nextPacketId' : self.__packetIdAllocator.nextId,
+                'reactors'     : [x._exportState() for x in reactors]}
+
+#-----------------------------------------------------------------------------------------------------------------------  
+    def importState(self, state):
+        """ Warm up from the state exported by an active bridge, takes effect on the following start
+        Params:
+            state: Dictionary returned by exportState
+        """
+        self.__importedState = state
+
+#-----------------------------------------------------------------------------------------------------------------------        
+    def __applyImportedState(self):
+        state = self.__importedState
+        self.__importedState = None
+        now = time.perf_counter()
+
+        for reactorState in state['reactors']:
+            desIp = reactorState['desIp']
+            reactor = self.__getReactor(desIp) or self.__createReactor(desIp)
+            reactor._importState(reactorState)
 
+            # Considered online as replicated, the heartbeat timeout tells otherwise
+            self.__keepDesAlive(reactor, desIp, now)
+
+        self.__packetIdAllocator.skipTo((state['nextPacketId'] + self.__IMPORTED_PACKET_ID_MARGIN) & 0xffffffff)
+        self.__logger.info("Replicated state was imported: reactors=%s", len(state['reactors']))
+
+#-----------------------------------------------------------------------------------------------------------------------        
+    def __createReactor(self, desIp):
+        reactor = packets._InteractiveReactor(self.__logger, 
+                                              desIp, 
+                                              self.__configuration, 
+                                              self.__interactiveSocketDes, 
+                                              self.__interactiveSocketDec, 
+                                              self.__interactivePacketClasses,
+                                              self.__packetIdAllocator,
+                                              self.__securitySystemAdapter,
+                                              self.__metrics,
+                                              self.__tracer)
+
+        with self.__desStateLock:
+            self.__interactivePacketsRectors[self.__getSubnetKey(desIp)] = reactor
+
+        return reactor
+
+#-----------------------------------------------------------------------------------------------------------------------        
+    def __startCapture(self):
+        # Sockets are proxied only when capturing so there is no cost otherwise
+        self.__logger.info("Capturing DDS traffic: capturePath=%s", self.__configuration.capturePath)
+        self.__captureWriter = capture.CaptureWriter(self.__configuration.capturePath)
+
+        self.__heartbeatReceiveSocket = capture._CapturingSocket(self.__heartbeatReceiveSocket, self.__captureWriter, 
+                                                                 capture.CaptureChannel.HeartbeatReceive)
+        self.__heartbeatSendSocket = capture._CapturingSocket(self.__heartbeatSendSocket, self.__captureWriter, 
+                                                              capture.CaptureChannel.HeartbeatSend)
+        self.__interactiveSocketDes = capture._CapturingSocket(self.__interactiveSocketDes, self.__captureWriter, 
+                                                               capture.CaptureChannel.Des)
+        self.__interactiveSocketDec = capture._CapturingSocket(self.__interactiveSocketDec, self.__captureWriter, 
+                                                               capture.CaptureChannel.Dec)
 
 #-----------------------------------------------------------------------------------------------------------------------        
     def __registerPacketClass(self, packetClass):
         self.__logger.debug("Registering packet: packetClass=%s", packetClass)
         self.__interactivePacketClasses[packetClass.TYPE] = packetClass
 
+        # Keyed by the raw type field so received packets are classified without decoding them
+        if packetClass is packets._PacketInteractiveAck:
+            workClass = self._WorkClass.Ack
+        elif getattr(packetClass, 'IS_BATCHABLE', False):
+            workClass = self._WorkClass.Credential
+        else:
+            workClass = self._WorkClass.Configuration
+
+        self.__workClassByPacketType[struct.pack('H', packetClass.TYPE)] = workClass
+
+#-----------------------------------------------------------------------------------------------------------------------  
+    def __getSubnetKey(self, ipAddress):
+        # The /24 a DES and its DECs share as a packed integer
+        return int.from_bytes(socket.inet_aton(ipAddress), 'big') >> 8
+
 #-----------------------------------------------------------------------------------------------------------------------  
-    def __removeLastIpOctet(self, ipAddress):
-        return '.'.join(ipAddress.split('.')[0:3])
+    def __getReactor(self, peerIp):
+        # Peers are few and fixed, so reactors are resolved by the peer IP string as received and the address is only 
+        # parsed the first time a peer is seen
+        reactor = self.__interactivePacketsRectorsByPeerIp.get(peerIp, None)
+
+        if reactor is None:
+            reactor = self.__interactivePacketsRectors.get(self.__getSubnetKey(peerIp), None)
+
+            if reactor is not None:
+                if len(self.__interactivePacketsRectorsByPeerIp) >= self.__PEER_CACHE_MAX_SIZE:
+                    self.__interactivePacketsRectorsByPeerIp.clear()
+
+                self.__interactivePacketsRectorsByPeerIp[peerIp] = reactor
+
+        return reactor
 
 #-----------------------------------------------------------------------------------------------------------------------
-    def __handleHeartbeatSend(self):
-        now = time.monotonic()
-       
-        if self.__heartbeatSendNextTime <= now:
-            self.__heartbeatSendNextTime = self.__heartbeatSendNextTime + self.__configuration.heartbeatSendInterval
+    def __heartbeatLoop(self):
+        # Heartbeat sends and DES timeouts are scheduled on absolute deadlines of the high resolution clock, a late 
+        # wake up delays a single send and doesn't shift the following ones
+        interval = self.__configuration.heartbeatSendInterval
+
+        # First heartbeat goes out right away, DESs are waiting for it since the bridge started
+        nextSendTime = time.perf_counter()
+        isWindows = sys.platform == 'win32'
+
+        if isWindows:
+            # Windows timers tick every 15.6ms by default, raise their resolution while running and wake up ahead of 
+            # interactive threads
+            ctypes.windll.winmm.timeBeginPeriod(1)
+            ctypes.windll.kernel32.SetThreadPriority(ctypes.windll.kernel32.GetCurrentThread(), 
+                                                     self.__THREAD_PRIORITY_HIGHEST)
 
-            self.__logger.debug("Heartbeat send time had elapsed, updating and sending: heartbeatSendNextTime=%s, packet=%s", 
-                                self.__heartbeatSendNextTime,
-                                self.__heartbeatSendPacket)
+        try:
+            while not self.__heartbeatStopEvent.is_set():
+                now = time.perf_counter()
 
-            try:
-                self.__heartbeatSendSocket.sendto(self.__heartbeatSendPacketPacked, 
-                                                 (self.__configuration.heartbeatSendMcGroup, 
-                                                  self.__configuration.heartbeatSendPort))
-            
-            except Exception as e:
-                self.__logger.exception("Failed sending heartbeat packet")
+                if now >= nextSendTime:
+                    lateness = now - nextSendTime
+                    missedCount = int(lateness // interval)
+                    self.__sendHeartbeat()
+                    self.__metrics.heartbeatSendLatenessSeconds.observe(lateness)
+
+                    if missedCount > 0:
+                        self.__metrics.heartbeatSendsMissed.inc(missedCount)
+                        self.__logger.warning("Heartbeat send deadlines were missed: missedCount=%s lateness=%.3f", 
+                                              missedCount, lateness)
+
+                    nextSendTime = nextSendTime + (missedCount + 1) * interval
+
+                # A DES coming online meanwhile times out no earlier than a receive timeout from now
+                nextCheckTime = min(self.__checkDesTimeouts(now), now + self.__configuration.heartbeatReceiveTimeout)
+                self.__heartbeatStopEvent.wait(max(0.0, min(nextSendTime, nextCheckTime) - time.perf_counter()))
+
+        finally:
+            if isWindows:
+                ctypes.windll.winmm.timeEndPeriod(1)
 
 #-----------------------------------------------------------------------------------------------------------------------
-    def __handleInteractive(self, denSocket):
+    def __sendHeartbeat(self):
+        self.__logger.debug("Heartbeat send time had elapsed, sending: packet=%s", self.__heartbeatSendPacket)
+
         try:
-            # Receive an interactive packet and get its type, ID and the appropriate interactive reactor
-            packetRaw, peerTuple  = self.__interactiveSocketDes.recvfrom(4096)
+            self.__heartbeatSendSocket.sendto(self.__heartbeatSendPacketPacked, 
+                                             (self.__configuration.heartbeatSendMcGroup, 
+                                              self.__configuration.heartbeatSendPort))
+        
+        except Exception as e:
+            self.__logger.exception("Failed sending heartbeat packet")
+            return
 
-            try:
-                packetId, packetType = struct.unpack_from('IH', packetRaw)
-                self.__logger.debug("Received interactive packet: packetRaw=%s packetId=%s peerTuple=%s", 
-                                    packetRaw, packetId, peerTuple)
+        if not self.__isFirstHeartbeatSent:
+            self.__isFirstHeartbeatSent = True
 
-                reactor = self.__interactivePacketsRectors.get(self.__removeLastIpOctet(peerTuple[0]), None)
+            for listener in self.__firstHeartbeatListeners:
+                try:
+                    listener()
+                except Exception as e:
+                    self.__logger.exception("Failed notifying first heartbeat listener")
 
-                if reactor is not None:
-                    reactor._handlePacket(packetRaw, packetId, packetType, peerTuple)
+#-----------------------------------------------------------------------------------------------------------------------
+    def __checkDesTimeouts(self, now):
+        # Returns the earliest time an online DES may time out at
+        nextCheckTime = float('inf')
 
-                else:
-                    self.__logger.warning("Received an unexpected interactive packet," +
-                                          "discarding: packetRaw=%s packetId=%s peerTuple=%s", 
-                                           packetRaw, packetId, peerTuple)
-            except Exception as e:
-                self.__logger.exception("Failed receiving and handling interactive packet")
-      
-        except socket.timeout:
-            # Handle unacked send packets on timeout
-            try:
+        try:
+            with self.__desStateLock:
                 for reactor in self.__interactivePacketsRectors.values():
-                    reactor._handleUnAckedPackets()
-          
-            except Exception as e:
-                self.__logger.exception("Failed handling send un-acked packets")
+                    if reactor.isDesOnline:
+                        timeoutTime = reactor._lastHeartbeatTime + self.__configuration.heartbeatReceiveTimeout
+
+                        if now > timeoutTime:
+                            self.__logger.info("DES changed state to Offline: desIp=%s", reactor.desIp)
+                            self.__metrics.desTimeouts.inc()
+                            reactor._setDesOnline(False)
+
+                        else:
+                            nextCheckTime = min(nextCheckTime, timeoutTime)
+
+        except Exception as e:
+            self.__logger.exception("Failed updating DESs state")
+
+        return nextCheckTime
+
+#-----------------------------------------------------------------------------------------------------------------------
+    def __keepDesAlive(self, reactor, desIp, now):
+        with self.__desStateLock:
+            reactor._lastHeartbeatTime = now
+
+            if not reactor.isDesOnline:
+                self.__logger.info("DES changed state to Online: desIp=%s", desIp)
+                reactor._setDesOnline(True)
+
+#-----------------------------------------------------------------------------------------------------------------------
+    def __isOverloaded(self):
+        # Admitted credentials are the queued ones and those being looked up
+        admissionQueueSize = self.__configuration.interactiveAdmissionQueueSize
+
+        return (admissionQueueSize > 0 and 
+                len(self.__workQueues[self._WorkClass.Credential]) + len(self.__inFlightLookups) >= admissionQueueSize)
+
+#-----------------------------------------------------------------------------------------------------------------------
+    def __shedCredential(self, packetRaw, peerTuple, receiveTime):
+        overloadPolicy = self.__configuration.interactiveOverloadPolicy
+        credentialWork = self.__workQueues[self._WorkClass.Credential]
+
+        if overloadPolicy == 'dropOldest':
+            if credentialWork:
+                droppedRaw, droppedPeerTuple, _ = credentialWork.popleft()
+                credentialWork.append((packetRaw, peerTuple, receiveTime))
+                packetRaw, peerTuple = droppedRaw, droppedPeerTuple
+
+            self.__credentialsShed.inc()
+            self.__logger.debug("Admission queue is full, dropping credential: packetRaw=%s peerTuple=%s", 
+                                packetRaw, peerTuple)
+            return
+
+        # Decoded as any credential, so duplicates are still filtered and retransmits of an in-flight credential are 
+        # still attached to its lookup, the rest are answered right away
+        shedBatch = []
+        self.__handleInteractivePacket(packetRaw, peerTuple, shedBatch, receiveTime)
+
+        for pendingPacket in self.__admitLookups(shedBatch):
+            self.__inFlightLookups.pop(self.__getLookupKey(pendingPacket), None)
+            accessInfo = None
+
+            if overloadPolicy == 'cache':
+                try:
+                    accessInfo = self.__securitySystemAdapter.getCachedAccessInfo(*pendingPacket.packet.credential)
+                except Exception as e:
+                    self.__logger.exception("Failed getting cached access info: packet=%s", pendingPacket.packet)
+
+            self.__credentialsShed.inc()
+            self.__logger.debug("Admission queue is full, answering credential: packet=%s peerTuple=%s " +
+                                "overloadPolicy=%s isCached=%s", pendingPacket.packet, pendingPacket.peerTuple, 
+                                overloadPolicy, accessInfo is not None)
+
+            if pendingPacket.trace is not None:
+                pendingPacket.trace.setAttribute('overloadPolicy', overloadPolicy)
+
+            pendingPacket.reactor._completeBatchedPacket(pendingPacket.packet, pendingPacket.peerTuple, 
+                                                         accessInfo or self.__OVERLOAD_ACCESS_INFO, 
+                                                         pendingPacket.trace)
+
+#-----------------------------------------------------------------------------------------------------------------------
+    def __getLookupKey(self, pendingPacket):
+        # DECs are told apart by IP
+        return (pendingPacket.peerTuple[0], pendingPacket.packet.credential)
+
+#-----------------------------------------------------------------------------------------------------------------------
+    def __admitLookups(self, pendingBatch):
+        # Get the pending packets to look up, the rest are attached to the in-flight lookup of the same DEC and 
+        # credential (e.g. a DEC re-sending a swipe under a new packet ID) and answered along with it
+        lookups = []
+
+        for pendingPacket in pendingBatch:
+            key = self.__getLookupKey(pendingPacket)
+            attachedPackets = self.__inFlightLookups.get(key, None)
+
+            if attachedPackets is None:
+                self.__inFlightLookups[key] = []
+                lookups.append(pendingPacket)
+
+            else:
+                attachedPackets.append(pendingPacket)
+                self.__credentialsAttached.inc()
+                self.__logger.debug("Credential is already being looked up, attaching: packet=%s peerTuple=%s", 
+                                    pendingPacket.packet, pendingPacket.peerTuple)
+
+                if pendingPacket.trace is not None:
+                    pendingPacket.trace.setAttribute('attached', True)
+
+        return lookups
+
+#-----------------------------------------------------------------------------------------------------------------------
+    def __completeLookup(self, pendingPacket, accessInfo):
+        pendingPacket.reactor._completeBatchedPacket(pendingPacket.packet, pendingPacket.peerTuple, accessInfo, 
+                                                     pendingPacket.trace)
+
+        for x in self.__inFlightLookups.pop(self.__getLookupKey(pendingPacket), ()):
+            x.reactor._completeBatchedPacket(x.packet, x.peerTuple, accessInfo, x.trace, isAttached = True)
+
+#-----------------------------------------------------------------------------------------------------------------------
+    def __handleCredentialWork(self, credentialWork):
+        # Completed lookups only need their response sent, they go first
+        if not self.__completedLookups.empty():
+            self.__handleCompletedLookups()
+            return
+
+        pendingBatch = [] if self.__isAsyncAdapter or self.__configuration.interactiveReceiveBatchSize > 1 else None
+
+        # Credentials queued together are resolved as one batch
+        for _ in range(min(len(credentialWork), self.__configuration.interactiveReceiveBatchSize)):
+            packetRaw, peerTuple, receiveTime = credentialWork.popleft()
+            self.__handleInteractivePacket(packetRaw, peerTuple, pendingBatch, receiveTime)
+
+        if pendingBatch:
+            pendingBatch = self.__admitLookups(pendingBatch)
+
+        if not pendingBatch:
+            pass
+
+        elif self.__isAsyncAdapter:
+            self.__startAsyncLookups(pendingBatch)
+
+        else:
+            self.__handleInteractiveBatch(pendingBatch)
        
 #-----------------------------------------------------------------------------------------------------------------------
-    def __handleHeartbeatReceive(self):        
-        now = time.monotonic()
-        
+    def __handleInteractivePacket(self, packetRaw, peerTuple, pendingBatch, receiveTime):
         try:
-            # Receive a heartbeat packet
-            packetRaw, desTuple  = self.__heartbeatReceiveSocket.recvfrom(4096)
-            
+            packetId, packetType = struct.unpack_from('IH', packetRaw)
+            self.__logger.debug("Received interactive packet: packetRaw=%s packetId=%s peerTuple=%s", 
+                                packetRaw, packetId, peerTuple)
+
+            reactor = self.__getReactor(peerTuple[0])
+
+            if reactor is not None:
+                reactor._handlePacket(packetRaw, packetId, packetType, peerTuple, pendingBatch, receiveTime)
+
+            else:
+                self.__logger.warning("Received an unexpected interactive packet," +
+                                      "discarding: packetRaw=%s packetId=%s peerTuple=%s", 
+                                       packetRaw, packetId, peerTuple)
+        except Exception as e:
+            self.__logger.exception("Failed receiving and handling interactive packet")
+
+#-----------------------------------------------------------------------------------------------------------------------
+    def __handleInteractiveBatch(self, pendingBatch):
+        accessInfos = [None] * len(pendingBatch)
+        lookupTime = time.perf_counter()
+        traces = [x.trace for x in pendingBatch if x.trace is not None]
+
+        for x in pendingBatch:
+            self.__metrics.decodeLookupSeconds.observe(lookupTime - x.decodeTime)
+
+            if x.trace is not None:
+                x.trace.addSpan('dds.batch', x.decodeTime, lookupTime)
+
+        try:
+            # The batch is resolved once on behalf of all its swipes, so its spans are recorded to each of them
+            with metrics.tracing.activate(metrics.tracing.TraceGroup(traces) if traces else None):
+                with metrics.tracing.span('dds.lookup', batchSize = len(pendingBatch)):
+                    accessInfos = self.__securitySystemAdapter.getAccessInfoMany([x.packet.credential 
+                                                                                  for x in pendingBatch])
+
+        except Exception as e:
+            self.__logger.exception("Failed resolving credentials batch: size=%s", len(pendingBatch))
+
+        lookupSeconds = time.perf_counter() - lookupTime
+
+        for _ in pendingBatch:
+            self.__metrics.lookupSeconds.observe(lookupSeconds)
+
+        for x, accessInfo in zip(pendingBatch, accessInfos):
+            self.__completeLookup(x, accessInfo)
+
+#-----------------------------------------------------------------------------------------------------------------------
+    def __startAsyncLookups(self, pendingBatch):
+        for pendingPacket in pendingBatch:
             try:
-                desIp = desTuple[0]
-                heartbeatPacket = packets._PacketHeartbeat.s_createFromRaw(packetRaw)
-                self.__logger.debug("Heartbeat packet was received: packet=%s desTuple=%s", heartbeatPacket, desTuple)
-
-                # Get context or create and add if needed
-                reactorKey = self.__removeLastIpOctet(desIp)
-                interactivePacketsReactor = self.__interactivePacketsRectors.get(reactorKey, None)
-
-                if interactivePacketsReactor is None:
-                    self.__logger.info("New DES was discovered, creating an interactive reactor: desIp=%s icd=%s", desIp, 
-                    (heartbeatPacket.icdMajorNegotiable, heartbeatPacket.icdMinorNegotiable))
-                    
-                    interactivePacketsReactor = packets._InteractiveReactor(self.__logger, 
-                                                                            desIp, 
-                                                                            self.__configuration, 
-                                                                            self.__interactiveSocketDes, 
-                                                                            self.__interactiveSocketDec, 
-                                                                            self.__interactivePacketClasses,
-                                                                            self.__packetIdAllocator,
-                                                                            self.__securitySystemAdapter)
-
-                    self.__interactivePacketsRectors[reactorKey] = interactivePacketsReactor
-
-                # Update heartbeat data
-                interactivePacketsReactor._lastHeartbeatTime = now
-            
-                if not interactivePacketsReactor.isDesOnline:
-                    self.__logger.info("DES changed state to Online: desIp=%s", desIp)
-                    interactivePacketsReactor._setDesOnline(True)
-           
+                lookupTime = time.perf_counter()
+                self.__metrics.decodeLookupSeconds.observe(lookupTime - pendingPacket.decodeTime)
+
+                # The adapter copies the current context to the worker running the lookup
+                with metrics.tracing.activate(pendingPacket.trace):
+                    future = self.__securitySystemAdapter.getAccessInfoAsync(*pendingPacket.packet.credential)
+
+                # Completion is handed back to the DDS thread which owns the sockets and reactors state
+                future.add_done_callback(functools.partial(self.__onLookupDone, pendingPacket, lookupTime))
+
             except Exception as e:
-                self.__logger.exception("Failed receiving and handling heartbeat packet")
-       
-        except socket.timeout:
-            
+                self.__logger.exception("Failed starting async lookup: packet=%s", pendingPacket.packet)
+                self.__completeLookup(pendingPacket, None)
+
+#-----------------------------------------------------------------------------------------------------------------------
+    def __onLookupDone(self, pendingPacket, lookupTime, future):
+        self.__completedLookups.put((pendingPacket, lookupTime, future))
+
+#-----------------------------------------------------------------------------------------------------------------------
+    def __handleCompletedLookups(self):
+        while True:
             try:
-                # Check if a DES had timed out and update its reactor
-                for reactor in self.__interactivePacketsRectors.values():
-                    
-                    if reactor.isDesOnline and (now - reactor._lastHeartbeatTime) > self.__configuration.heartbeatReceiveTimeout:
-                        self.__logger.info("DES changed state to Offline: desIp=%s", reactor.desIp)
-                        reactor._setDesOnline(False)
-            
+                pendingPacket, lookupTime, future = self.__completedLookups.get_nowait()
+            except queue.Empty:
+                break
+
+            packet, trace = pendingPacket.packet, pendingPacket.trace
+            completeTime = time.perf_counter()
+            self.__metrics.lookupSeconds.observe(completeTime - lookupTime)
+
+            if trace is not None:
+                trace.addSpan('dds.lookup', lookupTime, completeTime)
+
+            accessInfo = None
+
+            try:
+                accessInfo = future.result()
             except Exception as e:
-                self.__logger.exception("Failed updating DESs state")
+                self.__logger.exception("Async lookup failed: packet=%s", packet)
+
+            self.__completeLookup(pendingPacket, accessInfo)
+
+#-----------------------------------------------------------------------------------------------------------------------
+    def __handleHeartbeat(self, packetRaw, desTuple, receiveTime):
+        try:
+            desIp = desTuple[0]
+            lastHeartbeat = self.__lastHeartbeatByDesIp.get(desIp, None)
+
+            # A known DES repeating its last heartbeat only needs to be kept alive
+            if lastHeartbeat is not None and lastHeartbeat[0] == packetRaw:
+                self.__keepDesAlive(lastHeartbeat[1], desIp, receiveTime)
+                return
+
+            heartbeatPacket = packets._PacketHeartbeat.s_createFromRaw(packetRaw)
+            self.__logger.debug("Heartbeat packet was received: packet=%s desTuple=%s", heartbeatPacket, desTuple)
+
+            # Get context or create and add if needed
+            interactivePacketsReactor = self.__getReactor(desIp)
+
+            if interactivePacketsReactor is None:
+                self.__logger.info("New DES was discovered, creating an interactive reactor: desIp=%s icd=%s", desIp, 
+                (heartbeatPacket.icdMajorNegotiable, heartbeatPacket.icdMinorNegotiable))
+                
+                interactivePacketsReactor = self.__createReactor(desIp)
+
+            elif lastHeartbeat is not None:
+                self.__logger.info("DES heartbeat has changed: desIp=%s icd=%s", desIp, 
+                                   (heartbeatPacket.icdMajorNegotiable, heartbeatPacket.icdMinorNegotiable))
+
+            self.__lastHeartbeatByDesIp[desIp] = (packetRaw, interactivePacketsReactor)
+
+            # Update heartbeat data
+            self.__keepDesAlive(interactivePacketsReactor, desIp, receiveTime)
+       
+        except Exception as e:
+            self.__logger.exception("Failed handling heartbeat packet")
 
 
@@ -1,12 +1,15 @@
+import socket
 import struct
 import time
 import enum
 import typing
-import dataclasses
 import collections
 import math
 import random
 
+import metrics.registry
+import metrics.tracing
+
 from . import security_system_adapter
 
 #======================================================================================================================
@@ -17,13 +20,87 @@ class _IdAllocator:
         # Between 0 to max of 32 bits
         self.__id = random.randint(0, (1 << 32)-1)
 
+#----------------------------------------------------------------------------------------------------------------------
+    @property
+    def nextId(self):
+        return self.__id
+
 #----------------------------------------------------------------------------------------------------------------------
     def allocate(self):
         res = self.__id
         self.__id = self.__id + 1
         
         return res
-    
+
+#----------------------------------------------------------------------------------------------------------------------
+    def skipTo(self, nextId):
+        self.__id = nextId
+
+#======================================================================================================================
+class _DdsMetrics:
+
+#----------------------------------------------------------------------------------------------------------------------
+    def __init__(self, metricsRegistry, packetClasses):
+        """ C'tor, metrics shared by the communicator and all interactive reactors
+        Params:
+            metricsRegistry: MetricsRegistry to report to
+            packetClasses: Dictionary of packet type to packet class of all registered packets
+        """
+        packetsReceived = metricsRegistry.counter('dds_packets_received_total', 'Interactive packets received by type', 
+                                                  ('type',))
+        self.packetsReceivedByType = {x.TYPE: packetsReceived.labels(x.__name__.lstrip('_')) 
+                                      for x in packetClasses.values()}
+        self.packetsReceivedUnsupported = packetsReceived.labels('Unsupported')
+        self.duplicates = metricsRegistry.counter('dds_duplicates_total', 
+                                                  'Duplicate interactive packets received').labels()
+
+        acksSent = metricsRegistry.counter('dds_acks_sent_total', 'Interactive ACKs sent by ACK type', ('ack',))
+        self.acksSentByType = {x: acksSent.labels(x.name) for x in _PacketInteractiveAck.AckType}
+
+        self.retransmits = metricsRegistry.counter('dds_retransmits_total', 
+                                                   'Interactive packets re-sent for lack of an ACK').labels()
+        self.retransmitTimeouts = metricsRegistry.counter('dds_retransmit_timeouts_total', 
+                                                          'Interactive packets given up on after max retries').labels()
+        self.desTimeouts = metricsRegistry.counter('dds_des_timeouts_total', 
+                                                   'DESs considered offline for lack of heartbeats').labels()
+        self.heartbeatSendLatenessSeconds = metricsRegistry.histogram('dds_heartbeat_send_lateness_seconds', 
+                                                                      'Heartbeat send time past its deadline').labels()
+        self.heartbeatSendsMissed = metricsRegistry.counter('dds_heartbeat_sends_missed_total', 
+                                                            'Heartbeat send deadlines skipped for being a whole ' +
+                                                            'interval late').labels()
+
+        self.receiveDecodeSeconds = metricsRegistry.histogram('dds_receive_decode_seconds', 
+                                                              'Interactive packet receive to decode time').labels()
+        self.decodeLookupSeconds = metricsRegistry.histogram('dds_decode_lookup_seconds', 
+                                                             'Credential decode to lookup dispatch time').labels()
+        self.lookupSeconds = metricsRegistry.histogram('dds_lookup_seconds', 
+                                                       'Credential lookup time as seen by the DDS thread').labels()
+        self.__responseSendSeconds = metricsRegistry.histogram('dds_response_send_seconds', 
+                                                               'Interactive ACK and packet send time by type', 
+                                                               ('type',))
+        self.__responseSendSecondsByType = {}
+        self.ackSendSeconds = self.responseSendSeconds(_PacketInteractiveAck)
+
+#----------------------------------------------------------------------------------------------------------------------
+    def responseSendSeconds(self, packetClass):
+        """ Get the send time histogram of a packet class
+        """
+        histogram = self.__responseSendSecondsByType.get(packetClass.TYPE, None)
+
+        if histogram is None:
+            histogram = self.__responseSendSeconds.labels(packetClass.__name__.lstrip('_'))
+            self.__responseSendSecondsByType[packetClass.TYPE] = histogram
+
+        return histogram
+
+#======================================================================================================================
+class _PendingPacket(typing.NamedTuple):
+    reactor    : object # _InteractiveReactor the packet was received by
+    packet     : object
+    peerTuple  : tuple
+    decodeTime : float  # time.perf_counter() of when the packet was decoded
+    trace      : object # metrics.tracing.Trace of the swipe, None when not traced
+
 #======================================================================================================================
 class _InteractiveReactor:
 
@@ -31,24 +108,37 @@ class _InteractiveReactor:
             Des = 0
             Dec = 1
 
-        @dataclasses.dataclass
         class _UnAackedSentPacket():
-
-            packet        : object
-            peerTuple     : ()
-            lastSendTime  : int
-            denChannel    : int
-            retryCount    : int = 0
+            """ Backlog entry of a sent packet, keeping only what re-sending it takes as outstanding packets may 
+            pile up while DECs are unreachable
+            """
+            __slots__ = ('raw', 'peerTuple', 'deadline', 'denChannel', 'retryCount')
+
+            def __init__(self, raw, peerTuple, deadline, denChannel, retryCount = 0):
+                """ C'tor
+                Params:
+                    raw: Packed packet
+                    peerTuple: Peer (ip, port) tuple the packet is sent to
+                    deadline: time.monotonic() from which the packet is re-sent unless acked
+                    denChannel: Den channel the packet is sent through
+                    retryCount: Times the packet was re-sent
+                """
+                self.raw = raw
+                self.peerTuple = peerTuple
+                self.deadline = deadline
+                self.denChannel = denChannel
+                self.retryCount = retryCount
 
 #----------------------------------------------------------------------------------------------------------------------
         def __init__(self, logger, desIp, configuration, desSocket, decSocket, packetClasses, idAllocator, 
-                    securitySystemAdapter):
+                    securitySystemAdapter, ddsMetrics, tracer = None):
 
             self.__logger = logger
             self.__desIp = desIp
             self.__lastHeartbeatTime = 0
             self.__isDesOnline  = False
             self.__onlineDecMap = [0] * 256
+            self.__onlineDecSubnetId = 0
             self.__duplicatesCache = collections.OrderedDict()
             self.__unAckedBacklog = collections.OrderedDict()
             self.__configuration = configuration
@@ -63,9 +153,17 @@ class _InteractiveReactor:
 
             self.__denChannelByPeerPort = {self.__configuration.interactiveReceivePortDes : self.DenChannelType.Des,
                                            self.__configuration.interactiveReceivePortDec : self.DenChannelType.Dec}
+
+            # Send addresses are built once per peer: DECs by (subnet ID, DEC ID) under the DES /16, ACK targets by the 
+            # peer tuple they answer
+            self.__desNetwork = int.from_bytes(socket.inet_aton(desIp), 'big') & 0xffff0000
+            self.__decPeerTuples = {}
+            self.__ackTargetsByPeerTuple = {}
             self.__packetClasses = packetClasses
             self.__securitySystemAdapter = securitySystemAdapter
             self.__idAllocator = idAllocator
+            self.__metrics = ddsMetrics
+            self.__tracer = tracer
 
 #----------------------------------------------------------------------------------------------------------------------
         @property
@@ -92,24 +190,87 @@ class _InteractiveReactor:
         def onlineDecMap(self, onlineDecMap):
             self.__onlineDecMap = onlineDecMap
 
+#----------------------------------------------------------------------------------------------------------------------
+        @property
+        def onlineDecSubnetId(self):
+            """ DEC subnet ID of the online DEC map
+            """
+            return self.__onlineDecSubnetId
+
+#----------------------------------------------------------------------------------------------------------------------
+        @onlineDecSubnetId.setter
+        def onlineDecSubnetId(self, onlineDecSubnetId):
+            self.__onlineDecSubnetId = onlineDecSubnetId
+
 #----------------------------------------------------------------------------------------------------------------------
         def allocateId(self):
             return self.__idAllocator.allocate()
 
 #----------------------------------------------------------------------------------------------------------------------
-        def sendPacket(self, packet, peerIp, denChannel):
+        def decPeerTuple(self, decSubnetId, decId):
+            """ Get the send address of a DEC of this DES
+            Params:
+                decSubnetId: DEC subnet ID
+                decId: DEC ID
+            Return: (ip, port) tuple
+            """
+            key = (decSubnetId << 8) | decId
+            peerTuple = self.__decPeerTuples.get(key, None)
+
+            if peerTuple is None:
+                peerTuple = (socket.inet_ntoa((self.__desNetwork | key).to_bytes(4, 'big')), 
+                             self.__denSendPortByChannel[self.DenChannelType.Dec])
+                self.__decPeerTuples[key] = peerTuple
+
+            return peerTuple
+
+#----------------------------------------------------------------------------------------------------------------------
+        def sendPacket(self, packet, peerTuple, denChannel):
             """ Send a packet
             Params:
                 packet: Packet to send
-                peerIp: Peer IP address
+                peerTuple: Peer (ip, port) tuple, e.g. from decPeerTuple
                 denChannel: Den channel to send packet through
             """
-            
+            raw = packet.packed()
+            sendTime = time.perf_counter()
+            self.__denSocketsByChannel[denChannel].sendto(raw, peerTuple)
+            self.__metrics.responseSendSeconds(type(packet)).observe(time.perf_counter() - sendTime)
+            self.__unAckedBacklog[packet[0]] = self._UnAackedSentPacket(
+                raw, peerTuple, time.monotonic() + self.__configuration.interactiveSendRetryIntreval, denChannel)
+            trace = metrics.tracing.currentTrace()
+
+            if trace is not None:
+                trace.setAttribute('responsePacketId', packet[0])
+
+            self.__logger.debug("Sending interactie packet: packet=%s peerTuple=%s", packet, peerTuple)
+
+#----------------------------------------------------------------------------------------------------------------------
+        def configureDec(self, decSubnetId, decId):
+            """ Send the operation mode, along with the current ALLOWED floors, to a DEC of this DES
+            Params:
+                decSubnetId: DEC subnet ID
+                decId: DEC ID
+            """
+            packet = _PacketInteractiveDecSecurityOperationModeV2(self.allocateId(), 
+                                                                  [0] * 8, # Not using features
+                                                                  self.__configuration.decOperationMode, 
+                                                                  self.__securitySystemAdapter.allowedFloorsFrontMask,
+                                                                  self.__securitySystemAdapter.allowedFloorsRearMask,
+                                                                  0)
 
-            peerTuple = (peerIp, self.__denSendPortByChannel[denChannel])
-            self.__denSocketsByChannel[denChannel].sendto(packet.packed(), peerTuple)
-            self.__unAckedBacklog[packet[0]] = self._UnAackedSentPacket(packet, peerTuple, time.monotonic(), denChannel)
-            self.__logger.debug("Sending interactie packet: packet=%s peerTuple=%s", packet, peerIp)
+            self.sendPacket(packet, self.decPeerTuple(decSubnetId, decId), self.DenChannelType.Dec)
+
+#----------------------------------------------------------------------------------------------------------------------
+        def _configureOnlineDecs(self):
+            """ Send the operation mode to all online DECs again, e.g. once the ALLOWED floors had changed
+            """
+            decIds = [i for i, isOnline in enumerate(self.__onlineDecMap) if isOnline == 1]
+            self.__logger.info("Re-configuring operation mode of online DECs: desIp=%s decSubnetId=%s decIds=%s", 
+                               self.__desIp, self.__onlineDecSubnetId, decIds)
+
+            for decId in decIds:
+                self.configureDec(self.__onlineDecSubnetId, decId)
 
 #----------------------------------------------------------------------------------------------------------------------
         def _ackPacket(self, packetId):
@@ -132,13 +293,24 @@ class _InteractiveReactor:
             self.__isDesOnline = isDesOnline 
 
 #----------------------------------------------------------------------------------------------------------------------
-        def _handlePacket(self, packetRaw, packetId, packetType, peerTuple):
+        def _handlePacket(self, packetRaw, packetId, packetType, peerTuple, pendingBatch = None, receiveTime = None):
+            """ Handle a received interactive packet
+            Params:
+                packetRaw: Raw packet buffer
+                packetId: Packet ID
+                packetType: Packet type
+                peerTuple: Peer (ip, port) tuple
+                pendingBatch: Optional list collecting _PendingPacket of batchable packets, those are completed later 
+                              through _completeBatchedPacket
+                receiveTime: time.perf_counter() of when the packet was received, defaults to now
+            """
             try:
                 ackType = _PacketInteractiveAck.AckType.Unacceptable
 
                 # Filter duplicates
                 if packetId in self.__duplicatesCache:
                     ackType = _PacketInteractiveAck.AckType.Duplicate
+                    self.__metrics.duplicates.inc()
                     self.__logger.warning("Received duplicate interactive packet: packetId=%s peerTuple=%s", 
                                         packetId, peerTuple)
                     
@@ -155,32 +327,160 @@ class _InteractiveReactor:
 
                     if packetClass is None:
                         ackType = _PacketInteractiveAck.AckType.Unsupported
+                        self.__metrics.packetsReceivedUnsupported.inc()
                         self.__logger.warning("Received unsupported interactive packet: packetRaw=%s peerTuple=%s", 
                                             packetRaw, peerTuple)
 
                     else:
                         # We have a packet, let's create and react with it
                         packet = packetClass.s_createFromRaw(packetRaw, packetId)
+                        decodeTime = time.perf_counter()
+                        self.__metrics.packetsReceivedByType[packetType].inc()
+                        self.__metrics.receiveDecodeSeconds.observe(decodeTime - (receiveTime or decodeTime))
                         self.__logger.debug("Received interactive packet: packet=%s peerTuple=%s", packet, peerTuple)
 
+                        # Batchable packets implement credential and reactWithAccessInfo so their lookups can be 
+                        # resolved together (NamedTuple packets don't inherit class attributes from their bases)
+                        isBatchable = getattr(packetClass, 'IS_BATCHABLE', False)
+                        trace = None
+
+                        if isBatchable and self.__tracer is not None:
+                            trace = self.__tracer.startTrace('swipe', receiveTime or decodeTime, packetId = packetId,
+                                                             packetType = packetClass.__name__, peerIp = peerTuple[0])
+                            trace.addSpan('dds.decode', receiveTime or decodeTime, decodeTime)
+
+                        if pendingBatch is not None and isBatchable:
+                            # Reaction and ack are deferred until the whole batch is resolved
+                            pendingBatch.append(_PendingPacket(self, packet, peerTuple, decodeTime, trace))
+                            return
+
                         try:
-                            packet.react(self, self.__configuration, self.__securitySystemAdapter)
+                            lookupTime = time.perf_counter()
+
+                            with metrics.tracing.activate(trace), metrics.tracing.span('dds.react'):
+                                packet.react(self, self.__configuration, self.__securitySystemAdapter)
+
                             ackType = _PacketInteractiveAck.AckType.Acceptable
 
+                            if isBatchable:
+                                # Credential lookup is done inline by the reaction
+                                self.__metrics.decodeLookupSeconds.observe(lookupTime - decodeTime)
+                                self.__metrics.lookupSeconds.observe(time.perf_counter() - lookupTime)
+
                         except Exception as e:
                             self.__logger.exception("Failed reacting to interactive packet: packet=%s peerTuple=%s", 
                             packet, peerTuple)
+
+                        if trace is not None:
+                            self.__sendAckTraced(packetId, ackType, peerTuple, trace)
+                            return
                     
-                    ackPacket = _PacketInteractiveAck(packetId, ackType)
-                    denChannel = self.__denChannelByPeerPort[peerTuple[1]]
-                    peerTuple = (peerTuple[0], self.__denSendPortByChannel[denChannel])
-                    self.__logger.debug("Sending ack packet to peer: packet=%s peerTuple=%s", ackPacket, peerTuple)
-                    self.__denSocketsByChannel[denChannel].sendto(ackPacket.packed(), peerTuple)
+                    self.__sendAck(packetId, ackType, peerTuple)
           
             except Exception as e:
                 self.__logger.exception("Failed reacting to interactive packet: packet=%s peerTuple=%s", packetRaw, 
                                        peerTuple)
 
+#----------------------------------------------------------------------------------------------------------------------
+        def _completeBatchedPacket(self, packet, peerTuple, accessInfo, trace = None, isAttached = False):
+            """ Complete a packet deferred by _handlePacket
+            Params:
+                packet: Batchable packet
+                peerTuple: Peer (ip, port) tuple the packet was received from
+                accessInfo: Resolved access info for the packet credential, None if resolution had failed
+                trace: The packet's trace from its _PendingPacket, finished once the packet is acked
+                isAttached: The packet was attached to the lookup of the same credential from the same peer, it's 
+                            answered by that lookup's reaction so it's only acked
+            """
+            try:
+                ackType = _PacketInteractiveAck.AckType.Unacceptable
+
+                if accessInfo is not None and isAttached:
+                    ackType = _PacketInteractiveAck.AckType.Acceptable
+
+                elif accessInfo is not None:
+                    try:
+                        with metrics.tracing.activate(trace), metrics.tracing.span('dds.react'):
+                            packet.reactWithAccessInfo(self, self.__configuration, accessInfo)
+
+                        ackType = _PacketInteractiveAck.AckType.Acceptable
+
+                    except Exception as e:
+                        self.__logger.exception("Failed reacting to interactive packet: packet=%s peerTuple=%s", 
+                                                packet, peerTuple)
+
+                if trace is not None:
+                    self.__sendAckTraced(packet.packetId, ackType, peerTuple, trace)
+                else:
+                    self.__sendAck(packet.packetId, ackType, peerTuple)
+
+            except Exception as e:
+                self.__logger.exception("Failed completing batched interactive packet: packet=%s peerTuple=%s", 
+                                        packet, peerTuple)
+
+#----------------------------------------------------------------------------------------------------------------------
+        def __sendAck(self, packetId, ackType, peerTuple):
+            ackPacket = _PacketInteractiveAck(packetId, ackType)
+            ackTarget = self.__ackTargetsByPeerTuple.get(peerTuple, None)
+
+            if ackTarget is None:
+                denChannel = self.__denChannelByPeerPort[peerTuple[1]]
+                ackTarget = (self.__denSocketsByChannel[denChannel], 
+                             (peerTuple[0], self.__denSendPortByChannel[denChannel]))
+                self.__ackTargetsByPeerTuple[peerTuple] = ackTarget
+
+            denSocket, peerTuple = ackTarget
+            self.__logger.debug("Sending ack packet to peer: packet=%s peerTuple=%s", ackPacket, peerTuple)
+            sendTime = time.perf_counter()
+            denSocket.sendto(ackPacket.packed(), peerTuple)
+            self.__metrics.ackSendSeconds.observe(time.perf_counter() - sendTime)
+            self.__metrics.acksSentByType[ackType].inc()
+
+#----------------------------------------------------------------------------------------------------------------------
+        def __sendAckTraced(self, packetId, ackType, peerTuple, trace):
+            sendTime = time.perf_counter()
+
+            try:
+                self.__sendAck(packetId, ackType, peerTuple)
+            finally:
+                trace.addSpan('dds.ack', sendTime, time.perf_counter())
+                trace.setAttribute('ackType', _PacketInteractiveAck.AckType(ackType).name)
+                trace.finish()
+
+#----------------------------------------------------------------------------------------------------------------------
+        def _exportState(self):
+            """ Get the runtime state a standby reactor is warmed up with, see _importState
+            Return: JSON serializable dictionary
+            """
+            # Called from the replication thread while the DDS thread runs, each copy is taken in a single step
+            return {'desIp'             : self.__desIp,
+                    'onlineDecMap'      : list(self.__onlineDecMap),
+                    'onlineDecSubnetId' : self.__onlineDecSubnetId,
+                    'duplicates'        : list(self.__duplicatesCache),
+                    'backlog'           : [[packetId, x.raw.hex(), x.peerTuple[0], x.peerTuple[1], 
+                                            int(x.denChannel), x.retryCount] 
+                                           for packetId, x in list(self.__unAckedBacklog.items())]}
+
+#----------------------------------------------------------------------------------------------------------------------
+        def _importState(self, state):
+            """ Warm up from the state exported by the reactor of another bridge
+            Params:
+                state: Dictionary returned by _exportState
+            """
+            self.__onlineDecMap = list(state['onlineDecMap'])
+            self.__onlineDecSubnetId = state.get('onlineDecSubnetId', 0)
+
+            for packetId in state['duplicates']:
+                self.__duplicatesCache[packetId] = None
+
+            # Replicated backlog packets are due for resending right away
+            deadline = time.monotonic()
+
+            for packetId, raw, peerIp, peerPort, denChannel, retryCount in state['backlog']:
+                self.__unAckedBacklog[packetId] = self._UnAackedSentPacket(bytes.fromhex(raw), (peerIp, peerPort), 
+                                                                           deadline, self.DenChannelType(denChannel), 
+                                                                           retryCount)
+
 #----------------------------------------------------------------------------------------------------------------------
         def _handleUnAckedPackets(self):
             try:
@@ -189,47 +489,44 @@ class _InteractiveReactor:
                 # Iterate maximum to backlog size
                 for _ in range(len(self.__unAckedBacklog)):
 
-                    # Get backlog item
-                    packetId, unAckedSentPacket = self.__unAckedBacklog.popitem(False)
+                    # Get the oldest backlog item, items are sorted by deadline within the backlog
+                    packetId = next(iter(self.__unAckedBacklog))
+                    unAckedSentPacket = self.__unAckedBacklog[packetId]
 
-                    # Time to resend the packet
-                    if now - unAckedSentPacket.lastSendTime > self.__configuration.interactiveSendRetryIntreval:
-                    
-                        try:
-                            self.__logger.debug("Sending un-acked sent packet: packet=%s peerTuple=%s retryCount=%s", 
-                                                unAckedSentPacket.packet, 
-                                                unAckedSentPacket.peerTuple, 
-                                                unAckedSentPacket.retryCount)
-
-                            self.__denSocketsByChannel[unAckedSentPacket.denChannel].sendto(unAckedSentPacket.packet.packed(), 
-                                                                                            unAckedSentPacket.peerTuple)
-                        except Exception as e:
-                            self.__logger.exception("Failed sending unacked backloged packet: unAckedSentPacket=%s", 
-                                                    unAckedSentPacket)
-
-                        # Update backlog item
-                        unAckedSentPacket.lastSendTime = now
-                        unAckedSentPacket.retryCount = unAckedSentPacket.retryCount + 1
+                    if unAckedSentPacket.deadline > now:
+                        break
 
-                        # If we haven't reached the limit for packet resend push it back to the backlog
-                        if unAckedSentPacket.retryCount < self.__configuration.interactiveSendMaxRetries:
-                            self.__unAckedBacklog[packetId] = unAckedSentPacket
-                    
-                        else:
-                            self.__logger.debug("Reached retry limit for un-acked sent packet:" + 
-                                                "packetId=%s peerTuple=%s retryCount=%s", 
-                                                unAckedSentPacket.packet[0], 
-                                                unAckedSentPacket.peerTuple, 
-                                                unAckedSentPacket.retryCount)
-                           
-                            self.__logger.debug("Reached retry limit for un-acked sent packet:" + 
-                                                "unackedSentPacket=%s", 
-                                                unAckedSentPacket.packet)
+                    # Time to resend the packet, as packed when first sent
+                    try:
+                        self.__logger.debug("Sending un-acked sent packet: packetId=%s peerTuple=%s retryCount=%s", 
+                                            packetId, 
+                                            unAckedSentPacket.peerTuple, 
+                                            unAckedSentPacket.retryCount)
+
+                        self.__denSocketsByChannel[unAckedSentPacket.denChannel].sendto(unAckedSentPacket.raw, 
+                                                                                        unAckedSentPacket.peerTuple)
+                        self.__metrics.retransmits.inc()
+                    except Exception as e:
+                        self.__logger.exception("Failed sending unacked backloged packet: packetId=%s peerTuple=%s", 
+                                                packetId, unAckedSentPacket.peerTuple)
+
+                    # Update backlog item
+                    unAckedSentPacket.retryCount = unAckedSentPacket.retryCount + 1
+
+                    # If we haven't reached the limit for packet resend push it back to the backlog
+                    if unAckedSentPacket.retryCount < self.__configuration.interactiveSendMaxRetries:
+                        unAckedSentPacket.deadline = now + self.__configuration.interactiveSendRetryIntreval
+                        self.__unAckedBacklog.move_to_end(packetId)
+                
                     else:
-                        # Pusing back to front and breaking as items are sorted by time within the backlog
-                        self.__unAckedBacklog[packetId] = unAckedSentPacket
-                        self.__unAckedBacklog.move_to_end(packetId, last = False)
-                        break
+                        del self.__unAckedBacklog[packetId]
+                        self.__metrics.retransmitTimeouts.inc()
+                        self.__logger.debug("Reached retry limit for un-acked sent packet:" + 
+                                            "packetId=%s peerTuple=%s retryCount=%s raw=%s", 
+                                            packetId, 
+                                            unAckedSentPacket.peerTuple, 
+                                            unAckedSentPacket.retryCount,
+                                            unAckedSentPacket.raw)
         
             except Exception:
                 self.__logger.exception("Failed handling un-acked sent packets")
@@ -276,6 +573,19 @@ class _PacketBase(object):
         """
         return bytes([int("".join(map(str, reversed(bitList[i:i+8]))), 2) for i in range(0, len(bitList), 8)])
 
+    def _s_packFloorMap(floorMap):
+        """ Pack a floors map to a buffer of 32 bytes
+        Params:
+            floorMap: Either a 256 bit integer mask or a list of 256 0s and 1s
+        Returns:
+            A bytes buffer containing the floors map
+        """
+        if isinstance(floorMap, int):
+            return floorMap.to_bytes(32, 'little')
+
+        return _PacketBase._s_packBitList(floorMap)
+
+#----------------------------------------------------------------------------------------------------------------------
     def _s_floorListToBitList(floorList):
         """ Convert a list of numerical floors to a location on a bit list
         Params:
@@ -386,33 +696,24 @@ class _PacketInteractiveDecOnlineStatus(typing.NamedTuple, _PacketInteractiveBas
 
 #----------------------------------------------------------------------------------------------------------------------
     def react(self, reactor, configuration, securitySystemAdapter):
-        allowedFloorsFront = _PacketBase._s_floorListToBitList(securitySystemAdapter.allowedFloorsFront)
-        allowedFloorsRear = _PacketBase._s_floorListToBitList(securitySystemAdapter.allowedFloorsRear)
-
         for i in range(len(self.onlineDecMap)):
          
             # Compare online dec maps and act on change
             if reactor.onlineDecMap[i] != self.onlineDecMap[i]:
-                decIp = "%s.%s.%s" % ('.'.join(reactor.desIp.split('.')[0:2]), self.decSubnetId, i)
+                decPeerTuple = reactor.decPeerTuple(self.decSubnetId, i)
               
                 if self.onlineDecMap[i] == 1:
                     reactor.logger.info("DEC changed state to Online, configuring operation mode: decIp=%s mode=%s", 
-                                        decIp, configuration.decOperationMode)
+                                        decPeerTuple[0], configuration.decOperationMode)
                  
-                    packet = _PacketInteractiveDecSecurityOperationModeV2(reactor.allocateId(), 
-                                                                        [0] * 8, # Not using features
-                                                                        configuration.decOperationMode, 
-                                                                        allowedFloorsFront,
-                                                                        allowedFloorsRear,
-                                                                        0)
-
-                    reactor.sendPacket(packet, decIp, _InteractiveReactor.DenChannelType.Dec)
+                    reactor.configureDec(self.decSubnetId, i)
 
                 else:
-                    reactor.logger.info("DEC changed state to Offline: decIp=%s", decIp)
+                    reactor.logger.info("DEC changed state to Offline: decIp=%s", decPeerTuple[0])
 
         # Save new online DEC map
         reactor.onlineDecMap = self.onlineDecMap
+        reactor.onlineDecSubnetId = self.decSubnetId
 
 #======================================================================================================================
 class _PacketInteractiveDecSecurityOperationModeV2(typing.NamedTuple, _PacketInteractiveBase):    
@@ -421,8 +722,8 @@ class _PacketInteractiveDecSecurityOperationModeV2(typing.NamedTuple, _PacketInt
     packetId              : int                                       # I   (uint32)
     featuresMap           : list                                      # 1s  (uint8)
     mode                  : int                                       # B   (uint8)
-    allowedFloorsFrontMap : list                                      # 32s (32 * uint8)
-    allowedFloorsRearMap  : list                                      # 32s (32 * uint8)
+    allowedFloorsFrontMap : list                                      # 32s (32 * uint8) bit list or int mask
+    allowedFloorsRearMap  : list                                      # 32s (32 * uint8) bit list or int mask
     reserved              : int                                       # B   (uint8)
 
 #----------------------------------------------------------------------------------------------------------------------
@@ -445,8 +746,8 @@ class _PacketInteractiveDecSecurityOperationModeV2(typing.NamedTuple, _PacketInt
                         self.TYPE, 
                         _PacketBase._s_packBitList(self.featuresMap), 
                         self.mode,
-                        _PacketBase._s_packBitList(self.allowedFloorsFrontMap), 
-                        _PacketBase._s_packBitList(self.allowedFloorsRearMap), 
+                        _PacketBase._s_packFloorMap(self.allowedFloorsFrontMap), 
+                        _PacketBase._s_packFloorMap(self.allowedFloorsRearMap), 
                         self.reserved)
 
 
@@ -464,8 +765,8 @@ class _PacketInteractiveDecSecurityAutorizedDefaultFloorV2(typing.NamedTuple, _P
     mode                     : int                                                    # B   (uint8)
     featuresMap              : list                                                   # 1s  (uint8)
     reserved1                : int                                                    # B   (uint8)
-    authorizedFloorsFrontMap : list                                                   # 32s (32 * uint8)
-    authorizedFloorsRearMap  : list                                                   # 32s (32 * uint8)
+    authorizedFloorsFrontMap : list                                                   # 32s (32 * uint8) bits or mask
+    authorizedFloorsRearMap  : list                                                   # 32s (32 * uint8) bits or mask
     defaultFloor             : int                                                    # b   (int8)
     defaultDoor              : DoorType                                               # B   (uint8)
     dateTime                 : int                                                    # I   (uint32)
@@ -506,8 +807,8 @@ class _PacketInteractiveDecSecurityAutorizedDefaultFloorV2(typing.NamedTuple, _P
                             self.mode,
                             _PacketBase._s_packBitList(self.featuresMap),
                             self.reserved1,
-                            _PacketBase._s_packBitList(self.authorizedFloorsFrontMap),
-                            _PacketBase._s_packBitList(self.authorizedFloorsRearMap),
+                            _PacketBase._s_packFloorMap(self.authorizedFloorsFrontMap),
+                            _PacketBase._s_packFloorMap(self.authorizedFloorsRearMap),
                             self.defaultFloor,
                             int(self.defaultDoor),
                             self.dateTime,
@@ -518,6 +819,7 @@ class _PacketInteractiveDecSecurityAutorizedDefaultFloorV2(typing.NamedTuple, _P
 #======================================================================================================================
 class _PacketInteractiveDecSecurityCredentialData(typing.NamedTuple, _PacketInteractiveBase):    
     TYPE = 0x40
+    IS_BATCHABLE = True
 
     packetId                      : int   # I   (uint32)
     decSubnetId                   : int   # B   (uint8)
@@ -537,26 +839,52 @@ class _PacketInteractiveDecSecurityCredentialData(typing.NamedTuple, _PacketInte
 
 #----------------------------------------------------------------------------------------------------------------------
     def packed(self):
-        return struct.pack('IHBBBB%ss' % len(self.credentialDataBytes), self.packetId, self.TYPE, self.decSubnetId, 
+        return struct.pack('IHBBB%ss' % len(self.credentialDataBytes), self.packetId, self.TYPE, self.decSubnetId, 
                           self.decId,  self.credentialDataBitsSize, self.credentialDataBytes)
 
+#----------------------------------------------------------------------------------------------------------------------
+    @property
+    def credential(self):
+        """ (credentialData, credentialSizeBits) tuple as expected by the security system adapter
+        """
+        return (self.credentialDataBytes, self.credentialDataBitsSize)
+
 #----------------------------------------------------------------------------------------------------------------------
     def react(self, reactor, configuration, securitySystemAdapter):
         accessInfo = securitySystemAdapter.getAccessInfo(self.credentialDataBytes, self.credentialDataBitsSize)
+        self.reactWithAccessInfo(reactor, configuration, accessInfo)
+
+#----------------------------------------------------------------------------------------------------------------------
+    def reactWithAccessInfo(self, reactor, configuration, accessInfo):
+        """ React with an already resolved access info
+        Params:
+            reactor - Interactive packet reactor handling packets from
+            configuration - System configuration structure
+            accessInfo - Access info resolved for this packet credential
+        """
         defaultDoorType = _PacketInteractiveDecSecurityAutorizedDefaultFloorV2.DoorType.Front
 
         if accessInfo.defaultDoorType == security_system_adapter.SecuritySystemAdapterInterface.AccessInfo.DoorType.Rear:
             defaultDoorType = _PacketInteractiveDecSecurityAutorizedDefaultFloorV2.DoorType.Rear
 
-        decIp = "%s.%s.%s" % ('.'.join(reactor.desIp.split('.')[0:2]), self.decSubnetId, self.decId)
+        # Use precompiled masks when the adapter provides them
+        allowedFloorsFront = accessInfo.allowedFloorsFrontMask
+        allowedFloorsRear = accessInfo.allowedFloorsRearMask
+
+        if allowedFloorsFront is None:
+            allowedFloorsFront = _PacketBase._s_floorListToBitList(accessInfo.allowedFloorsFront)
+
+        if allowedFloorsRear is None:
+            allowedFloorsRear = _PacketBase._s_floorListToBitList(accessInfo.allowedFloorsRear)
+
         packet = _PacketInteractiveDecSecurityAutorizedDefaultFloorV2(reactor.allocateId(),
                                                 accessInfo.isValid,
                                                 self.credentialDataBytes,
                                                 configuration.decOperationMode,
                                                 [0] * 8, # Not using features 
                                                 0,
-                                                _PacketBase._s_floorListToBitList(accessInfo.allowedFloorsFront),
-                                                _PacketBase._s_floorListToBitList(accessInfo.allowedFloorsRear),
+                                                allowedFloorsFront,
+                                                allowedFloorsRear,
                                                 accessInfo.defaultFloor,
                                                 defaultDoorType,
                                                 int(time.mktime(time.localtime())),
@@ -564,5 +892,6 @@ class _PacketInteractiveDecSecurityCredentialData(typing.NamedTuple, _PacketInte
                                                 0,
                                                 bytes([0] * 3))
         
-        reactor.sendPacket(packet, decIp, _InteractiveReactor.DenChannelType.Dec)
+        reactor.sendPacket(packet, reactor.decPeerTuple(self.decSubnetId, self.decId), 
+                           _InteractiveReactor.DenChannelType.Dec)
 
@@ -1,5 +1,7 @@
 import typing
 import enum
+import concurrent.futures
+import contextvars
 
 #======================================================================================================================
 class SecuritySystemAdapterInterface:
@@ -18,6 +20,34 @@ class SecuritySystemAdapterInterface:
         defaultDoorType : DoorType
         allowedFloorsFront: list
         allowedFloorsRear: list
+        isStale : bool = False # Answered from a previous decision as the security system was not available in time
+        allowedFloorsFrontMask : int = None # Optional precompiled floors mask, see floorListToMask
+        allowedFloorsRearMask : int = None # Optional precompiled floors mask, see floorListToMask
+
+    @staticmethod
+    def floorListToMask(floorList):
+        """ Convert a list of floors to a 256 bit mask as laid out on the wire
+        Params:
+            floorList: List of floors between -127 to 127
+        Returns:
+            Integer where positive floors are at bits 0 to 127 and negative are at bits 129-255
+        """
+        mask = 0
+
+        for floorNumber in floorList:
+            mask |= 1 << (floorNumber & 0xff)
+
+        return mask
+
+    @staticmethod
+    def floorMaskToList(floorMask):
+        """ Convert a 256 bit floors mask back to a sorted list of floors
+        Params:
+            floorMask: Floors mask, see floorListToMask
+        Returns:
+            List of floors between -127 to 127
+        """
+        return sorted(i if i < 128 else i - 256 for i in range(256) if floorMask >> i & 1)
 
     @property
     def allowedFloorsFront(self):
@@ -31,6 +61,18 @@ class SecuritySystemAdapterInterface:
         """
         raise NotImplementedError 
 
+    @property
+    def allowedFloorsFrontMask(self):
+        """ Mask of allowed floors from the front door, override to avoid conversion
+        """
+        return self.floorListToMask(self.allowedFloorsFront)
+
+    @property
+    def allowedFloorsRearMask(self):
+        """ Mask of allowed floors from the rear door, override to avoid conversion
+        """
+        return self.floorListToMask(self.allowedFloorsRear)
+
     def getAccessInfo(self, credentialData, credentialSizeBits):
         """ Get access info for given credentials data
         Params:
@@ -39,4 +81,89 @@ class SecuritySystemAdapterInterface:
         """
         raise NotImplementedError # Return a list of floors
 
-    
\ No newline at end of file
+    def getAccessInfoMany(self, credentials):
+        """ Get access info for several credentials at once, override to amortize backend round trips
+        Params:
+            credentials: List of (credentialData, credentialSizeBits) tuples
+        Returns:
+            List of AccessInfo in the order of the given credentials
+        """
+        return [self.getAccessInfo(credentialData, credentialSizeBits) 
+                for credentialData, credentialSizeBits in credentials]
+
+    def getCachedAccessInfo(self, credentialData, credentialSizeBits):
+        """ Get access info for given credentials data without reaching the security system, used to answer under 
+        overload. Override when previous decisions are kept
+        Params:
+            credentialData: Credential data buffer
+            credentialSizeBits Credential data size in bits
+        Returns:
+            AccessInfo, None if there is no cached decision
+        """
+        return None
+
+    
+
+#======================================================================================================================
+class AsyncSecuritySystemAdapterInterface(SecuritySystemAdapterInterface):
+
+    def getAccessInfoAsync(self, credentialData, credentialSizeBits):
+        """ Start getting access info for given credentials data without blocking
+        Params:
+            credentialData: Credential data buffer
+            credentialSizeBits Credential data size in bits
+        Returns:
+            concurrent.futures.Future resolving to an AccessInfo, callbacks may run on any thread
+        """
+        raise NotImplementedError
+
+#======================================================================================================================
+class SyncToAsyncSecuritySystemAdapter(AsyncSecuritySystemAdapterInterface):
+
+    def __init__(self, securitySystemAdapter, maxWorkers):
+        """ C'tor
+        Params:
+            securitySystemAdapter: Synchronous adapter to run lookups of on worker threads
+            maxWorkers: Amount of lookups run at once, further lookups queue without bound until a worker is free (the 
+                        communicator bounds them along with queued credentials, see interactiveAdmissionQueueSize). 
+                        An adapter running lookups on workers of its own should have at least as many, so lookups 
+                        don't wait on them.
+        """
+        self.__securitySystemAdapter = securitySystemAdapter
+        self.__executor = concurrent.futures.ThreadPoolExecutor(max_workers = maxWorkers, 
+                                                                thread_name_prefix = "AsyncAdapter")
+
+    @property
+    def allowedFloorsFront(self):
+        return self.__securitySystemAdapter.allowedFloorsFront
+
+    @property
+    def allowedFloorsRear(self):
+        return self.__securitySystemAdapter.allowedFloorsRear
+
+    @property
+    def allowedFloorsFrontMask(self):
+        return self.__securitySystemAdapter.allowedFloorsFrontMask
+
+    @property
+    def allowedFloorsRearMask(self):
+        return self.__securitySystemAdapter.allowedFloorsRearMask
+
+    def getAccessInfo(self, credentialData, credentialSizeBits):
+        return self.__securitySystemAdapter.getAccessInfo(credentialData, credentialSizeBits)
+
+    def getAccessInfoMany(self, credentials):
+        return self.__securitySystemAdapter.getAccessInfoMany(credentials)
+
+    def getCachedAccessInfo(self, credentialData, credentialSizeBits):
+        return self.__securitySystemAdapter.getCachedAccessInfo(credentialData, credentialSizeBits)
+
+    def getAccessInfoAsync(self, credentialData, credentialSizeBits):
+        # Run in a copy of the caller's context so context variables (e.g. the current trace) follow the lookup
+        return self.__executor.submit(contextvars.copy_context().run, self.__securitySystemAdapter.getAccessInfo, 
+                                      credentialData, credentialSizeBits)
+
+    def shutdown(self):
+        """ Release worker threads, lookups which are still in flight are left to complete
+        """
+        self.__executor.shutdown(wait = False)
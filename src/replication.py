@@ -0,0 +1,462 @@
+import collections
+import json
+import socket
+import socketserver
+import struct
+import threading
+import time
+
+import otis_dds.packets
+
+#======================================================================================================================
+class _FrameSocket:
+    """ Length prefixed JSON frames over a TCP socket
+    """
+
+    __HEADER = struct.Struct('!I')
+    __MAX_FRAME_SIZE = 64 * 1024 * 1024
+
+#-----------------------------------------------------------------------------------------------------------------------
+    def __init__(self, tcpSocket):
+        self.__socket = tcpSocket
+
+#-----------------------------------------------------------------------------------------------------------------------
+    def send(self, frame):
+        data = json.dumps(frame, separators = (',', ':')).encode('utf-8')
+        self.__socket.sendall(self.__HEADER.pack(len(data)) + data)
+
+#-----------------------------------------------------------------------------------------------------------------------
+    def receive(self, timeout):
+        """ Receive a frame
+        Params:
+            timeout: Seconds to wait for each chunk of the frame
+        Return: Frame
+        Raises: socket.timeout, ConnectionError if the peer had closed the connection
+        """
+        self.__socket.settimeout(timeout)
+        size = self.__HEADER.unpack(self.__receiveExactly(self.__HEADER.size))[0]
+
+        if size > self.__MAX_FRAME_SIZE:
+            raise ConnectionError("Replication frame is too large: size=%s" % size)
+
+        return json.loads(self.__receiveExactly(size).decode('utf-8'))
+
+#-----------------------------------------------------------------------------------------------------------------------
+    def close(self):
+        self.__socket.close()
+
+#-----------------------------------------------------------------------------------------------------------------------
+    def __receiveExactly(self, size):
+        chunks = []
+
+        while size > 0:
+            chunk = self.__socket.recv(min(size, 1 << 20))
+
+            if not chunk:
+                raise ConnectionError("Replication peer had closed the connection")
+
+            chunks.append(chunk)
+            size = size - len(chunk)
+
+        return b''.join(chunks)
+
+#======================================================================================================================
+def probeEpoch(localIp, activeTuple, timeout):
+    """ Get the epoch of a bridge publishing replication state, from the hello frame it starts streaming with
+    Params:
+        localIp: Local IP address to connect from, the publisher accepts its peer IP only
+        activeTuple: (ip, port) of the bridge replication publisher
+        timeout: Seconds to wait for connecting and for the hello frame
+    Return: Epoch of the bridge
+    Raises: OSError, ConnectionError if the bridge doesn't publish
+    """
+    frameSocket = _FrameSocket(socket.create_connection(activeTuple, timeout = timeout, 
+                                                        source_address = (localIp, 0)))
+
+    try:
+        return frameSocket.receive(timeout)['epoch']
+    finally:
+        frameSocket.close()
+
+#======================================================================================================================
+class PeerHeartbeatMonitor:
+    """ Listens for the SS heartbeats of the other bridge of an active/standby pair on the multicast group DESs
+    follow. They tell whether the other bridge still drives the DESs, whatever its replication stream does.
+    """
+
+    __RECEIVE_TIMEOUT = 0.5
+
+#-----------------------------------------------------------------------------------------------------------------------
+    def __init__(self, logger, localIp, mcGroup, port, peerIp, timeout, onHeartbeat):
+        """ C'tor
+        Params:
+            logger: Python logging interface
+            localIp: Local IP address to join the multicast group on, e.g. DDS.localIp
+            mcGroup: Multicast group SS heartbeats are sent to, e.g. DDS.heartbeatSendMcGroup
+            port: UDP port SS heartbeats are sent to, e.g. DDS.heartbeatSendPort
+            peerIp: IP address of the other bridge, heartbeats of others are ignored
+            timeout: Seconds without heartbeats after which the other bridge is considered silent
+            onHeartbeat: Callable called from the monitor thread on each heartbeat of the other bridge
+        """
+        self.__logger = logger
+        self.__localIp = localIp
+        self.__mcGroup = mcGroup
+        self.__port = port
+        self.__peerIp = peerIp
+        self.__timeout = timeout
+        self.__onHeartbeat = onHeartbeat
+        self.__lastHeartbeatTime = time.monotonic()
+        self.__stopEvent = threading.Event()
+        self.__socket = None
+        self.__daemon = None
+
+#-----------------------------------------------------------------------------------------------------------------------
+    @property
+    def isPeerAlive(self):
+        """ True iff a heartbeat of the other bridge was received within the timeout, or the monitor was started 
+        since
+        """
+        return time.monotonic() - self.__lastHeartbeatTime < self.__timeout
+
+#-----------------------------------------------------------------------------------------------------------------------
+    def start(self):
+        """ Start listening for heartbeats of the other bridge
+        """
+        if self.__daemon is None:
+            listenTuple = (self.__localIp, self.__port)
+            self.__logger.info("Starting peer heartbeat monitor: tuple=%s mcGroup=%s peerIp=%s", listenTuple, 
+                               self.__mcGroup, self.__peerIp)
+            self.__socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            self.__socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+            mreq = struct.pack('4s4s', socket.inet_aton(self.__mcGroup), socket.inet_aton(self.__localIp))
+            self.__socket.setsockopt(socket.IPPROTO_IP, socket.IP_ADD_MEMBERSHIP, mreq)
+            self.__socket.bind(listenTuple)
+            self.__socket.settimeout(self.__RECEIVE_TIMEOUT)
+
+            # Silence is counted from now on, not from construction
+            self.__lastHeartbeatTime = time.monotonic()
+            self.__stopEvent.clear()
+            self.__daemon = threading.Thread(target = self.__run, daemon = True, name = "PeerHeartbeatMonitor")
+            self.__daemon.start()
+
+        else:
+            self.__logger.warning("Peer heartbeat monitor is already started")
+
+#-----------------------------------------------------------------------------------------------------------------------
+    def stop(self):
+        """ Stop listening for heartbeats of the other bridge
+        """
+        if self.__daemon is not None:
+            self.__logger.info("Stopping peer heartbeat monitor")
+            self.__stopEvent.set()
+            self.__daemon.join()
+            self.__socket.close()
+            self.__daemon = None
+            self.__socket = None
+
+#-----------------------------------------------------------------------------------------------------------------------
+    def __run(self):
+        heartbeatType = struct.pack('H', otis_dds.packets._PacketHeartbeat.TYPE)
+
+        while not self.__stopEvent.is_set():
+            try:
+                packetRaw, peerTuple = self.__socket.recvfrom(1024)
+
+                if peerTuple[0] != self.__peerIp or packetRaw[0:2] != heartbeatType:
+                    continue
+
+                heartbeatPacket = otis_dds.packets._PacketHeartbeat.s_createFromRaw(packetRaw)
+
+                if heartbeatPacket.source != otis_dds.packets._PacketHeartbeat.SourceType.SS:
+                    continue
+
+                self.__lastHeartbeatTime = time.monotonic()
+                self.__onHeartbeat()
+
+            except socket.timeout:
+                pass
+
+            except Exception as e:
+                if not self.__stopEvent.is_set():
+                    self.__logger.exception("Failed handling peer heartbeat")
+
+#======================================================================================================================
+class ReplicationPublisher:
+    """ Active side of an active/standby pair. Streams the runtime state to the standby bridge: a hello with the 
+    epoch of this bridge and a snapshot on connect, then every interval a frame with the DDS state and the cache updates 
+    done since the previous frame. The frames double as keep alives, a standby takes over once they stop.
+    """
+
+    __SEND_TIMEOUT = 5.0
+
+#-----------------------------------------------------------------------------------------------------------------------
+    class _Server(socketserver.ThreadingTCPServer):
+        # Started again on taking over after stepping down, while connections of before may linger
+        allow_reuse_address = True
+        daemon_threads = True
+
+#-----------------------------------------------------------------------------------------------------------------------
+    class _StandbyRequestHandler(socketserver.BaseRequestHandler):
+
+        def handle(self):
+            self.server.publisher._stream(self.request, self.client_address)
+
+#-----------------------------------------------------------------------------------------------------------------------
+    def __init__(self, logger, listenTuple, peerIp, interval, getEpoch, getDdsState, caches):
+        """ C'tor
+        Params:
+            logger: Python logging interface
+            listenTuple: (ip, port) to accept standby connections on
+            peerIp: IP address of the only standby bridge accepted, the state is not authenticated otherwise
+            interval: Seconds between state frames
+            getEpoch: Callable returning the epoch of this bridge, the count of takeovers it had followed
+            getDdsState: Callable returning the JSON serializable DDS state, e.g. DdsCommunicator.exportState
+            caches: Dictionary of name to (_ExpiringCache, encode) of caches to replicate
+        """
+        self.__logger = logger
+        self.__listenTuple = listenTuple
+        self.__peerIp = peerIp
+        self.__interval = interval
+        self.__getEpoch = getEpoch
+        self.__getDdsState = getDdsState
+        self.__caches = caches
+        self.__updateQueues = []
+        self.__updateQueuesLock = threading.Lock()
+        self.__stopEvent = threading.Event()
+        self.__server = None
+        self.__daemon = None
+
+        for name, (cache, encode) in caches.items():
+            cache.attachSink(self, name, encode)
+
+#-----------------------------------------------------------------------------------------------------------------------
+    def start(self):
+        """ Start accepting standby connections
+        """
+        if self.__server is None:
+            self.__logger.info("Starting replication publisher: tuple=%s interval=%s", self.__listenTuple,
+                               self.__interval)
+            self.__stopEvent.clear()
+            self.__server = self._Server(self.__listenTuple, self._StandbyRequestHandler)
+            self.__server.publisher = self
+            self.__daemon = threading.Thread(target = self.__server.serve_forever, daemon = True,
+                                             name = "ReplicationPublisher")
+            self.__daemon.start()
+
+        else:
+            self.__logger.warning("Replication publisher is already started")
+
+#-----------------------------------------------------------------------------------------------------------------------
+    def stop(self):
+        """ Stop streaming and close standby connections
+        """
+        if self.__server is not None:
+            self.__logger.info("Stopping replication publisher")
+            self.__stopEvent.set()
+            self.__server.shutdown()
+            self.__server.server_close()
+            self.__daemon.join()
+            self.__server = None
+            self.__daemon = None
+
+#-----------------------------------------------------------------------------------------------------------------------
+    def put(self, cacheName, key, value):
+        with self.__updateQueuesLock:
+            for updateQueue in self.__updateQueues:
+                updateQueue.append((cacheName, key, value))
+
+#-----------------------------------------------------------------------------------------------------------------------
+    def remove(self, cacheName, key):
+        self.put(cacheName, key, None)
+
+#-----------------------------------------------------------------------------------------------------------------------
+    def _stream(self, tcpSocket, standbyTuple):
+        if standbyTuple[0] != self.__peerIp:
+            self.__logger.warning("Refusing replication connection of other than the peer bridge: tuple=%s", 
+                                  standbyTuple)
+            tcpSocket.close()
+            return
+
+        self.__logger.info("Standby bridge had connected: tuple=%s", standbyTuple)
+
+        # A standby which stops reading is dropped rather than blocking the stream and queueing updates for it
+        tcpSocket.settimeout(self.__SEND_TIMEOUT)
+        frameSocket = _FrameSocket(tcpSocket)
+        updateQueue = collections.deque()
+
+        # Updates are queued before the snapshot is taken so none falls between them, replaying one is harmless
+        with self.__updateQueuesLock:
+            self.__updateQueues.append(updateQueue)
+
+        try:
+            frameSocket.send({'type' : 'hello', 'epoch' : self.__getEpoch()})
+            frameSocket.send({'type'   : 'snapshot',
+                              'dds'    : self.__getDdsState(),
+                              'caches' : {name : cache.entries(encode)
+                                          for name, (cache, encode) in self.__caches.items()}})
+
+            while not self.__stopEvent.wait(self.__interval):
+                updates = collections.defaultdict(list)
+
+                for _ in range(len(updateQueue)):
+                    cacheName, key, value = updateQueue.popleft()
+                    updates[cacheName].append((key, value))
+
+                frameSocket.send({'type' : 'state', 'dds' : self.__getDdsState(), 'caches' : updates})
+
+        except (OSError, ConnectionError) as e:
+            self.__logger.warning("Standby bridge had disconnected: tuple=%s reason=%r", standbyTuple, e)
+
+        except Exception as e:
+            self.__logger.exception("Failed streaming to standby bridge: tuple=%s", standbyTuple)
+
+        finally:
+            with self.__updateQueuesLock:
+                self.__updateQueues.remove(updateQueue)
+
+            frameSocket.close()
+
+#======================================================================================================================
+class ReplicationSubscriber:
+    """ Standby side of an active/standby pair. Keeps applying the state streamed by the active bridge and takes over
+    once no frame was received for the failover timeout, and the active bridge is not sending SS heartbeats either. A 
+    stalled stream alone may be a broken connection while the active bridge still drives the DESs.
+    """
+
+    __RECONNECT_INTERVAL = 0.2
+
+#-----------------------------------------------------------------------------------------------------------------------
+    def __init__(self, logger, localIp, activeTuple, failoverTimeout, startupTimeout, isActiveAlive, setDdsState, 
+                 caches, onFailover):
+        """ C'tor
+        Params:
+            logger: Python logging interface
+            localIp: Local IP address to connect from, the publisher accepts its peer IP only
+            activeTuple: (ip, port) of the active bridge replication publisher
+            failoverTimeout: Seconds without frames after which the active bridge is considered down
+            startupTimeout: Seconds to wait for a first frame after starting before taking over
+            isActiveAlive: Callable returning True while the active bridge is still seen sending SS heartbeats, 
+                e.g. PeerHeartbeatMonitor.isPeerAlive
+            setDdsState: Callable applying the replicated DDS state, e.g. DdsCommunicator.importState
+            caches: Dictionary of name to (_ExpiringCache, decode) of replicated caches
+            onFailover: Callable taking over, called once from the subscriber thread
+        """
+        self.__logger = logger
+        self.__localIp = localIp
+        self.__activeTuple = activeTuple
+        self.__failoverTimeout = failoverTimeout
+        self.__startupTimeout = startupTimeout
+        self.__isActiveAlive = isActiveAlive
+        self.__setDdsState = setDdsState
+        self.__caches = caches
+        self.__onFailover = onFailover
+        self.__epoch = 0
+        self.__stopEvent = threading.Event()
+        self.__daemon = None
+
+#-----------------------------------------------------------------------------------------------------------------------
+    @property
+    def epoch(self):
+        """ Epoch of the active bridge last followed, 0 if none was
+        """
+        return self.__epoch
+
+#-----------------------------------------------------------------------------------------------------------------------
+    def start(self):
+        """ Start following the active bridge
+        """
+        # The thread ends after taking over, a bridge stepping down later follows again
+        if self.__daemon is None or not self.__daemon.is_alive():
+            self.__logger.info("Starting replication subscriber: activeTuple=%s failoverTimeout=%s",
+                               self.__activeTuple, self.__failoverTimeout)
+            self.__stopEvent.clear()
+            self.__daemon = threading.Thread(target = self.__run, daemon = True, name = "ReplicationSubscriber")
+            self.__daemon.start()
+
+        else:
+            self.__logger.warning("Replication subscriber is already started")
+
+#-----------------------------------------------------------------------------------------------------------------------
+    def stop(self):
+        """ Stop following the active bridge without taking over
+        """
+        if self.__daemon is not None:
+            self.__logger.info("Stopping replication subscriber")
+            self.__stopEvent.set()
+
+            if self.__daemon is not threading.current_thread():
+                self.__daemon.join()
+
+            self.__daemon = None
+
+#-----------------------------------------------------------------------------------------------------------------------
+    def __run(self):
+        deadline = time.monotonic() + self.__startupTimeout
+        isFencedLogged = False
+
+        while not self.__stopEvent.is_set():
+            remaining = deadline - time.monotonic()
+
+            if remaining <= 0:
+                # Fencing, two bridges sending SS heartbeats would both answer the DESs
+                if not self.__isActiveAlive():
+                    break
+
+                if not isFencedLogged:
+                    self.__logger.error("Active bridge is not streaming but still sends heartbeats, not taking " +
+                                        "over: activeTuple=%s", self.__activeTuple)
+                    isFencedLogged = True
+
+                deadline = time.monotonic() + self.__failoverTimeout
+                continue
+
+            frameSocket = None
+
+            try:
+                frameSocket = _FrameSocket(socket.create_connection(self.__activeTuple, timeout = remaining, 
+                                                                    source_address = (self.__localIp, 0)))
+
+                while not self.__stopEvent.is_set():
+                    self.__applyFrame(frameSocket.receive(self.__failoverTimeout))
+                    deadline = time.monotonic() + self.__failoverTimeout
+                    isFencedLogged = False
+
+            except (OSError, ConnectionError) as e:
+                self.__logger.debug("Not receiving from active bridge: reason=%r", e)
+
+            except Exception as e:
+                self.__logger.exception("Failed applying replicated state")
+
+            finally:
+                if frameSocket is not None:
+                    frameSocket.close()
+
+            self.__stopEvent.wait(min(self.__RECONNECT_INTERVAL, max(0.0, deadline - time.monotonic())))
+
+        if not self.__stopEvent.is_set():
+            self.__logger.error("Active bridge is not responding, taking over: activeTuple=%s", self.__activeTuple)
+
+            try:
+                self.__onFailover()
+            except Exception as e:
+                self.__logger.exception("Failed taking over")
+
+#-----------------------------------------------------------------------------------------------------------------------
+    def __applyFrame(self, frame):
+        if frame['type'] == 'hello':
+            self.__epoch = frame['epoch']
+            return
+
+        self.__setDdsState(frame['dds'])
+
+        for name, (cache, decode) in self.__caches.items():
+            if frame['type'] == 'snapshot':
+                loaded = cache.load(frame['caches'].get(name, []), decode)
+                self.__logger.info("Replicated cache snapshot was loaded: cache=%s count=%s", name, loaded)
+
+            else:
+                for key, value in frame['caches'].get(name, []):
+                    if value is None:
+                        cache.remove(key)
+                    else:
+                        cache.put(key, decode(value))
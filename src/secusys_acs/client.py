@@ -1,14 +1,23 @@
 import datetime
-import zeep
-import xmltodict
 import collections
 import hashlib
 import typing
 import dataclasses
+import threading
+import time
+
+import metrics.registry
+import metrics.tracing
+
+from . import fast_path
 
 #======================================================================================================================
 class SecusysClient:
 
+    # Operations served by the fast path and their fields (besides AppKey) in envelope order
+    __FAST_PATH_OPERATIONS = {'GetCardInfos': ('TimeStamp', 'PersonnalID', 'CardNo', 'ValidCode'),
+                              'GetPersonAccessSecurityGroups': ('TimeStamp', 'PersonnalID', 'ValidCode')}
+
 #-----------------------------------------------------------------------------------------------------------------------
     @dataclasses.dataclass
     class Configuration():
@@ -16,6 +25,76 @@ class SecusysClient:
         userName       : str = ''
         password       : str = ''
         wsdl           : str = ''
+        fastPath       : bool = False
+        requestTimeout : float = 0.0
+        breakerFailureThreshold : int = 0
+        breakerResetTimeout     : float = 0.0
+
+#-----------------------------------------------------------------------------------------------------------------------
+    class UnavailableError(Exception):
+        """ Raised when Secusys could not be reached or the circuit breaker is open
+        """
+
+#-----------------------------------------------------------------------------------------------------------------------
+    class _SecusysClientCircuitBreaker:
+
+        def __init__(self, failureThreshold, resetTimeout):
+            """ C'tor
+            Params:
+                failureThreshold: Consecutive failures which open the breaker, 0 to disable
+                resetTimeout: Seconds to keep the breaker open before letting a probe request through
+            """
+            self.__failureThreshold = failureThreshold
+            self.__resetTimeout = resetTimeout
+            self.__failures = 0
+            self.__openUntil = None
+            self.__isProbing = False
+            self.__lock = threading.Lock()
+
+        @property
+        def isOpen(self):
+            return self.__openUntil is not None
+
+        @property
+        def isRequestAllowed(self):
+            """ Whether allowRequest would let a request through, without taking the probe
+            """
+            openUntil = self.__openUntil
+
+            return openUntil is None or (not self.__isProbing and time.monotonic() >= openUntil)
+
+        def allowRequest(self):
+            with self.__lock:
+                if self.__openUntil is None:
+                    return True
+
+                # Half open, let a single probe through once the reset timeout had elapsed
+                if not self.__isProbing and time.monotonic() >= self.__openUntil:
+                    self.__isProbing = True
+                    return True
+
+                return False
+
+        def recordSuccess(self):
+            with self.__lock:
+                self.__failures = 0
+                self.__openUntil = None
+                self.__isProbing = False
+
+        def recordFailure(self):
+            """ Record a failure
+            Return: True iff this failure had opened the breaker
+            """
+            with self.__lock:
+                wasOpen = self.__openUntil is not None
+                self.__failures = self.__failures + 1
+                self.__isProbing = False
+
+                if self.__failureThreshold > 0 and (wasOpen or self.__failures >= self.__failureThreshold):
+                    self.__openUntil = time.monotonic() + self.__resetTimeout
+                    return not wasOpen
+
+                return False
 
 #-----------------------------------------------------------------------------------------------------------------------
     class _SecusysClientValidCode(typing.NamedTuple):
@@ -33,38 +112,79 @@ class SecusysClient:
         body  : object
 
 #-----------------------------------------------------------------------------------------------------------------------
-    def __init__(self, logger, configuration):
+    def __init__(self, logger, configuration, metricsRegistry = None):
         """ C'tor
         Params:
             logger: Python logging interface
             configuration: DdsCommunicator configuration
             password: Secusys password
             wsdl: URL for Secusys WSDL
+            metricsRegistry: Optional MetricsRegistry to report to
         """
         self.__logger = logger
         self.__configuration = configuration
         self.__client = None
+        self.__fastPath = None
+        self.__lastValidCode = None
+        self.__circuitBreaker = self._SecusysClientCircuitBreaker(configuration.breakerFailureThreshold, 
+                                                                  configuration.breakerResetTimeout)
+
+        metricsRegistry = metricsRegistry or metrics.registry.MetricsRegistry()
+        callSeconds = metricsRegistry.histogram('secusys_call_seconds', 'Secusys SOAP call time', ('method',))
+        callsTotal = metricsRegistry.counter('secusys_calls_total', 'Secusys SOAP calls by result', ('method', 'result'))
+        callResults = ('ok', 'not_found', 'error', 'failed', 'rejected')
+        self.__callMetrics = {x: (callSeconds.labels(x), {y: callsTotal.labels(x, y) for y in callResults})
+                              for x in self.__FAST_PATH_OPERATIONS}
+        metricsRegistry.gauge('secusys_circuit_breaker_open', 'Whether the Secusys circuit breaker is open').bind(
+            lambda: int(self.__circuitBreaker.isOpen))
 
 #-----------------------------------------------------------------------------------------------------------------------
     def connect(self):
         """ Connect to Secusys API
         """
         self.__logger.info("Connecting to Secusys API: wsdl=%s", self.__configuration.wsdl)
-        self.__client = zeep.Client(self.__configuration.wsdl)
+
+        # The SOAP stack is the heaviest import of the bridge, it is only paid for once connecting
+        import zeep
+
+        operationTimeout = self.__configuration.requestTimeout or None
+        self.__client = zeep.Client(self.__configuration.wsdl, 
+                                    transport = zeep.Transport(operation_timeout = operationTimeout))
+
+        if self.__configuration.fastPath:
+            try:
+                self.__fastPath = self.__createFastPath()
+            except:
+                self.__logger.exception("Failed creating fast path, using zeep only")
+                self.__fastPath = None
 
 #-----------------------------------------------------------------------------------------------------------------------
     def disconnect(self):
         """ Disconnect from Secusys API
         """
         self.__logger.info("Disconnecting from Secusys API")
+
+        if self.__fastPath is not None:
+            self.__fastPath.close()
+            self.__fastPath = None
+
         self.__client = None
 
+#-----------------------------------------------------------------------------------------------------------------------
+    @property
+    def isAvailable(self):
+        """ False while not connected or the circuit breaker is open, True again once the breaker lets a probe through 
+        so callers gating on it still make that probe
+        """
+        return self.__client is not None and self.__circuitBreaker.isRequestAllowed
+
 #-----------------------------------------------------------------------------------------------------------------------
     def getPersonalIdByCardNo(self, cardNo):
         """ Get a personal ID by its card number
         Params:
             cardNo: Card number as string
-        Return: Personal ID on success | None
+        Return: Personal ID on success | None if the card is not found
+        Raises: UnavailableError if Secusys could not be reached, answered with an error or the circuit breaker is open
         """
         validCode = self.__createValidCode()
         res = None
@@ -72,13 +192,12 @@ class SecusysClient:
         try:
             self.__logger.debug("Requesting info for card: cardNo=%s", cardNo)
 
-            rawResponse = self.__client.service.GetCardInfos(AppKey = self.__configuration.userName, 
-                                                             TimeStamp = validCode.timeStamp, 
-                                                             PersonnalID = 0,
-                                                             CardNo = cardNo, 
-                                                             ValidCode = validCode.md5Hash)
-
-            response = self.__parseResponse('GetCardInfos', rawResponse)
+            response = self.__call('GetCardInfos', 
+                                   AppKey = self.__configuration.userName, 
+                                   TimeStamp = validCode.timeStamp, 
+                                   PersonnalID = 0,
+                                   CardNo = cardNo, 
+                                   ValidCode = validCode.md5Hash)
 
             self.__logger.debug("Received response for card: cardNo=%s response=%s", cardNo, response)
 
@@ -97,10 +216,16 @@ class SecusysClient:
                 self.__logger.debug("Received no data from API: cardNo=%s response=%s", cardNo, response)
            
             else:
+                # An error is no answer, callers must not take it for an unknown card
                 self.__logger.error("Received an error from API: cardNo=%s response=%s", cardNo, response)
+                raise self.UnavailableError("Received an error from API: errorCode=%s" % response.head.errorCode)
       
-        except:
+        except self.UnavailableError:
+            raise
+
+        except Exception as e:
             self.__logger.exception("Failed requesting info for card: cardNo=%s", cardNo)
+            raise self.UnavailableError("Failed requesting info for card: cardNo=%s" % cardNo) from e
 
         return res
 
@@ -109,7 +234,8 @@ class SecusysClient:
         """ Get a list of a person security groups by its personal ID
         Params:
             personalId: Personal ID
-        Return: A list of security groups names on success | Empy list
+        Return: A list of security groups names on success | Empy list if the person is not found
+        Raises: UnavailableError if Secusys could not be reached, answered with an error or the circuit breaker is open
         """
         validCode = self.__createValidCode()
         res = []
@@ -117,12 +243,11 @@ class SecusysClient:
         try:
             self.__logger.debug("Requesting security groups for personal ID: personalId=%s", personalId)
 
-            rawResponse = self.__client.service.GetPersonAccessSecurityGroups(AppKey = self.__configuration.userName, 
-                                                             TimeStamp = validCode.timeStamp, 
-                                                             PersonnalID = personalId,
-                                                             ValidCode = validCode.md5Hash)
-
-            response = self.__parseResponse('GetPersonAccessSecurityGroups', rawResponse)
+            response = self.__call('GetPersonAccessSecurityGroups', 
+                                   AppKey = self.__configuration.userName, 
+                                   TimeStamp = validCode.timeStamp, 
+                                   PersonnalID = personalId,
+                                   ValidCode = validCode.md5Hash)
 
             self.__logger.debug("Received response for personal ID: personalId=%s response=%s", personalId, response)
 
@@ -141,21 +266,137 @@ class SecusysClient:
                 self.__logger.debug("Received no data from API: personalId=%s response=%s", personalId, response)
 
             else:
+                # An error is no answer, callers must not take it for a person without groups
                 self.__logger.error("Received an error from API: personalId=%s response=%s", personalId, response)
-        except:
+                raise self.UnavailableError("Received an error from API: errorCode=%s" % response.head.errorCode)
+
+        except self.UnavailableError:
+            raise
+
+        except Exception as e:
             self.__logger.exception("Failed requesting security groups for personal ID: personalId=%s", personalId)
+            raise self.UnavailableError("Failed requesting security groups for personal ID: personalId=%s" % 
+                                        personalId) from e
 
         return res
 
 #-----------------------------------------------------------------------------------------------------------------------
     def __createValidCode(self):
         timestamp = datetime.datetime.now().strftime("%Y%m%d%H%M%S")
+        validCode = self.__lastValidCode
+
+        # Timestamp has a resolution of a second, reuse the hash for calls within the same second
+        if validCode is None or validCode.timeStamp != timestamp:
+            validCode = self._SecusysClientValidCode(timestamp, 
+                                                     hashlib.md5((timestamp+self.__configuration.password).encode('utf-8')).hexdigest())
+            self.__lastValidCode = validCode
+
+        return validCode
+
+#-----------------------------------------------------------------------------------------------------------------------
+    def __createFastPath(self):
+        # Take endpoint, namespace and SOAP actions from the loaded WSDL so the fast path matches the zeep path, which 
+        # binds to the first port of the first service as well
+        service = next(iter(self.__client.wsdl.services.values()))
+        port = next(iter(service.ports.values()))
+        operations = {}
+        namespace = None
+
+        for methodName, fieldNames in self.__FAST_PATH_OPERATIONS.items():
+            operation = port.binding.get(methodName)
+            namespace = operation.input.body.qname.namespace
+            operations[methodName] = (operation.soapaction, fieldNames)
+
+        self.__logger.info("Using SOAP fast path: endpoint=%s namespace=%s", port.binding_options['address'], 
+                           namespace)
 
-        return self._SecusysClientValidCode(timestamp, 
-                                            hashlib.md5((timestamp+self.__configuration.password).encode('utf-8')).hexdigest())
+        return fast_path.SecusysFastPath(self.__logger, 
+                                         port.binding_options['address'], 
+                                         namespace, 
+                                         operations, 
+                                         self.__configuration.userName,
+                                         self.__configuration.requestTimeout or None)
+
+#-----------------------------------------------------------------------------------------------------------------------
+    def __call(self, methodName, **kwargs):
+        callSeconds, callsTotal = self.__callMetrics[methodName]
+
+        with metrics.tracing.span('secusys.' + methodName) as span:
+            if self.__client is None:
+                callsTotal['rejected'].inc()
+                span.setAttribute('result', 'rejected')
+                raise self.UnavailableError("Secusys API is not connected: methodName=%s" % methodName)
+
+            if not self.__circuitBreaker.allowRequest():
+                callsTotal['rejected'].inc()
+                span.setAttribute('result', 'rejected')
+                raise self.UnavailableError("Circuit breaker is open: methodName=%s" % methodName)
+
+            startTime = time.perf_counter()
+
+            try:
+                response = self.__callUnguarded(methodName, **kwargs)
+
+            except Exception as e:
+                callSeconds.observe(time.perf_counter() - startTime)
+                callsTotal['failed'].inc()
+                span.setAttribute('result', 'failed')
+                self.__logger.exception("Failed calling Secusys API: methodName=%s", methodName)
+                self.__recordFailure()
+                raise self.UnavailableError("Failed calling Secusys API: methodName=%s" % methodName) from e
+
+            callSeconds.observe(time.perf_counter() - startTime)
+
+            # Not found is a valid answer, any other error code means Secusys is unhealthy
+            if response.head.errorCode == 0:
+                result = 'ok'
+                self.__circuitBreaker.recordSuccess()
+            elif response.head.errorCode == -1:
+                result = 'not_found'
+                self.__circuitBreaker.recordSuccess()
+            else:
+                result = 'error'
+                self.__recordFailure()
+
+            callsTotal[result].inc()
+            span.setAttribute('result', result)
+
+        return response
+
+#-----------------------------------------------------------------------------------------------------------------------
+    def __recordFailure(self):
+        if self.__circuitBreaker.recordFailure():
+            self.__logger.error("Circuit breaker opened, Secusys considered unavailable: resetTimeout=%s", 
+                                self.__configuration.breakerResetTimeout)
+
+#-----------------------------------------------------------------------------------------------------------------------
+    def __callUnguarded(self, methodName, **kwargs):
+        fastPath = self.__fastPath
+
+        if fastPath is not None:
+            # Transport errors are raised as they are, zeep would only wait for the same timeout again. A reply of 
+            # unexpected shape means the envelopes don't match the service, zeep is used from then on
+            try:
+                errorCode, errorMessage, body = fastPath.call(methodName, 
+                                                              tuple(kwargs[x] for x in 
+                                                                    self.__FAST_PATH_OPERATIONS[methodName]))
+
+                return self._SecusysClientParsedResponse(self._SecusysClientParsedResponseHead(errorCode, errorMessage), 
+                                                         body)
+            except fast_path.SecusysFastPath.ReplyMismatchError:
+                self.__logger.warning("Fast path reply doesn't match, disabling fast path and using zeep: " +
+                                      "methodName=%s", methodName, exc_info = True)
+                self.__fastPath = None
+                fastPath.close()
+
+        rawResponse = getattr(self.__client.service, methodName)(**kwargs)
+
+        return self.__parseResponse(methodName, rawResponse)
 
 #-----------------------------------------------------------------------------------------------------------------------
     def __parseResponse(self, methodName, rawResponse):
+        import xmltodict
+
         response = xmltodict.parse(rawResponse)
         head = response['Integration'][methodName]['Head']
         body = response['Integration'][methodName]['Body']
@@ -0,0 +1,160 @@
+import http.client
+import urllib.parse
+import threading
+import html
+import re
+import xml.sax.saxutils
+
+#======================================================================================================================
+class SecusysFastPath:
+    """ Raw SOAP client for the hot path operations, bypassing zeep serialization and validation.
+    Envelopes are pre-rendered per operation, sent over pooled keep-alive connections and replies are parsed with
+    targeted regular expressions instead of a full XML parse.
+    """
+
+    __ENVELOPE_TEMPLATE = ('<?xml version="1.0" encoding="utf-8"?>'
+                           '<soap:Envelope xmlns:soap="http://schemas.xmlsoap.org/soap/envelope/">'
+                           '<soap:Body><%s xmlns="%s">%s</%s></soap:Body></soap:Envelope>')
+
+    __RE_ERR_CODE = re.compile(r'<ErrCode>\s*(-?\d+)\s*</ErrCode>')
+    __RE_ERR_MSG = re.compile(r'<ErrMsg>(.*?)</ErrMsg>|<ErrMsg\s*/>', re.DOTALL)
+    __RE_ITEM = re.compile(r'<Item>(.*?)</Item>', re.DOTALL)
+    __RE_FIELD = re.compile(r'<(\w+)>(.*?)</\1>', re.DOTALL)
+
+#-----------------------------------------------------------------------------------------------------------------------
+    class ReplyMismatchError(ValueError):
+        """ Raised when a reply was received but doesn't have the expected shape, the pre-rendered envelopes may not 
+        match the service
+        """
+
+#-----------------------------------------------------------------------------------------------------------------------
+    def __init__(self, logger, endpoint, namespace, operations, appKey, timeout = None):
+        """ C'tor
+        Params:
+            logger: Python logging interface
+            endpoint: SOAP endpoint URL (as found in the WSDL service port)
+            namespace: Target namespace of the operations body elements
+            operations: Dictionary of operation name to (SOAP action, list of field names excluding AppKey)
+            appKey: Application key, pre-rendered into every envelope
+            timeout: Socket timeout in seconds for pooled connections, None for blocking
+        """
+        self.__logger = logger
+        self.__timeout = timeout
+        self.__pool = []
+        self.__poolLock = threading.Lock()
+
+        parsedEndpoint = urllib.parse.urlsplit(endpoint)
+        self.__connectionClass = http.client.HTTPSConnection if parsedEndpoint.scheme == 'https' else \
+                                 http.client.HTTPConnection
+        self.__host = parsedEndpoint.netloc
+        self.__path = parsedEndpoint.path + ('?' + parsedEndpoint.query if parsedEndpoint.query else '')
+
+        # Pre-render envelopes leaving only per-call fields as placeholders
+        self.__templates = {}
+        escapedAppKey = xml.sax.saxutils.escape(appKey).replace('%', '%%')
+
+        for methodName, (soapAction, fieldNames) in operations.items():
+            fields = '<AppKey>%s</AppKey>' % escapedAppKey
+            fields += ''.join('<%s>%%s</%s>' % (name, name) for name in fieldNames)
+            envelope = self.__ENVELOPE_TEMPLATE % (methodName, namespace, fields, methodName)
+            headers = {'Content-Type': 'text/xml; charset=utf-8',
+                       'SOAPAction': '"%s"' % soapAction,
+                       'Connection': 'keep-alive'}
+            resultPattern = re.compile(r'<(?:\w+:)?%sResult(?:\s[^>]*)?>(.*?)</(?:\w+:)?%sResult>' %
+                                       (methodName, methodName), re.DOTALL)
+
+            self.__templates[methodName] = (envelope, headers, resultPattern)
+
+#-----------------------------------------------------------------------------------------------------------------------
+    def call(self, methodName, values):
+        """ Call an operation
+        Params:
+            methodName: Operation name, must be one of the operations given at construction
+            values: Tuple of field values in the order of the operation field names
+        Return: Tuple of (error code, error message, body) where body mimics the xmltodict representation
+        """
+        envelope, headers, resultPattern = self.__templates[methodName]
+        payload = (envelope % tuple(xml.sax.saxutils.escape(str(x)) for x in values)).encode('utf-8')
+        rawReply = self.__post(payload, headers)
+
+        match = resultPattern.search(rawReply)
+
+        if match is None:
+            raise self.ReplyMismatchError("Missing %sResult in reply: reply=%s" % (methodName, rawReply))
+
+        return self.__parseResult(html.unescape(match.group(1)))
+
+#-----------------------------------------------------------------------------------------------------------------------
+    def close(self):
+        """ Close all pooled connections
+        """
+        with self.__poolLock:
+            pool = self.__pool
+            self.__pool = []
+
+        for connection in pool:
+            connection.close()
+
+#-----------------------------------------------------------------------------------------------------------------------
+    def __post(self, payload, headers):
+        with self.__poolLock:
+            connection = self.__pool.pop() if self.__pool else None
+
+        isReused = connection is not None
+
+        if connection is None:
+            connection = self.__connectionClass(self.__host, timeout = self.__timeout)
+
+        try:
+            try:
+                connection.request('POST', self.__path, payload, headers)
+                reply = connection.getresponse()
+
+            except (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError):
+                if not isReused:
+                    raise
+
+                # Server closed an idle keep-alive connection, retry once on a fresh one
+                self.__logger.debug("Pooled connection was closed by peer, reconnecting: host=%s", self.__host)
+                connection.close()
+                connection = self.__connectionClass(self.__host, timeout = self.__timeout)
+                connection.request('POST', self.__path, payload, headers)
+                reply = connection.getresponse()
+
+            body = reply.read()
+
+            if reply.status != 200:
+                raise http.client.HTTPException("Unexpected HTTP status: status=%s reason=%s" % (reply.status, reply.reason))
+
+        except:
+            connection.close()
+            raise
+
+        if reply.will_close:
+            connection.close()
+        else:
+            with self.__poolLock:
+                self.__pool.append(connection)
+
+        return body.decode('utf-8')
+
+#-----------------------------------------------------------------------------------------------------------------------
+    def __parseResult(self, result):
+        errorCode = self.__RE_ERR_CODE.search(result)
+
+        if errorCode is None:
+            raise self.ReplyMismatchError("Missing ErrCode in result: result=%s" % result)
+
+        errorMessage = self.__RE_ERR_MSG.search(result)
+        errorMessage = html.unescape(errorMessage.group(1) or "") if errorMessage is not None else None
+
+        items = [{k: html.unescape(v) for k, v in self.__RE_FIELD.findall(x)} for x in self.__RE_ITEM.findall(result)]
+        body = None
+
+        # Keep xmltodict semantics, a single item is a dict and multiple items are a list
+        if len(items) == 1:
+            body = {'Item': items[0]}
+        elif len(items) > 1:
+            body = {'Item': items}
+
+        return (int(errorCode.group(1)), errorMessage, body)
@@ -11,6 +11,8 @@ import time
 import logging
 import time 
 import os
+import queue
+import logging.handlers
 import bridge
 
 #======================================================================================================================
@@ -22,6 +24,9 @@ class Service(win32serviceutil.ServiceFramework):
 
     __CONFIG_FILE_PATH = os.path.join(os.path.dirname(sys.executable), "bridge.cfg")
 
+    # User defined service control code (sc control DdsAcsBridge 128), the service counterpart of a signal
+    __PROFILER_TOGGLE_CONTROL = 128
+
 #-----------------------------------------------------------------------------------------------------------------------
     class _LoggerHandler(logging.Handler):
       
@@ -41,6 +46,13 @@ class Service(win32serviceutil.ServiceFramework):
                                         eventType=severity, 
                                         strings=[self.format(record)])
  
+#-----------------------------------------------------------------------------------------------------------------------
+    class _LoggerQueueHandler(logging.handlers.QueueHandler):
+
+        def prepare(self, record):
+            # Records never leave the process, so formatting (packet reprs included) is left to the listener thread
+            return record
+
 #-----------------------------------------------------------------------------------------------------------------------
     def __init__(self, args):
         win32serviceutil.ServiceFramework.__init__(self, args)
@@ -51,8 +63,14 @@ class Service(win32serviceutil.ServiceFramework):
 
         loggerHandler = self._LoggerHandler()
         loggerHandler.setFormatter(logging.Formatter('%(process)s - [%(pathname)s:%(lineno)d] %(levelname)s - %(message)s'))
+
+        # Callers only enqueue records, the event log is written from the listener thread
+        loggerQueue = queue.SimpleQueue()
+        self.__loggerListener = logging.handlers.QueueListener(loggerQueue, loggerHandler)
+        self.__loggerListener.start()
+
         self.__logger = logging.getLogger(self._svc_name_)
-        self.__logger.addHandler(loggerHandler)
+        self.__logger.addHandler(self._LoggerQueueHandler(loggerQueue))
 
         self.__bridge = bridge.Bridge(self.__logger, self.__CONFIG_FILE_PATH)
 
@@ -74,9 +92,18 @@ class Service(win32serviceutil.ServiceFramework):
         self.ReportServiceStatus(win32service.SERVICE_STOP_PENDING)
       
         self.__bridge.stop()
+        self.__loggerListener.stop()
         self.__shouldRun = False
         win32event.SetEvent(self.__stopEvent)
 
+#-----------------------------------------------------------------------------------------------------------------------
+    def SvcOther(self, control):
+        if control == self.__PROFILER_TOGGLE_CONTROL:
+            self.__bridge.toggleProfiler()
+
+        else:
+            self.__logger.warning("Unsupported service control code was received: control=%s", control)
+
 #-----------------------------------------------------------------------------------------------------------------------   
 if __name__ == '__main__':
  
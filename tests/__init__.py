@@ -0,0 +1,9 @@
+import os
+import sys
+
+# The bridge runs from src as its working directory, tools are standalone scripts
+_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+for _path in (os.path.join(_ROOT, 'src'), os.path.join(_ROOT, 'tools')):
+    if _path not in sys.path:
+        sys.path.insert(0, _path)
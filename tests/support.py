@@ -0,0 +1,61 @@
+import importlib.util
+import logging
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+
+import secusys_stub_server
+
+LOGGER = logging.getLogger('tests')
+
+requiresZeep = unittest.skipUnless(importlib.util.find_spec('zeep') is not None and 
+                                   importlib.util.find_spec('xmltodict') is not None, 
+                                   "zeep and xmltodict are not installed")
+
+GROUPS_FILE = """[ALLOWED]
+floors = 20
+
+[DDS.LZ]
+floors = -1:2,3
+
+[DDS.MZ]
+floors = 3,5:8
+"""
+
+FIXTURE = {'cards'   : {'1001' : 5001, '1002' : 5002, '1003' : [5001, 5002]},
+           'persons' : {'5001' : ['DDS.LZ', 'Other'], '5002' : ['DDS.LZ', 'DDS.MZ']}}
+
+#======================================================================================================================
+class StubServerTestCase(unittest.TestCase):
+    """ Runs a Secusys stub server per test, with a temporary directory for groups and export files
+    """
+
+    LATENCY = 'fixed:0'
+
+#-----------------------------------------------------------------------------------------------------------------------
+    def setUp(self):
+        self.server = secusys_stub_server.SecusysStubServer(('127.0.0.1', 0), FIXTURE, 
+                                                            secusys_stub_server.LatencyDistribution(self.LATENCY))
+        self.__daemon = threading.Thread(target = self.server.serve_forever, daemon = True)
+        self.__daemon.start()
+
+        self.directory = tempfile.mkdtemp()
+        self.groupsFilePath = self.writeFile('groups.cfg', GROUPS_FILE)
+
+#-----------------------------------------------------------------------------------------------------------------------
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        self.__daemon.join()
+        shutil.rmtree(self.directory, ignore_errors = True)
+
+#-----------------------------------------------------------------------------------------------------------------------
+    def writeFile(self, name, content):
+        filePath = os.path.join(self.directory, name)
+
+        with open(filePath, 'w') as f:
+            f.write(content)
+
+        return filePath
@@ -0,0 +1,53 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+import otis_dds.capture
+
+#======================================================================================================================
+class CaptureWriterTest(unittest.TestCase):
+
+#-----------------------------------------------------------------------------------------------------------------------
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.filePath = os.path.join(self.directory, 'capture.bin')
+
+#-----------------------------------------------------------------------------------------------------------------------
+    def tearDown(self):
+        shutil.rmtree(self.directory, ignore_errors = True)
+
+#-----------------------------------------------------------------------------------------------------------------------
+    def capture(self, data):
+        writer = otis_dds.capture.CaptureWriter(self.filePath)
+        writer.write(otis_dds.capture.CaptureDirection.In, otis_dds.capture.CaptureChannel.Des, ('10.0.0.1', 46303), 
+                     45303, data)
+        writer.close()
+
+#-----------------------------------------------------------------------------------------------------------------------
+    def readData(self, filePath):
+        return [x.data for x in otis_dds.capture.CaptureReader(filePath)]
+
+#-----------------------------------------------------------------------------------------------------------------------
+    def testRoundTrip(self):
+        self.capture(b'\x01\x02')
+        records = list(otis_dds.capture.CaptureReader(self.filePath))
+
+        self.assertEqual(len(records), 1)
+        self.assertEqual(records[0].peerTuple, ('10.0.0.1', 46303))
+        self.assertEqual(records[0].localPort, 45303)
+        self.assertEqual(records[0].data, b'\x01\x02')
+
+#-----------------------------------------------------------------------------------------------------------------------
+    def testRestartKeepsPreviousCaptures(self):
+        for i in range(7):
+            self.capture(bytes([i]))
+
+        self.assertEqual(self.readData(self.filePath), [b'\x06'])
+        self.assertEqual([self.readData('%s.%s' % (self.filePath, i)) for i in range(1, 6)], 
+                         [[b'\x05'], [b'\x04'], [b'\x03'], [b'\x02'], [b'\x01']])
+        self.assertFalse(os.path.exists(self.filePath + '.6'))
+
+#======================================================================================================================
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,212 @@
+import socket
+import struct
+import threading
+import time
+import unittest
+
+import metrics.registry
+import otis_dds.communicator
+import otis_dds.packets
+import otis_dds.security_system_adapter
+
+from . import support
+
+AccessInfo = otis_dds.security_system_adapter.SecuritySystemAdapterInterface.AccessInfo
+
+#======================================================================================================================
+class _GatedSecuritySystemAdapter(otis_dds.security_system_adapter.SecuritySystemAdapterInterface):
+    """ Lookups block until released, cards in cachedCards have a last known decision
+    """
+
+    def __init__(self, cachedCards):
+        self.cachedCards = cachedCards
+        self.lookups = []
+        self.release = threading.Event()
+        self.__lock = threading.Lock()
+
+    @property
+    def allowedFloorsFront(self):
+        return [20]
+
+    @property
+    def allowedFloorsRear(self):
+        return []
+
+    def getAccessInfo(self, credentialData, credentialSizeBits):
+        with self.__lock:
+            self.lookups.append(int.from_bytes(credentialData, 'little'))
+
+        self.release.wait(5.0)
+
+        return AccessInfo(True, 0, AccessInfo.DoorType.Front, [1], [])
+
+    def getAccessInfoMany(self, credentials):
+        return [self.getAccessInfo(*x) for x in credentials]
+
+    def getCachedAccessInfo(self, credentialData, credentialSizeBits):
+        if int.from_bytes(credentialData, 'little') not in self.cachedCards:
+            return None
+
+        return AccessInfo(True, 0, AccessInfo.DoorType.Front, [1], [], True)
+
+#======================================================================================================================
+class AdmissionTestCase(unittest.TestCase):
+    """ A single DEC swiping against a DES on loopback, with an admission queue of two credentials
+    """
+
+    LOCAL_IP = '127.0.0.1'
+    DEC_IP = '127.0.0.2'
+    OVERLOAD_POLICY = None
+
+#-----------------------------------------------------------------------------------------------------------------------
+    def setUp(self):
+        configuration = otis_dds.communicator.DdsCommunicator.Configuration(
+            heartbeatSendMcGroup = '234.46.30.7', heartbeatSendPort = 48307, heartbeatSendInterval = 1.0,
+            heartbeatReceiveMcGroup = '234.46.30.7', heartbeatReceivePort = 47307, heartbeatReceiveTimeout = 10.0,
+            localIp = self.LOCAL_IP, interactiveSendMaxRetries = 5, interactiveSendRetryIntreval = 5.0,
+            interactiveReceivePortDes = 45303, interactiveReceivePortDec = 46308, interactiveSendPortDes = 46303,
+            interactiveSendPortDec = 45308, interactiveDuplicatesCacheSize = 5, interactiveReceiveBatchSize = 16,
+            interactiveAdmissionQueueSize = 2, interactiveOverloadPolicy = self.OVERLOAD_POLICY, decOperationMode = 3)
+
+        self.metricsRegistry = metrics.registry.MetricsRegistry()
+        self.adapter = _GatedSecuritySystemAdapter({2})
+        self.asyncAdapter = otis_dds.security_system_adapter.SyncToAsyncSecuritySystemAdapter(self.adapter, 4)
+        self.communicator = otis_dds.communicator.DdsCommunicator(support.LOGGER, configuration, self.asyncAdapter, 
+                                                                  self.metricsRegistry)
+        self.communicator.start()
+
+        self.decSendSocket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.decSendSocket.bind((self.DEC_IP, configuration.interactiveReceivePortDec))
+        self.decReceiveSocket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.decReceiveSocket.bind((self.DEC_IP, configuration.interactiveSendPortDec))
+        self.decReceiveSocket.settimeout(0.5)
+        self.swipedPacketIds = set()
+
+        heartbeatSocket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        heartbeatSocket.sendto(otis_dds.packets._PacketHeartbeat(otis_dds.packets._PacketHeartbeat.SourceType.DES, 
+                                                                 3, 0, 3, 0).packed(), 
+                               (self.LOCAL_IP, configuration.heartbeatReceivePort))
+        heartbeatSocket.close()
+        time.sleep(0.1)
+
+#-----------------------------------------------------------------------------------------------------------------------
+    def tearDown(self):
+        self.adapter.release.set()
+        self.communicator.stop()
+        self.asyncAdapter.shutdown()
+        self.decSendSocket.close()
+        self.decReceiveSocket.close()
+
+#-----------------------------------------------------------------------------------------------------------------------
+    def swipe(self, packetId, cardNo):
+        self.swipedPacketIds.add(packetId)
+        self.decSendSocket.sendto(struct.pack('IHBBB3s', packetId, otis_dds.packets._PacketInteractiveDecSecurityCredentialData.TYPE, 
+                                              0, 2, 24, cardNo.to_bytes(3, 'little')), 
+                                  (self.LOCAL_IP, 46308))
+
+#-----------------------------------------------------------------------------------------------------------------------
+    def receive(self):
+        """ Receive until quiet, ACKing responses
+        Return: (Set of ACKed packet IDs, dictionary of card number to list of validities answered)
+        """
+        ackedPacketIds = set()
+        responses = {}
+
+        try:
+            while True:
+                packetRaw = self.decReceiveSocket.recv(4096)
+                packetId, packetType = struct.unpack_from('IH', packetRaw)
+
+                # The DDS ACKs the responses ACKs too, only the credentials ones are of interest
+                if packetType == otis_dds.packets._PacketInteractiveAck.TYPE and packetId in self.swipedPacketIds:
+                    ackedPacketIds.add(packetId)
+
+                elif packetType == otis_dds.packets._PacketInteractiveDecSecurityAutorizedDefaultFloorV2.TYPE:
+                    valid, credentialNumber = struct.unpack_from('B16s', packetRaw, 6)
+                    responses.setdefault(int.from_bytes(credentialNumber[:3], 'little'), []).append(bool(valid))
+                    self.decSendSocket.sendto(otis_dds.packets._PacketInteractiveAck(packetId, 1).packed(), 
+                                              (self.LOCAL_IP, 46308))
+
+        except socket.timeout:
+            pass
+
+        return ackedPacketIds, responses
+
+#-----------------------------------------------------------------------------------------------------------------------
+    def metricValue(self, name):
+        for line in self.metricsRegistry.render().splitlines():
+            if line.startswith(name + ' ') or line.startswith(name + '{'):
+                return float(line.rsplit(' ', 1)[1])
+
+        return None
+
+#-----------------------------------------------------------------------------------------------------------------------
+    def swipeOverloaded(self):
+        # Card 9 is looked up and re-sent under a new packet ID, card 1 fills the admission queue, cards 2 and 3 are 
+        # over it
+        for packetId, cardNo in ((1000, 9), (1001, 9), (1002, 1), (1003, 2), (1004, 3)):
+            self.swipe(packetId, cardNo)
+            time.sleep(0.1)
+
+        return self.receive()
+
+#-----------------------------------------------------------------------------------------------------------------------
+    def assertLookupsCompleteOnRelease(self):
+        self.adapter.release.set()
+        ackedPacketIds, responses = self.receive()
+
+        # The re-sent card is looked up and answered once, both of its packets are ACKed
+        self.assertEqual(ackedPacketIds, {1000, 1001, 1002})
+        self.assertEqual(responses.get(9), [True])
+        self.assertEqual(responses.get(1), [True])
+        self.assertEqual(sorted(self.adapter.lookups), [1, 9])
+        self.assertEqual(self.metricValue('dds_credentials_attached_total'), 1)
+
+#======================================================================================================================
+class DenyPolicyTest(AdmissionTestCase):
+
+    OVERLOAD_POLICY = 'deny'
+
+#-----------------------------------------------------------------------------------------------------------------------
+    def testDenyPolicy(self):
+        ackedPacketIds, responses = self.swipeOverloaded()
+
+        # Admitted credentials are ACKed along with their response, shed ones are answered straight away
+        self.assertEqual(ackedPacketIds, {1003, 1004})
+        self.assertEqual(responses, {2 : [False], 3 : [False]})
+        self.assertEqual(self.metricValue('dds_credentials_shed_total'), 2)
+        self.assertLookupsCompleteOnRelease()
+
+#======================================================================================================================
+class CachePolicyTest(AdmissionTestCase):
+
+    OVERLOAD_POLICY = 'cache'
+
+#-----------------------------------------------------------------------------------------------------------------------
+    def testCachePolicy(self):
+        ackedPacketIds, responses = self.swipeOverloaded()
+
+        # Card 2 has a last known decision, card 3 has none and is denied
+        self.assertEqual(ackedPacketIds, {1003, 1004})
+        self.assertEqual(responses, {2 : [True], 3 : [False]})
+        self.assertEqual(self.metricValue('dds_credentials_shed_total'), 2)
+        self.assertLookupsCompleteOnRelease()
+
+#======================================================================================================================
+class DropOldestPolicyTest(AdmissionTestCase):
+
+    OVERLOAD_POLICY = 'dropOldest'
+
+#-----------------------------------------------------------------------------------------------------------------------
+    def testDropOldestPolicy(self):
+        ackedPacketIds, responses = self.swipeOverloaded()
+
+        # Dropped credentials are neither answered nor ACKed, their DEC re-sends them
+        self.assertEqual(ackedPacketIds, set())
+        self.assertEqual(responses, {})
+        self.assertEqual(self.metricValue('dds_credentials_shed_total'), 2)
+        self.assertLookupsCompleteOnRelease()
+
+#======================================================================================================================
+if __name__ == '__main__':
+    unittest.main()
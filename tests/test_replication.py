@@ -0,0 +1,394 @@
+import configparser
+import os
+import socket
+import struct
+import threading
+import time
+import unittest
+
+import bridge
+import otis_dds.communicator
+import otis_dds.packets
+import otis_dds.security_system_adapter
+import replication
+
+from . import support
+
+AccessInfo = otis_dds.security_system_adapter.SecuritySystemAdapterInterface.AccessInfo
+
+ACTIVE_IP = '127.0.0.2'
+STANDBY_IP = '127.0.0.3'
+DES_IP = '127.0.0.1'
+DEC_IP = '127.0.0.4'
+# DECs are addressed by their ID within the subnet of their DES
+DEC_ID = 4
+REPLICATION_PORT = 9486
+
+SS_HEARTBEAT = otis_dds.packets._PacketHeartbeat(otis_dds.packets._PacketHeartbeat.SourceType.SS, 3, 0, 3, 0).packed()
+DES_HEARTBEAT = otis_dds.packets._PacketHeartbeat(otis_dds.packets._PacketHeartbeat.SourceType.DES, 3, 0, 3, 0).packed()
+
+#======================================================================================================================
+class _AllowingSecuritySystemAdapter(otis_dds.security_system_adapter.SecuritySystemAdapterInterface):
+
+    @property
+    def allowedFloorsFront(self):
+        return [20]
+
+    @property
+    def allowedFloorsRear(self):
+        return []
+
+    def getAccessInfo(self, credentialData, credentialSizeBits):
+        return AccessInfo(True, 0, AccessInfo.DoorType.Front, [1], [])
+
+#======================================================================================================================
+class _HeartbeatSender:
+    """ Sends SS heartbeats from an IP address to the peer heartbeat monitor of another bridge, as a bridge running
+    DDS would
+    """
+
+    __INTERVAL = 0.2
+
+#-----------------------------------------------------------------------------------------------------------------------
+    def __init__(self, sourceIp, targetIp):
+        self.__socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.__socket.bind((sourceIp, 0))
+        self.__targetTuple = (targetIp, 48307)
+        self.__stopEvent = threading.Event()
+        self.__daemon = threading.Thread(target = self.__run, daemon = True)
+        self.__daemon.start()
+        self.lastSendTime = time.monotonic()
+
+#-----------------------------------------------------------------------------------------------------------------------
+    def stop(self):
+        if not self.__stopEvent.is_set():
+            self.__stopEvent.set()
+            self.__daemon.join()
+            self.__socket.close()
+
+#-----------------------------------------------------------------------------------------------------------------------
+    def __run(self):
+        while not self.__stopEvent.is_set():
+            self.__socket.sendto(SS_HEARTBEAT, self.__targetTuple)
+            self.lastSendTime = time.monotonic()
+            self.__stopEvent.wait(self.__INTERVAL)
+
+#-----------------------------------------------------------------------------------------------------------------------
+def waitFor(predicate, timeout):
+    deadline = time.monotonic() + timeout
+
+    while not predicate():
+        if time.monotonic() > deadline:
+            return False
+
+        time.sleep(0.05)
+
+    return True
+
+#======================================================================================================================
+class ReplicationTest(unittest.TestCase):
+    """ An active DDS on one loopback address streaming to a standby on another, neither being 127.0.0.1
+    """
+
+#-----------------------------------------------------------------------------------------------------------------------
+    def setUp(self):
+        self.activeCommunicator = self.createCommunicator(ACTIVE_IP)
+        self.standbyCommunicator = self.createCommunicator(STANDBY_IP)
+        self.activeCache = bridge.Bridge._ExpiringCache(10)
+        self.standbyCache = bridge.Bridge._ExpiringCache(10)
+        self.publisher = None
+        self.subscriber = None
+
+        self.decSendSocket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.decSendSocket.bind((DEC_IP, 46308))
+        self.decReceiveSocket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.decReceiveSocket.bind((DEC_IP, 45308))
+        self.decReceiveSocket.settimeout(2.0)
+
+#-----------------------------------------------------------------------------------------------------------------------
+    def tearDown(self):
+        if self.subscriber is not None:
+            self.subscriber.stop()
+
+        if self.publisher is not None:
+            self.publisher.stop()
+
+        self.activeCommunicator.stop()
+        self.standbyCommunicator.stop()
+        self.decSendSocket.close()
+        self.decReceiveSocket.close()
+
+#-----------------------------------------------------------------------------------------------------------------------
+    def createCommunicator(self, localIp):
+        configuration = otis_dds.communicator.DdsCommunicator.Configuration(
+            heartbeatSendMcGroup = '234.46.30.7', heartbeatSendPort = 48307, heartbeatSendInterval = 1.0,
+            heartbeatReceiveMcGroup = '234.46.30.7', heartbeatReceivePort = 47307, heartbeatReceiveTimeout = 10.0,
+            localIp = localIp, interactiveSendMaxRetries = 5, interactiveSendRetryIntreval = 5.0,
+            interactiveReceivePortDes = 45303, interactiveReceivePortDec = 46308, interactiveSendPortDes = 46303,
+            interactiveSendPortDec = 45308, interactiveDuplicatesCacheSize = 5, decOperationMode = 3)
+
+        return otis_dds.communicator.DdsCommunicator(support.LOGGER, configuration, _AllowingSecuritySystemAdapter())
+
+#-----------------------------------------------------------------------------------------------------------------------
+    def createPublisher(self, peerIp, epoch = 1):
+        self.publisher = replication.ReplicationPublisher(support.LOGGER, (ACTIVE_IP, REPLICATION_PORT), peerIp, 0.1,
+                                                          lambda: epoch, self.activeCommunicator.exportState,
+                                                          {'decisions' : (self.activeCache, sorted)})
+        self.publisher.start()
+
+#-----------------------------------------------------------------------------------------------------------------------
+    def createSubscriber(self, isActiveAlive, onFailover, startupTimeout = 5.0):
+        self.subscriber = replication.ReplicationSubscriber(support.LOGGER, STANDBY_IP, (ACTIVE_IP, REPLICATION_PORT),
+                                                            0.3, startupTimeout, isActiveAlive,
+                                                            self.standbyCommunicator.importState,
+                                                            {'decisions' : (self.standbyCache, frozenset)},
+                                                            onFailover)
+        self.subscriber.start()
+
+#-----------------------------------------------------------------------------------------------------------------------
+    def swipe(self, communicatorIp, packetId, cardNo):
+        self.decSendSocket.sendto(struct.pack('IHBBB3s', packetId,
+                                              otis_dds.packets._PacketInteractiveDecSecurityCredentialData.TYPE,
+                                              0, DEC_ID, 24, cardNo.to_bytes(3, 'little')),
+                                  (communicatorIp, 46308))
+
+#-----------------------------------------------------------------------------------------------------------------------
+    def receive(self, packetType):
+        """ Receive until a packet of a type
+        Return: (packet ID, raw packet)
+        """
+        while True:
+            packetRaw = self.decReceiveSocket.recv(4096)
+            packetId, receivedType = struct.unpack_from('IH', packetRaw)
+
+            if receivedType == packetType:
+                return packetId, packetRaw
+
+#-----------------------------------------------------------------------------------------------------------------------
+    def testStateTransfer(self):
+        self.activeCommunicator.start()
+
+        # The DES is followed and a swipe is answered, its response is left unacked
+        heartbeatSocket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        heartbeatSocket.bind((DES_IP, 0))
+        heartbeatSocket.sendto(DES_HEARTBEAT, (ACTIVE_IP, 47307))
+        heartbeatSocket.close()
+        time.sleep(0.1)
+
+        # The response is sent ahead of the ACK of the swipe
+        self.swipe(ACTIVE_IP, 2000, 7)
+        responseId, responseRaw = self.receive(otis_dds.packets._PacketInteractiveDecSecurityAutorizedDefaultFloorV2.TYPE)
+        self.receive(otis_dds.packets._PacketInteractiveAck.TYPE)
+
+        self.activeCache.put(1, frozenset({'DDS.LZ'}))
+        self.createPublisher(STANDBY_IP, epoch = 3)
+        self.createSubscriber(lambda: True, lambda: None)
+        self.assertTrue(waitFor(lambda: self.subscriber.epoch == 3, 2.0))
+
+        # Updates after the snapshot are streamed too
+        self.activeCache.put(2, frozenset({'DDS.MZ'}))
+        self.assertTrue(waitFor(lambda: self.standbyCache.peek(2) is not None, 2.0))
+        self.assertEqual(self.standbyCache.peek(1), frozenset({'DDS.LZ'}))
+
+        # The standby takes over with the duplicate window and the unacked backlog of the active DDS
+        self.subscriber.stop()
+        self.publisher.stop()
+        self.activeCommunicator.stop()
+        self.standbyCommunicator.start()
+
+        reactorState, = self.standbyCommunicator.exportState()['reactors']
+        self.assertEqual(reactorState['desIp'], DES_IP)
+        self.assertIn(2000, reactorState['duplicates'])
+        self.assertEqual([x[0] for x in reactorState['backlog']], [responseId])
+
+        # The unacked response is re-sent as first packed, a re-sent swipe is taken for a duplicate and not answered
+        self.assertEqual(self.receive(otis_dds.packets._PacketInteractiveDecSecurityAutorizedDefaultFloorV2.TYPE),
+                         (responseId, responseRaw))
+
+        self.swipe(STANDBY_IP, 2000, 7)
+        self.decReceiveSocket.settimeout(0.5)
+
+        with self.assertRaises(socket.timeout):
+            self.receive(otis_dds.packets._PacketInteractiveDecSecurityAutorizedDefaultFloorV2.TYPE)
+
+#-----------------------------------------------------------------------------------------------------------------------
+    def testOtherThanPeerIsRefused(self):
+        self.createPublisher(STANDBY_IP)
+
+        self.assertEqual(replication.probeEpoch(STANDBY_IP, (ACTIVE_IP, REPLICATION_PORT), 1.0), 1)
+
+        with self.assertRaises(ConnectionError):
+            replication.probeEpoch(DEC_IP, (ACTIVE_IP, REPLICATION_PORT), 1.0)
+
+#-----------------------------------------------------------------------------------------------------------------------
+    def testNoTakeoverWhileActiveIsAlive(self):
+        isActiveAlive = threading.Event()
+        isActiveAlive.set()
+        failoverEvent = threading.Event()
+
+        self.createPublisher(STANDBY_IP)
+        self.createSubscriber(isActiveAlive.is_set, failoverEvent.set, startupTimeout = 0.5)
+        self.assertTrue(waitFor(lambda: self.subscriber.epoch == 1, 2.0))
+
+        # The stream stops while the active bridge still sends heartbeats
+        self.publisher.stop()
+        self.assertFalse(failoverEvent.wait(1.5))
+
+        isActiveAlive.clear()
+        self.assertTrue(failoverEvent.wait(2.0))
+
+#-----------------------------------------------------------------------------------------------------------------------
+    def testNoActiveAtStartup(self):
+        failoverEvent = threading.Event()
+        startTime = time.monotonic()
+
+        self.createSubscriber(lambda: False, failoverEvent.set, startupTimeout = 0.5)
+
+        self.assertTrue(failoverEvent.wait(2.0))
+        self.assertGreaterEqual(time.monotonic() - startTime, 0.5)
+
+#======================================================================================================================
+class PeerHeartbeatMonitorTest(unittest.TestCase):
+
+#-----------------------------------------------------------------------------------------------------------------------
+    def setUp(self):
+        self.heartbeats = []
+        self.monitor = replication.PeerHeartbeatMonitor(support.LOGGER, STANDBY_IP, '234.46.30.7', 48397, ACTIVE_IP,
+                                                        0.5, lambda: self.heartbeats.append(time.monotonic()))
+        self.monitor.start()
+
+#-----------------------------------------------------------------------------------------------------------------------
+    def tearDown(self):
+        self.monitor.stop()
+
+#-----------------------------------------------------------------------------------------------------------------------
+    def send(self, sourceIp, packetRaw):
+        sendSocket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        sendSocket.bind((sourceIp, 0))
+        sendSocket.sendto(packetRaw, (STANDBY_IP, 48397))
+        sendSocket.close()
+
+#-----------------------------------------------------------------------------------------------------------------------
+    def testPeerHeartbeatsOnly(self):
+        # Heartbeats of other bridges and DES heartbeats of the peer don't count
+        self.send(DEC_IP, SS_HEARTBEAT)
+        self.send(ACTIVE_IP, DES_HEARTBEAT)
+        time.sleep(0.6)
+        self.assertEqual(self.heartbeats, [])
+        self.assertFalse(self.monitor.isPeerAlive)
+
+        self.send(ACTIVE_IP, SS_HEARTBEAT)
+        self.assertTrue(waitFor(lambda: self.heartbeats, 1.0))
+        self.assertTrue(self.monitor.isPeerAlive)
+
+        time.sleep(0.6)
+        self.assertFalse(self.monitor.isPeerAlive)
+
+#======================================================================================================================
+class BridgeFailoverTest(support.StubServerTestCase):
+    """ Two bridges of an active/standby pair, their SS heartbeats are sent by _HeartbeatSender as multicast may not
+    loop back between loopback addresses
+    """
+
+    FENCE_TIMEOUT = 1.2
+
+#-----------------------------------------------------------------------------------------------------------------------
+    def setUp(self):
+        super().setUp()
+        self.bridges = []
+        self.heartbeatSenders = []
+
+#-----------------------------------------------------------------------------------------------------------------------
+    def tearDown(self):
+        for heartbeatSender in self.heartbeatSenders:
+            heartbeatSender.stop()
+
+        for x in self.bridges:
+            x.stop()
+
+        super().tearDown()
+
+#-----------------------------------------------------------------------------------------------------------------------
+    def createBridge(self, localIp, role, peerIp, fenceTimeout = FENCE_TIMEOUT):
+        configParser = configparser.ConfigParser()
+        configParser.read(os.path.join(os.path.dirname(bridge.__file__), 'bridge.cfg'))
+        configParser.set('DDS', 'localIp', localIp)
+        configParser.set('ACS', 'wsdl', self.server.wsdlUrl)
+        configParser.set('ACS', 'groupsFilePath', self.groupsFilePath)
+        configParser.set('Replication', 'role', role)
+        configParser.set('Replication', 'port', str(REPLICATION_PORT))
+        configParser.set('Replication', 'peerIp', peerIp)
+        configParser.set('Replication', 'interval', '0.1')
+        configParser.set('Replication', 'failoverTimeout', '0.5')
+        configParser.set('Replication', 'startupTimeout', '1.0')
+        configParser.set('Replication', 'fenceTimeout', str(fenceTimeout))
+
+        configFilePath = os.path.join(self.directory, '%s.cfg' % localIp)
+
+        with open(configFilePath, 'w') as f:
+            configParser.write(f)
+
+        createdBridge = bridge.Bridge(support.LOGGER.getChild(localIp), configFilePath)
+        self.bridges.append(createdBridge)
+
+        return createdBridge
+
+#-----------------------------------------------------------------------------------------------------------------------
+    def sendHeartbeats(self, sourceIp, targetIp):
+        heartbeatSender = _HeartbeatSender(sourceIp, targetIp)
+        self.heartbeatSenders.append(heartbeatSender)
+
+        return heartbeatSender
+
+#-----------------------------------------------------------------------------------------------------------------------
+    def testFenceTimeoutWithinHeartbeatReceiveTimeout(self):
+        # DDS.heartbeatReceiveTimeout of the shipped configuration is 3.0
+        with self.assertRaisesRegex(ValueError, 'fenceTimeout must be less than DDS.heartbeatReceiveTimeout'):
+            self.createBridge(STANDBY_IP, 'standby', ACTIVE_IP, fenceTimeout = 3.0)
+
+#-----------------------------------------------------------------------------------------------------------------------
+    def testTakeoverAndStepDown(self):
+        activeBridge = self.createBridge(ACTIVE_IP, 'active', STANDBY_IP)
+        standbyBridge = self.createBridge(STANDBY_IP, 'standby', ACTIVE_IP)
+        activeBridge.start()
+        standbyBridge.start()
+        activeHeartbeats = self.sendHeartbeats(ACTIVE_IP, STANDBY_IP)
+
+        # The active bridge stops, the standby doesn't take over while its heartbeats continue
+        activeBridge.stop()
+        time.sleep(2 * self.FENCE_TIMEOUT)
+        self.assertFalse(standbyBridge._Bridge__isDdsStarted)
+
+        activeHeartbeats.stop()
+        self.assertTrue(waitFor(lambda: standbyBridge._Bridge__isDdsStarted, 3 * self.FENCE_TIMEOUT))
+        self.assertGreaterEqual(time.monotonic() - activeHeartbeats.lastSendTime, self.FENCE_TIMEOUT)
+        self.assertEqual(standbyBridge._Bridge__epoch, 2)
+
+        # The former active bridge is back with the lower epoch and steps down, although its IP address is lower
+        activeBridge = self.createBridge(ACTIVE_IP, 'active', STANDBY_IP)
+        activeBridge.start()
+        self.assertTrue(activeBridge._Bridge__isDdsStarted)
+        self.sendHeartbeats(ACTIVE_IP, STANDBY_IP)
+        self.sendHeartbeats(STANDBY_IP, ACTIVE_IP)
+
+        self.assertTrue(waitFor(lambda: not activeBridge._Bridge__isDdsStarted, 3 * self.FENCE_TIMEOUT))
+        self.assertTrue(standbyBridge._Bridge__isDdsStarted)
+        self.assertTrue(waitFor(lambda: activeBridge._Bridge__replicationSubscriber.epoch == 2, 2.0))
+
+#-----------------------------------------------------------------------------------------------------------------------
+    def testEpochTieBreak(self):
+        lowerBridge = self.createBridge(ACTIVE_IP, 'active', STANDBY_IP)
+        higherBridge = self.createBridge(STANDBY_IP, 'active', ACTIVE_IP)
+        lowerBridge.start()
+        higherBridge.start()
+        self.sendHeartbeats(ACTIVE_IP, STANDBY_IP)
+        self.sendHeartbeats(STANDBY_IP, ACTIVE_IP)
+
+        # Of two bridges with the same epoch the one with the higher IP address steps down
+        self.assertTrue(waitFor(lambda: not higherBridge._Bridge__isDdsStarted, 3 * self.FENCE_TIMEOUT))
+        self.assertTrue(lowerBridge._Bridge__isDdsStarted)
+        self.assertTrue(waitFor(lambda: higherBridge._Bridge__replicationSubscriber.epoch == 1, 2.0))
+
+#======================================================================================================================
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,192 @@
+import time
+import unittest
+
+import bridge
+import otis_dds.security_system_adapter
+import secusys_acs.client
+
+from . import support
+
+#======================================================================================================================
+class FloorMaskTest(unittest.TestCase):
+
+    Interface = otis_dds.security_system_adapter.SecuritySystemAdapterInterface
+
+#-----------------------------------------------------------------------------------------------------------------------
+    def testRoundTrip(self):
+        for floorList in ([], [0], [-1, 0, 1], [-127, 127], list(range(-127, 128)), [-5, 3, 20, 100]):
+            self.assertEqual(self.Interface.floorMaskToList(self.Interface.floorListToMask(floorList)), 
+                             sorted(floorList))
+
+#-----------------------------------------------------------------------------------------------------------------------
+    def testWireLayout(self):
+        # Positive floors are at bits 0 to 127, negative floors at bits 129 to 255
+        self.assertEqual(self.Interface.floorListToMask([0]), 1)
+        self.assertEqual(self.Interface.floorListToMask([127]), 1 << 127)
+        self.assertEqual(self.Interface.floorListToMask([-1]), 1 << 255)
+        self.assertEqual(self.Interface.floorListToMask([-127]), 1 << 129)
+
+#-----------------------------------------------------------------------------------------------------------------------
+    def testDuplicatesAreMerged(self):
+        self.assertEqual(self.Interface.floorListToMask([3, 3, 3]), 1 << 3)
+
+#======================================================================================================================
+@support.requiresZeep
+class SecusysAdapterTest(support.StubServerTestCase):
+
+#-----------------------------------------------------------------------------------------------------------------------
+    def setUp(self):
+        super().setUp()
+        configuration = secusys_acs.client.SecusysClient.Configuration('administrator', 'secusys', 
+                                                                       self.server.wsdlUrl, True, 2.0, 0, 0.0)
+        self.client = secusys_acs.client.SecusysClient(support.LOGGER, configuration)
+        self.client.connect()
+        self.adapter = None
+
+#-----------------------------------------------------------------------------------------------------------------------
+    def tearDown(self):
+        if self.adapter is not None:
+            self.adapter.shutdown()
+
+        self.client.disconnect()
+        super().tearDown()
+
+#-----------------------------------------------------------------------------------------------------------------------
+    def createAdapter(self, **kwargs):
+        self.adapter = bridge.Bridge._SecuritySystemAdapterSecusys(support.LOGGER, self.client, self.groupsFilePath, 
+                                                                   'little', 24, **kwargs)
+
+        return self.adapter
+
+#-----------------------------------------------------------------------------------------------------------------------
+    def getAccessInfo(self, cardNo):
+        return self.adapter.getAccessInfo(cardNo.to_bytes(3, 'little'), 24)
+
+#-----------------------------------------------------------------------------------------------------------------------
+    def testKnownCard(self):
+        self.createAdapter()
+        accessInfo = self.getAccessInfo(1002)
+
+        self.assertTrue(accessInfo.isValid)
+        self.assertFalse(accessInfo.isStale)
+        self.assertEqual(accessInfo.allowedFloorsFront, [-1, 0, 1, 2, 3, 5, 6, 7, 8])
+        self.assertEqual(accessInfo.allowedFloorsFrontMask, 
+                         otis_dds.security_system_adapter.SecuritySystemAdapterInterface.floorListToMask(
+                             accessInfo.allowedFloorsFront))
+
+#-----------------------------------------------------------------------------------------------------------------------
+    def testUnknownCardIsDenied(self):
+        self.createAdapter()
+
+        self.assertFalse(self.getAccessInfo(9999).isValid)
+        self.assertFalse(self.getAccessInfo(1003).isValid)
+
+#-----------------------------------------------------------------------------------------------------------------------
+    def testBatchLooksUpEachCardOnce(self):
+        self.createAdapter(lookupBudget = 1.0)
+        credentials = [(x.to_bytes(3, 'little'), 24) for x in (1001, 1002, 1001, 9999)]
+        accessInfos = self.adapter.getAccessInfoMany(credentials)
+
+        self.assertEqual([x.isValid for x in accessInfos], [True, True, True, False])
+        self.assertEqual(self.server.requestsCount, 5)
+
+#-----------------------------------------------------------------------------------------------------------------------
+    def testStaleAnswerOnHttpError(self):
+        self.createAdapter(decisionCacheSize = 100)
+        accessInfo = self.getAccessInfo(1001)
+        self.server.setErrorRates(1.0, 0.0)
+        staleAccessInfo = self.getAccessInfo(1001)
+
+        self.assertTrue(staleAccessInfo.isStale)
+        self.assertEqual(staleAccessInfo._replace(isStale = False), accessInfo)
+
+        # Without a previous decision a card is denied
+        self.assertFalse(self.getAccessInfo(1002).isValid)
+        self.assertTrue(self.getAccessInfo(1002).isStale)
+
+#-----------------------------------------------------------------------------------------------------------------------
+    def testApiErrorKeepsLastDecision(self):
+        # An error code is no answer, the card must not be taken for unknown and its decision dropped
+        self.createAdapter(decisionCacheSize = 100)
+        self.assertTrue(self.getAccessInfo(1001).isValid)
+        self.server.setErrorRates(0.0, 1.0)
+
+        for _ in range(2):
+            accessInfo = self.getAccessInfo(1001)
+            self.assertTrue(accessInfo.isValid)
+            self.assertTrue(accessInfo.isStale)
+
+        self.server.setErrorRates(0.0, 0.0)
+        self.assertFalse(self.getAccessInfo(1001).isStale)
+
+#-----------------------------------------------------------------------------------------------------------------------
+    def testUnknownCardDropsLastDecision(self):
+        self.createAdapter(decisionCacheSize = 100)
+        self.assertTrue(self.getAccessInfo(1001).isValid)
+        self.assertIsNotNone(self.adapter.getCachedAccessInfo((1001).to_bytes(3, 'little'), 24))
+
+        self.assertFalse(self.getAccessInfo(9999).isValid)
+        self.assertIsNone(self.adapter.getCachedAccessInfo((9999).to_bytes(3, 'little'), 24))
+
+#-----------------------------------------------------------------------------------------------------------------------
+    def testPipelineCacheResolvesWithSingleRoundTrip(self):
+        self.createAdapter(pipelineCacheSize = 100, pipelineCacheTtl = 60.0)
+        accessInfo = self.getAccessInfo(1002)
+        requestsCount = self.server.requestsCount
+
+        # Card and groups are both cached, the swipe waits on the groups call only and the card is re-validated in 
+        # the background
+        self.assertEqual(self.getAccessInfo(1002), accessInfo)
+        time.sleep(0.2)
+        self.assertEqual(self.server.requestsCount - requestsCount, 2)
+
+#-----------------------------------------------------------------------------------------------------------------------
+    def testCardFilterRejectsLocallyAndKeepsOnPartialExport(self):
+        cardExportPath = self.writeFile('cards.csv', '\n'.join(str(x) for x in range(1000, 1010)))
+        self.createAdapter(cardExportPath = cardExportPath, cardFilterSizeBits = 4096)
+        self.adapter.loadCardFilter()
+
+        self.assertFalse(self.getAccessInfo(9999).isValid)
+        self.assertEqual(self.server.requestsCount, 0)
+        self.assertTrue(self.getAccessInfo(1001).isValid)
+
+        # A reload with far fewer cards is taken for a partial export and the loaded filter is kept
+        self.writeFile('cards.csv', '1000\n')
+        self.adapter._SecuritySystemAdapterSecusys__reloadCardFilter()
+        self.assertTrue(self.getAccessInfo(1002).isValid)
+
+#======================================================================================================================
+@support.requiresZeep
+class SecusysAdapterBudgetTest(support.StubServerTestCase):
+
+    LATENCY = 'fixed:0.15'
+
+#-----------------------------------------------------------------------------------------------------------------------
+    def testOverrunLookupRefreshesDecisionInBackground(self):
+        configuration = secusys_acs.client.SecusysClient.Configuration('administrator', 'secusys', 
+                                                                       self.server.wsdlUrl, True, 2.0, 0, 0.0)
+        client = secusys_acs.client.SecusysClient(support.LOGGER, configuration)
+        client.connect()
+        adapter = bridge.Bridge._SecuritySystemAdapterSecusys(support.LOGGER, client, self.groupsFilePath, 'little', 
+                                                              24, lookupBudget = 0.1, decisionCacheSize = 100)
+
+        try:
+            startTime = time.monotonic()
+            accessInfo = adapter.getAccessInfo((1001).to_bytes(3, 'little'), 24)
+
+            self.assertLess(time.monotonic() - startTime, 0.25)
+            self.assertFalse(accessInfo.isValid)
+            self.assertTrue(accessInfo.isStale)
+
+            time.sleep(0.5)
+            accessInfo = adapter.getAccessInfo((1001).to_bytes(3, 'little'), 24)
+            self.assertTrue(accessInfo.isValid)
+            self.assertTrue(accessInfo.isStale)
+
+        finally:
+            adapter.shutdown()
+            client.disconnect()
+
+#======================================================================================================================
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,131 @@
+import time
+import unittest
+
+import secusys_acs.client
+
+from . import support
+
+#======================================================================================================================
+@support.requiresZeep
+class SecusysClientTest(support.StubServerTestCase):
+
+    FAST_PATH = False
+
+#-----------------------------------------------------------------------------------------------------------------------
+    def setUp(self):
+        super().setUp()
+        self.client = self.createClient()
+
+#-----------------------------------------------------------------------------------------------------------------------
+    def tearDown(self):
+        self.client.disconnect()
+        super().tearDown()
+
+#-----------------------------------------------------------------------------------------------------------------------
+    def createClient(self, breakerFailureThreshold = 0, breakerResetTimeout = 0.0):
+        configuration = secusys_acs.client.SecusysClient.Configuration('administrator', 'secusys', 
+                                                                       self.server.wsdlUrl, self.FAST_PATH, 2.0, 
+                                                                       breakerFailureThreshold, breakerResetTimeout)
+        client = secusys_acs.client.SecusysClient(support.LOGGER, configuration)
+        client.connect()
+
+        return client
+
+#-----------------------------------------------------------------------------------------------------------------------
+    def testKnownCard(self):
+        self.assertEqual(self.client.getPersonalIdByCardNo(1001), 5001)
+        self.assertEqual(self.client.getPersonSecurityGroupsByPersonalId(5001), ['DDS.LZ', 'Other'])
+
+#-----------------------------------------------------------------------------------------------------------------------
+    def testNotFoundIsAnAnswer(self):
+        # Error code -1 is an unknown card or person, not a failure
+        self.assertIsNone(self.client.getPersonalIdByCardNo(9999))
+        self.assertEqual(self.client.getPersonSecurityGroupsByPersonalId(9999), [])
+        self.assertTrue(self.client.isAvailable)
+
+#-----------------------------------------------------------------------------------------------------------------------
+    def testAmbiguousCard(self):
+        self.assertIsNone(self.client.getPersonalIdByCardNo(1003))
+
+#-----------------------------------------------------------------------------------------------------------------------
+    def testApiErrorRaises(self):
+        # Any other error code must not be taken for an unknown card
+        self.server.setErrorRates(0.0, 1.0)
+
+        with self.assertRaises(secusys_acs.client.SecusysClient.UnavailableError):
+            self.client.getPersonalIdByCardNo(1001)
+
+        with self.assertRaises(secusys_acs.client.SecusysClient.UnavailableError):
+            self.client.getPersonSecurityGroupsByPersonalId(5001)
+
+#-----------------------------------------------------------------------------------------------------------------------
+    def testHttpErrorRaisesAfterSingleRequest(self):
+        self.server.setErrorRates(1.0, 0.0)
+        requestsCount = self.server.requestsCount
+
+        with self.assertRaises(secusys_acs.client.SecusysClient.UnavailableError):
+            self.client.getPersonalIdByCardNo(1001)
+
+        self.assertEqual(self.server.requestsCount - requestsCount, 1)
+
+#-----------------------------------------------------------------------------------------------------------------------
+    def testNotConnectedRaises(self):
+        self.client.disconnect()
+        self.assertFalse(self.client.isAvailable)
+
+        with self.assertRaises(secusys_acs.client.SecusysClient.UnavailableError):
+            self.client.getPersonalIdByCardNo(1001)
+
+#-----------------------------------------------------------------------------------------------------------------------
+    def testBreakerOpensAndRejectsWithoutCalling(self):
+        self.client = self.createClient(breakerFailureThreshold = 2, breakerResetTimeout = 60.0)
+        self.server.setErrorRates(0.0, 1.0)
+
+        for _ in range(2):
+            with self.assertRaises(secusys_acs.client.SecusysClient.UnavailableError):
+                self.client.getPersonalIdByCardNo(1001)
+
+        self.assertFalse(self.client.isAvailable)
+        requestsCount = self.server.requestsCount
+
+        with self.assertRaises(secusys_acs.client.SecusysClient.UnavailableError):
+            self.client.getPersonalIdByCardNo(1001)
+
+        self.assertEqual(self.server.requestsCount, requestsCount)
+
+#-----------------------------------------------------------------------------------------------------------------------
+    def testBreakerHalfOpenProbe(self):
+        self.client = self.createClient(breakerFailureThreshold = 1, breakerResetTimeout = 0.2)
+        self.server.setErrorRates(1.0, 0.0)
+
+        with self.assertRaises(secusys_acs.client.SecusysClient.UnavailableError):
+            self.client.getPersonalIdByCardNo(1001)
+
+        self.assertFalse(self.client.isAvailable)
+        time.sleep(0.3)
+
+        # Half open, callers gating on isAvailable still make the probe, a failed probe opens the breaker again
+        self.assertTrue(self.client.isAvailable)
+
+        with self.assertRaises(secusys_acs.client.SecusysClient.UnavailableError):
+            self.client.getPersonalIdByCardNo(1001)
+
+        self.assertFalse(self.client.isAvailable)
+        time.sleep(0.3)
+
+        # A successful probe closes it
+        self.server.setErrorRates(0.0, 0.0)
+        self.assertEqual(self.client.getPersonalIdByCardNo(1001), 5001)
+        self.assertTrue(self.client.isAvailable)
+        self.assertEqual(self.client.getPersonalIdByCardNo(1002), 5002)
+
+#======================================================================================================================
+class SecusysClientFastPathTest(SecusysClientTest):
+    """ Same tests through the fast path, which must not re-issue a failed request through zeep
+    """
+
+    FAST_PATH = True
+
+#======================================================================================================================
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,59 @@
+import json
+import logging
+import os
+import shutil
+import tempfile
+import time
+import unittest
+
+import metrics.tracing
+
+#======================================================================================================================
+class TracerTest(unittest.TestCase):
+
+#-----------------------------------------------------------------------------------------------------------------------
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.sinkPath = os.path.join(self.directory, 'traces.jsonl')
+
+#-----------------------------------------------------------------------------------------------------------------------
+    def tearDown(self):
+        shutil.rmtree(self.directory, ignore_errors = True)
+
+#-----------------------------------------------------------------------------------------------------------------------
+    def readTraces(self, filePath):
+        with open(filePath) as f:
+            return [json.loads(x) for x in f]
+
+#-----------------------------------------------------------------------------------------------------------------------
+    def testSlowTracesAreAlwaysWritten(self):
+        tracer = metrics.tracing.Tracer(logging.getLogger('tests'), self.sinkPath, 0.0, 0.05)
+        tracer.startTrace('fast').finish()
+        tracer.startTrace('slow', time.perf_counter() - 0.1).finish()
+        tracer.close()
+
+        self.assertEqual([x['name'] for x in self.readTraces(self.sinkPath)], ['slow'])
+
+#-----------------------------------------------------------------------------------------------------------------------
+    def testSinkIsRotatedBySize(self):
+        tracer = metrics.tracing.Tracer(logging.getLogger('tests'), self.sinkPath, 1.0, 0.0, sinkMaxBytes = 1024)
+
+        for i in range(200):
+            tracer.startTrace('swipe', index = i).finish()
+
+        tracer.close()
+        backupPaths = ['%s.%s' % (self.sinkPath, i) for i in range(1, 4)]
+
+        for filePath in [self.sinkPath] + backupPaths:
+            self.assertLess(os.path.getsize(filePath), 2048)
+
+        self.assertFalse(os.path.exists(self.sinkPath + '.4'))
+
+        # The latest traces are kept, in order across the backups
+        indexes = [x['attributes']['index'] for filePath in backupPaths[::-1] + [self.sinkPath] 
+                   for x in self.readTraces(filePath)]
+        self.assertEqual(indexes, list(range(200 - len(indexes), 200)))
+
+#======================================================================================================================
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,348 @@
+""" Synthetic DDS load generator, simulating DESs and their DECs against a bridge over loopback.
+
+Each simulated DES sends heartbeats, DEC online status changes and credential swipes on behalf of its DECs, ACKs every
+packet the bridge sends and measures the time from a swipe to the matching AuthorizedDefaultFloorV2. Ramping the swipe
+rate finds the highest rate the bridge sustains within a p99 latency SLO.
+
+DES i uses the address 127.<i+1>.0.1 and its DECs 127.<i+1>.<subnet>.<decId>, so the bridge must listen on a loopback
+address (DDS.localIp = 127.0.0.1) and the ports below must match its DDS configuration.
+
+Example:
+    python dds_load_generator.py --des 4 --decs 64 --ramp 50,50,1000 --step-duration 10 --slo-p99-ms 300
+"""
+import argparse
+import collections
+import os
+import random
+import select
+import socket
+import struct
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.realpath(__file__)), os.path.pardir, 'src'))
+
+from otis_dds import packets
+
+#======================================================================================================================
+def percentile(sortedValues, ratio):
+    if not sortedValues:
+        return 0.0
+
+    return sortedValues[min(len(sortedValues) - 1, int(ratio * len(sortedValues)))]
+
+#======================================================================================================================
+class SimulatedDes:
+
+#-----------------------------------------------------------------------------------------------------------------------
+    def __init__(self, index, decsCount, decSubnetId, interactivePort, rng):
+        """ C'tor
+        Params:
+            index: DES index, selects its loopback address
+            decsCount: Amount of DECs behind the DES (up to 256)
+            decSubnetId: Subnet ID of the DECs
+            interactivePort: Bridge interactive DEC receive port, the DES sends from the same port
+            rng: random.Random to draw from
+        """
+        self.ip = '127.%s.0.1' % (index + 1)
+        self.decSubnetId = decSubnetId
+        self.decsCount = decsCount
+        self.onlineDecMap = [0] * 256
+        self.rng = rng
+
+        self.heartbeatSocket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.heartbeatSocket.bind((self.ip, 0))
+
+        self.interactiveSocket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.interactiveSocket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.interactiveSocket.bind((self.ip, interactivePort))
+
+#-----------------------------------------------------------------------------------------------------------------------
+    def setAllDecsOnline(self):
+        self.onlineDecMap = [1 if x < self.decsCount else 0 for x in range(256)]
+
+#-----------------------------------------------------------------------------------------------------------------------
+    def toggleRandomDec(self):
+        decId = self.rng.randrange(self.decsCount)
+        self.onlineDecMap[decId] = 1 - self.onlineDecMap[decId]
+
+#-----------------------------------------------------------------------------------------------------------------------
+    def randomOnlineDec(self):
+        onlineDecs = [x for x in range(self.decsCount) if self.onlineDecMap[x]]
+
+        return self.rng.choice(onlineDecs) if onlineDecs else None
+
+#-----------------------------------------------------------------------------------------------------------------------
+    def close(self):
+        self.heartbeatSocket.close()
+        self.interactiveSocket.close()
+
+#======================================================================================================================
+class LoadGenerator:
+
+    __ACK_TYPE = packets._PacketInteractiveAck.TYPE
+    __AUTHORIZED_TYPE = packets._PacketInteractiveDecSecurityAutorizedDefaultFloorV2.TYPE
+    __CREDENTIAL_OFFSET = 7 # Packet ID, type and valid flag precede the credential number
+
+#-----------------------------------------------------------------------------------------------------------------------
+    def __init__(self, args):
+        self.__args = args
+        self.__rng = random.Random(args.seed)
+        self.__idAllocator = packets._IdAllocator()
+        self.__credentialBytes = (args.card_bits + 7) // 8
+        self.__dess = [SimulatedDes(i, args.decs, args.dec_subnet, args.interactive_port,
+                                    random.Random(self.__rng.random())) for i in range(args.des)]
+
+        self.__responseSocket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.__responseSocket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.__responseSocket.bind(('0.0.0.0', args.response_port))
+
+        self.__lock = threading.Lock()
+        self.__pendingSwipes = collections.defaultdict(collections.deque) # Credential to (send time, DES)
+        self.__latencies = []
+        self.__received = collections.Counter()
+        self.__shouldRun = True
+        self.__daemons = []
+
+#-----------------------------------------------------------------------------------------------------------------------
+    def start(self):
+        for target in (self.__receiveLoop, self.__heartbeatLoop, self.__onlineStatusLoop):
+            daemon = threading.Thread(target = target, daemon = True)
+            daemon.start()
+            self.__daemons.append(daemon)
+
+        # Let the bridge discover the DESs before their DECs come online
+        time.sleep(self.__args.heartbeat_interval * 2)
+
+        for des in self.__dess:
+            des.setAllDecsOnline()
+            self.__sendOnlineStatus(des)
+
+        time.sleep(0.5)
+
+#-----------------------------------------------------------------------------------------------------------------------
+    def stop(self):
+        self.__shouldRun = False
+
+        for daemon in self.__daemons:
+            daemon.join()
+
+        for des in self.__dess:
+            des.close()
+
+        self.__responseSocket.close()
+
+#-----------------------------------------------------------------------------------------------------------------------
+    def runStep(self, rate, duration):
+        """ Swipe at a constant rate
+        Params:
+            rate: Swipes per second across all DESs
+            duration: Seconds to swipe for
+        Return: (sent, answered, sorted latencies) where swipes not answered within the timeout are inf
+        """
+        with self.__lock:
+            self.__pendingSwipes.clear()
+            self.__latencies = []
+
+        sent = 0
+        ticks = 0
+        startTime = time.monotonic()
+        interval = 1.0 / rate
+
+        while time.monotonic() - startTime < duration:
+            delay = startTime + ticks * interval - time.monotonic()
+            ticks = ticks + 1
+
+            if delay > 0:
+                time.sleep(delay)
+
+            # A tick is skipped if the drawn DES has no online DECs
+            if self.__sendSwipe():
+                sent = sent + 1
+
+        # Give in-flight swipes up to the timeout, then count what is left as lost
+        deadline = time.monotonic() + self.__args.timeout
+
+        while time.monotonic() < deadline:
+            with self.__lock:
+                if not any(self.__pendingSwipes.values()):
+                    break
+
+            time.sleep(0.01)
+
+        with self.__lock:
+            latencies = [x for x in self.__latencies if x <= self.__args.timeout]
+            answered = len(latencies)
+            latencies.extend([float('inf')] * (sent - answered))
+
+        return sent, answered, sorted(latencies)
+
+#-----------------------------------------------------------------------------------------------------------------------
+    @property
+    def received(self):
+        return dict(self.__received)
+
+#-----------------------------------------------------------------------------------------------------------------------
+    def __sendSwipe(self):
+        des = self.__rng.choice(self.__dess)
+        decId = des.randomOnlineDec()
+
+        if decId is None:
+            return False
+
+        cardNo = self.__rng.randint(1, self.__args.cards)
+        credential = cardNo.to_bytes(self.__credentialBytes, 'little')
+        packet = packets._PacketInteractiveDecSecurityCredentialData(self.__idAllocator.allocate(), des.decSubnetId,
+                                                                     decId, self.__args.card_bits, credential)
+
+        with self.__lock:
+            self.__pendingSwipes[credential].append((time.perf_counter(), des))
+
+        des.interactiveSocket.sendto(packet.packed(), (self.__args.bridge_ip, self.__args.interactive_port))
+
+        return True
+
+#-----------------------------------------------------------------------------------------------------------------------
+    def __sendOnlineStatus(self, des):
+        packet = packets._PacketInteractiveDecOnlineStatus(self.__idAllocator.allocate(), des.decSubnetId,
+                                                           list(des.onlineDecMap))
+        des.interactiveSocket.sendto(packet.packed(), (self.__args.bridge_ip, self.__args.interactive_port))
+
+#-----------------------------------------------------------------------------------------------------------------------
+    def __heartbeatLoop(self):
+        heartbeat = packets._PacketHeartbeat(packets._PacketHeartbeat.SourceType.DES, 3, 0, 3, 0).packed()
+        target = (self.__args.heartbeat_group or self.__args.bridge_ip, self.__args.heartbeat_port)
+
+        while self.__shouldRun:
+            for des in self.__dess:
+                des.heartbeatSocket.sendto(heartbeat, target)
+
+            time.sleep(self.__args.heartbeat_interval)
+
+#-----------------------------------------------------------------------------------------------------------------------
+    def __onlineStatusLoop(self):
+        interval = self.__args.online_status_interval
+
+        if interval <= 0:
+            return
+
+        while self.__shouldRun:
+            time.sleep(interval)
+            des = self.__rng.choice(self.__dess)
+            des.toggleRandomDec()
+            self.__sendOnlineStatus(des)
+
+#-----------------------------------------------------------------------------------------------------------------------
+    def __receiveLoop(self):
+        sockets = [self.__responseSocket] + [x.interactiveSocket for x in self.__dess]
+
+        while self.__shouldRun:
+            readable, _, _ = select.select(sockets, [], [], 0.05)
+
+            for udpSocket in readable:
+                try:
+                    data, bridgeTuple = udpSocket.recvfrom(4096)
+                except OSError:
+                    continue
+
+                if len(data) < 6:
+                    continue
+
+                receiveTime = time.perf_counter()
+                packetId, packetType = struct.unpack_from('IH', data)
+
+                if packetType == self.__ACK_TYPE and len(data) == 12:
+                    self.__received['Ack'] += 1
+                    continue
+
+                self.__received['0x%02x' % packetType] += 1
+                dess = self.__dess
+
+                if packetType == self.__AUTHORIZED_TYPE:
+                    credential = data[self.__CREDENTIAL_OFFSET:self.__CREDENTIAL_OFFSET + self.__credentialBytes]
+
+                    with self.__lock:
+                        pending = self.__pendingSwipes.get(credential, None)
+
+                        if pending:
+                            sendTime, des = pending.popleft()
+                            self.__latencies.append(receiveTime - sendTime)
+                            dess = [des]
+
+                # The bridge only accepts ACKs from the DES of the destination DEC. Its address isn't known for
+                # packets other than swipe answers (the response socket is bound to any address), so those are ACKed
+                # by every DES and ignored by the bridge reactors that didn't send them
+                ackPacked = packets._PacketInteractiveAck(packetId, 
+                                                          packets._PacketInteractiveAck.AckType.Acceptable).packed()
+
+                for des in dess:
+                    des.interactiveSocket.sendto(ackPacked, bridgeTuple)
+
+#======================================================================================================================
+def main():
+    parser = argparse.ArgumentParser(description = 'Synthetic multi DES/DEC load generator')
+    parser.add_argument('--bridge-ip', default = '127.0.0.1')
+    parser.add_argument('--heartbeat-port', type = int, default = 47307, help = 'Bridge DDS.heartbeatReceivePort')
+    parser.add_argument('--heartbeat-group', help = 'Send heartbeats to this multicast group instead of the bridge IP')
+    parser.add_argument('--heartbeat-interval', type = float, default = 1.0)
+    parser.add_argument('--interactive-port', type = int, default = 46308, help = 'Bridge DDS.interactiveReceivePortDec')
+    parser.add_argument('--response-port', type = int, default = 45308, help = 'Bridge DDS.interactiveSendPortDec')
+    parser.add_argument('--des', type = int, default = 1, help = 'Amount of simulated DESs')
+    parser.add_argument('--decs', type = int, default = 16, help = 'Amount of DECs per DES (up to 256)')
+    parser.add_argument('--dec-subnet', type = int, default = 1)
+    parser.add_argument('--cards', type = int, default = 1000, help = 'Card numbers are drawn from 1 to this value')
+    parser.add_argument('--card-bits', type = int, default = 24)
+    parser.add_argument('--online-status-interval', type = float, default = 0.0,
+                        help = 'Seconds between random DEC online status changes, 0 to disable')
+    parser.add_argument('--rate', type = float, default = 10.0, help = 'Swipes per second, ignored when ramping')
+    parser.add_argument('--ramp', help = 'start,step,max swipes per second, stops at the first step breaking the SLO')
+    parser.add_argument('--step-duration', type = float, default = 10.0, help = 'Seconds per rate step')
+    parser.add_argument('--slo-p99-ms', type = float, default = 500.0, help = 'p99 swipe latency SLO')
+    parser.add_argument('--timeout', type = float, default = 2.0, help = 'Seconds after which a swipe is lost')
+    parser.add_argument('--seed', type = int)
+    args = parser.parse_args()
+
+    if not 1 <= args.decs <= 256:
+        parser.error("--decs must be between 1 and 256")
+
+    if not 1 <= args.des <= 254:
+        parser.error("--des must be between 1 and 254")
+
+    rates = [args.rate]
+
+    if args.ramp:
+        start, step, maximum = (float(x) for x in args.ramp.split(','))
+        rates = []
+
+        while start <= maximum:
+            rates.append(start)
+            start = start + step
+
+    generator = LoadGenerator(args)
+    generator.start()
+    sustained = None
+
+    try:
+        for rate in rates:
+            sent, answered, latencies = generator.runStep(rate, args.step_duration)
+            p99 = percentile(latencies, 0.99)
+            isWithinSlo = sent > 0 and p99 * 1000 <= args.slo_p99_ms
+
+            print("rate=%.1f/s sent=%s answered=%s p50=%.2fms p90=%.2fms p99=%.2fms slo=%s" %
+                  (rate, sent, answered, percentile(latencies, 0.5) * 1000, percentile(latencies, 0.9) * 1000,
+                   p99 * 1000, 'ok' if isWithinSlo else 'broken'))
+
+            if not isWithinSlo:
+                break
+
+            sustained = rate
+
+    finally:
+        generator.stop()
+
+    print("received: %s" % generator.received)
+    print("sustained=%s" % ('%.1f/s' % sustained if sustained is not None else 'none'))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,211 @@
+""" Replays a DDS capture (recorded by the bridge when DDS.capturePath is set) into a bridge over loopback.
+
+Datagrams the bridge had received are re-sent from the same peer ports, with peer IPs moved to the loopback range by
+replacing their first octet (so 192.168.1.17 becomes 127.168.1.17 and DES subnets stay apart). Packets the bridge
+sends are ACKed, captured ACKs are skipped as their packet IDs belong to the original run.
+
+Example:
+    python dds_replay.py capture.bin --speed 10
+"""
+import argparse
+import collections
+import os
+import select
+import socket
+import struct
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.realpath(__file__)), os.path.pardir, 'src'))
+
+from otis_dds import capture
+from otis_dds import packets
+
+#======================================================================================================================
+def percentile(sortedValues, ratio):
+    if not sortedValues:
+        return 0.0
+
+    return sortedValues[min(len(sortedValues) - 1, int(ratio * len(sortedValues)))]
+
+#======================================================================================================================
+class Replayer:
+
+    __ACK_TYPE = packets._PacketInteractiveAck.TYPE
+    __ACK_SIZE = struct.calcsize('IHI')
+
+#-----------------------------------------------------------------------------------------------------------------------
+    def __init__(self, records, bridgeIp, peerPrefix, speed, autoAck):
+        """ C'tor
+        Params:
+            records: List of CaptureRecords
+            bridgeIp: IP address of the bridge under test
+            peerPrefix: First octet to move peer IPs to, None to keep them as captured
+            speed: Replay speed factor, 0 for as fast as possible
+            autoAck: ACK packets sent by the bridge
+        """
+        self.__bridgeIp = bridgeIp
+        self.__peerPrefix = peerPrefix
+        self.__speed = speed
+        self.__autoAck = autoAck
+        self.__records = [x for x in records if self.__isReplayed(x)]
+        self.__sockets = {}
+        self.__sendTimes = {}
+        self.__lock = threading.Lock()
+        self.__shouldRun = True
+        self.__latencies = []
+        self.__received = collections.Counter()
+        self.__sent = collections.Counter()
+
+        # Every peer endpoint seen in either direction gets a socket, the bridge answers on its configured send ports
+        for record in records:
+            if record.channel != capture.CaptureChannel.HeartbeatSend:
+                self.__getSocket(self.__mapPeer(record.peerTuple))
+
+#-----------------------------------------------------------------------------------------------------------------------
+    def run(self, drainTime):
+        receiver = threading.Thread(target = self.__receiveLoop, daemon = True)
+        receiver.start()
+        startTime = time.monotonic()
+
+        for record in self.__records:
+            if self.__speed > 0:
+                delay = startTime + record.time / self.__speed - time.monotonic()
+
+                if delay > 0:
+                    time.sleep(delay)
+
+            peerTuple = self.__mapPeer(record.peerTuple)
+
+            if record.channel != capture.CaptureChannel.HeartbeatReceive and len(record.data) >= 6:
+                packetId = struct.unpack_from('I', record.data)[0]
+
+                with self.__lock:
+                    self.__sendTimes[(peerTuple[0], packetId)] = time.perf_counter()
+
+            self.__getSocket(peerTuple).sendto(record.data, (self.__bridgeIp, record.localPort))
+            self.__sent[record.channel.name] += 1
+
+        elapsed = time.monotonic() - startTime
+        time.sleep(drainTime)
+        self.__shouldRun = False
+        receiver.join()
+
+        for udpSocket in self.__sockets.values():
+            udpSocket.close()
+
+        return elapsed
+
+#-----------------------------------------------------------------------------------------------------------------------
+    def report(self, elapsed):
+        latencies = sorted(self.__latencies)
+        capturedTime = self.__records[-1].time if self.__records else 0.0
+
+        print("replayed=%s captured=%.3fs elapsed=%.3fs rate=%.1f/s" % (len(self.__records), capturedTime, elapsed,
+                                                                       len(self.__records) / max(elapsed, 1e-9)))
+        print("sent: %s" % dict(self.__sent))
+        print("received: %s" % dict(self.__received))
+        print("ack latency ms: count=%s p50=%.2f p90=%.2f p99=%.2f max=%.2f" % (len(latencies),
+                                                                                percentile(latencies, 0.5) * 1000,
+                                                                                percentile(latencies, 0.9) * 1000,
+                                                                                percentile(latencies, 0.99) * 1000,
+                                                                                latencies[-1] * 1000 if latencies else 0.0))
+
+#-----------------------------------------------------------------------------------------------------------------------
+    def __isReplayed(self, record):
+        if record.direction != capture.CaptureDirection.In:
+            return False
+
+        if record.channel == capture.CaptureChannel.HeartbeatReceive:
+            return True
+
+        # Captured ACKs answer packets of the original run, ACKs for this run are generated by the receive loop
+        return not (self.__autoAck and len(record.data) >= 6 and struct.unpack_from('H', record.data, 4)[0] ==
+                    self.__ACK_TYPE)
+
+#-----------------------------------------------------------------------------------------------------------------------
+    def __mapPeer(self, peerTuple):
+        if self.__peerPrefix is None:
+            return peerTuple
+
+        return ('%s.%s' % (self.__peerPrefix, peerTuple[0].split('.', 1)[1]), peerTuple[1])
+
+#-----------------------------------------------------------------------------------------------------------------------
+    def __getSocket(self, peerTuple):
+        udpSocket = self.__sockets.get(peerTuple, None)
+
+        if udpSocket is None:
+            udpSocket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            udpSocket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+            udpSocket.bind(peerTuple)
+            udpSocket.setblocking(False)
+            self.__sockets[peerTuple] = udpSocket
+
+        return udpSocket
+
+#-----------------------------------------------------------------------------------------------------------------------
+    def __receiveLoop(self):
+        sockets = list(self.__sockets.values())
+
+        while self.__shouldRun:
+            readable, _, _ = select.select(sockets, [], [], 0.05)
+
+            for udpSocket in readable:
+                try:
+                    data, bridgeTuple = udpSocket.recvfrom(4096)
+                except OSError:
+                    continue
+
+                if len(data) < 6:
+                    continue
+
+                packetId, packetType = struct.unpack_from('IH', data)
+                peerIp = udpSocket.getsockname()[0]
+
+                if packetType == self.__ACK_TYPE and len(data) == self.__ACK_SIZE:
+                    self.__received['Ack'] += 1
+
+                    with self.__lock:
+                        sendTime = self.__sendTimes.pop((peerIp, packetId), None)
+
+                    if sendTime is not None:
+                        self.__latencies.append(time.perf_counter() - sendTime)
+
+                else:
+                    self.__received['0x%02x' % packetType] += 1
+
+                    if self.__autoAck:
+                        # The bridge expects ACKs from the peer port matching its own receive port of the channel
+                        ackSocket = self.__sockets.get((peerIp, bridgeTuple[1]), udpSocket)
+                        ackSocket.sendto(packets._PacketInteractiveAck(packetId,
+                                         packets._PacketInteractiveAck.AckType.Acceptable).packed(), bridgeTuple)
+
+#======================================================================================================================
+def main():
+    parser = argparse.ArgumentParser(description = 'Replay a DDS capture into a bridge')
+    parser.add_argument('capture', help = 'Capture file path')
+    parser.add_argument('--bridge-ip', default = '127.0.0.1', help = 'IP address the bridge under test listens on')
+    parser.add_argument('--speed', type = float, default = 1.0,
+                        help = 'Replay speed factor, 1 for original timing, 0 for as fast as possible')
+    parser.add_argument('--peer-prefix', default = '127', help = 'First octet to move peer IPs to')
+    parser.add_argument('--keep-peer-ips', action = 'store_true', help = 'Send from the captured peer IPs')
+    parser.add_argument('--no-auto-ack', action = 'store_true', help = 'Replay captured ACKs instead of ACKing')
+    parser.add_argument('--drain', type = float, default = 1.0, help = 'Seconds to wait for replies after replay')
+    args = parser.parse_args()
+
+    if args.speed < 0:
+        parser.error("--speed must be at least 0")
+
+    reader = capture.CaptureReader(args.capture)
+    replayer = Replayer(list(reader),
+                        args.bridge_ip,
+                        None if args.keep_peer_ips else args.peer_prefix,
+                        args.speed,
+                        not args.no_auto_ack)
+
+    elapsed = replayer.run(args.drain)
+    replayer.report(elapsed)
+
+if __name__ == '__main__':
+    main()
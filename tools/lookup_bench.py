@@ -0,0 +1,134 @@
+""" End to end benchmark of the bridge lookup path (Secusys adapter -> SecusysClient -> SOAP) against a Secusys
+server, by default an in-process secusys_stub_server.
+
+Example:
+    python lookup_bench.py --requests 5000 --concurrency 8 --latency uniform:0.005,0.02 --fast-path
+"""
+import argparse
+import logging
+import os
+import random
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.realpath(__file__)), os.path.pardir, 'src'))
+
+import bridge
+import secusys_acs.client
+import secusys_stub_server
+
+#======================================================================================================================
+def percentile(sortedValues, ratio):
+    if not sortedValues:
+        return 0.0
+
+    return sortedValues[min(len(sortedValues) - 1, int(ratio * len(sortedValues)))]
+
+#======================================================================================================================
+def main():
+    srcPath = os.path.join(os.path.dirname(os.path.realpath(__file__)), os.path.pardir, 'src')
+
+    parser = argparse.ArgumentParser(description = 'Bridge lookup path benchmark')
+    parser.add_argument('--wsdl', help = 'Secusys WSDL URL, an in-process stand-in is started if not given')
+    parser.add_argument('--user-name', default = 'administrator')
+    parser.add_argument('--password', default = 'secusys')
+    parser.add_argument('--groups-file', default = os.path.join(srcPath, 'groups.cfg'))
+    parser.add_argument('--cards', type = int, default = 1000, help = 'Card numbers are drawn from 1 to this value')
+    parser.add_argument('--unknown-ratio', type = float, default = 0.0, help = 'Ratio of swipes with unknown cards')
+    parser.add_argument('--requests', type = int, default = 1000)
+    parser.add_argument('--concurrency', type = int, default = 1)
+    parser.add_argument('--latency', default = 'fixed:0', help = 'Stand-in latency distribution')
+    parser.add_argument('--http-error-rate', type = float, default = 0.0)
+    parser.add_argument('--api-error-rate', type = float, default = 0.0)
+    parser.add_argument('--fast-path', action = 'store_true')
+    parser.add_argument('--lookup-budget', type = float, default = 0.0)
+    parser.add_argument('--pipeline-cache-size', type = int, default = 0)
+    parser.add_argument('--seed', type = int, default = 0)
+    args = parser.parse_args()
+
+    logger = logging.getLogger('lookup_bench')
+    logger.addHandler(logging.StreamHandler())
+    logger.setLevel(logging.ERROR)
+
+    server = None
+    wsdl = args.wsdl
+
+    if wsdl is None:
+        fixture = secusys_stub_server.generateFixture(args.cards, ['DDS.LZ', 'DDS.MZ', 'DDS.HZ', 'Other'], args.seed)
+        server = secusys_stub_server.SecusysStubServer(('127.0.0.1', 0),
+                                                       fixture,
+                                                       secusys_stub_server.LatencyDistribution(args.latency, args.seed),
+                                                       args.http_error_rate,
+                                                       args.api_error_rate,
+                                                       args.password,
+                                                       args.seed)
+        threading.Thread(target = server.serve_forever, daemon = True).start()
+        wsdl = server.wsdlUrl
+
+    configuration = secusys_acs.client.SecusysClient.Configuration(userName = args.user_name,
+                                                                   password = args.password,
+                                                                   wsdl = wsdl,
+                                                                   fastPath = args.fast_path)
+    client = secusys_acs.client.SecusysClient(logger, configuration)
+    client.connect()
+
+    adapter = bridge.Bridge._SecuritySystemAdapterSecusys(logger, client, args.groups_file, 'little', 24,
+                                                          args.lookup_budget, 0, args.pipeline_cache_size, 0.0,
+                                                          lookupWorkers = args.concurrency)
+
+    rng = random.Random(args.seed)
+    cardNumbers = [rng.randint(1, args.cards) if rng.random() >= args.unknown_ratio else args.cards + rng.randint(1, 1000)
+                   for _ in range(args.requests)]
+
+    latencies = []
+    latenciesLock = threading.Lock()
+    nextIndex = [0]
+
+    def worker():
+        localLatencies = []
+
+        while True:
+            with latenciesLock:
+                index = nextIndex[0]
+                nextIndex[0] = index + 1
+
+            if index >= len(cardNumbers):
+                break
+
+            credentialData = cardNumbers[index].to_bytes(3, 'little')
+            startTime = time.perf_counter()
+            adapter.getAccessInfo(credentialData, 24)
+            localLatencies.append(time.perf_counter() - startTime)
+
+        with latenciesLock:
+            latencies.extend(localLatencies)
+
+    workers = [threading.Thread(target = worker) for _ in range(args.concurrency)]
+    startTime = time.perf_counter()
+
+    for thread in workers:
+        thread.start()
+
+    for thread in workers:
+        thread.join()
+
+    elapsed = time.perf_counter() - startTime
+    latencies.sort()
+
+    print("requests=%s concurrency=%s elapsed=%.3fs throughput=%.1f/s" % (len(latencies), args.concurrency, elapsed,
+                                                                         len(latencies) / elapsed))
+    print("latency ms: p50=%.2f p90=%.2f p99=%.2f max=%.2f" % (percentile(latencies, 0.5) * 1000,
+                                                                percentile(latencies, 0.9) * 1000,
+                                                                percentile(latencies, 0.99) * 1000,
+                                                                latencies[-1] * 1000 if latencies else 0.0))
+
+    adapter.shutdown()
+    client.disconnect()
+
+    if server is not None:
+        server.shutdown()
+        server.server_close()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,368 @@
+""" Local stand-in for the Secusys SOAP API, serving a WSDL and the two operations used by the bridge
+(GetCardInfos and GetPersonAccessSecurityGroups) from a fixture dataset.
+
+Fixture is a JSON file in the form of:
+    {
+        "cards":   {"<cardNo>": <personalId> | [<personalId>, ...]},
+        "persons": {"<personalId>": ["<security group name>", ...]}
+    }
+A card mapped to a list yields a multiple items response, which the client treats as ambiguous.
+
+Example:
+    python secusys_stub_server.py --port 7070 --generate 10000 --latency lognormal:-4.0,0.5 --api-error-rate 0.01
+"""
+import argparse
+import hashlib
+import http.server
+import json
+import random
+import threading
+import time
+import xml.etree.ElementTree
+import xml.sax.saxutils
+
+#======================================================================================================================
+class LatencyDistribution:
+    """ Response latency distribution parsed from '<kind>:<param>[,<param>]' where kind is one of
+    fixed:seconds, uniform:low,high, normal:mean,sigma, lognormal:mu,sigma, exp:mean
+    """
+
+    __KINDS = {'fixed'     : (1, lambda rng, a: a),
+               'uniform'   : (2, lambda rng, a, b: rng.uniform(a, b)),
+               'normal'    : (2, lambda rng, a, b: rng.normalvariate(a, b)),
+               'lognormal' : (2, lambda rng, a, b: rng.lognormvariate(a, b)),
+               'exp'       : (1, lambda rng, a: rng.expovariate(1.0 / a) if a > 0 else 0.0)}
+
+#-----------------------------------------------------------------------------------------------------------------------
+    def __init__(self, spec, seed = None):
+        kind, _, rawParams = spec.partition(':')
+
+        if kind not in self.__KINDS:
+            raise ValueError("Latency kind must be one of %s. Got '%s'" % (', '.join(self.__KINDS), kind))
+
+        paramsCount, self.__sample = self.__KINDS[kind]
+        self.__params = [float(x) for x in rawParams.split(',')] if rawParams else [0.0]
+
+        if len(self.__params) != paramsCount:
+            raise ValueError("Latency kind '%s' expects %s parameters. Got '%s'" % (kind, paramsCount, rawParams))
+
+        self.__spec = spec
+        self.__random = random.Random(seed)
+        self.__lock = threading.Lock()
+
+#-----------------------------------------------------------------------------------------------------------------------
+    def sample(self):
+        """ Sample a latency in seconds, never negative
+        """
+        with self.__lock:
+            return max(0.0, self.__sample(self.__random, *self.__params))
+
+#-----------------------------------------------------------------------------------------------------------------------
+    def __repr__(self):
+        return self.__spec
+
+#======================================================================================================================
+class SecusysStubServer(http.server.ThreadingHTTPServer):
+
+    NAMESPACE = 'http://tempuri.org/'
+    PATH = '/SecusysWeb/WebService/AccessWS.asmx'
+
+    daemon_threads = True
+
+    __SOAP_NAMESPACE = 'http://schemas.xmlsoap.org/soap/envelope/'
+
+    __WSDL_TEMPLATE = """<?xml version="1.0" encoding="utf-8"?>
+<wsdl:definitions xmlns:soap="http://schemas.xmlsoap.org/wsdl/soap/" xmlns:s="http://www.w3.org/2001/XMLSchema"
+    xmlns:tns="{ns}" xmlns:wsdl="http://schemas.xmlsoap.org/wsdl/" targetNamespace="{ns}">
+  <wsdl:types>
+    <s:schema elementFormDefault="qualified" targetNamespace="{ns}">
+      <s:element name="GetCardInfos">
+        <s:complexType><s:sequence>
+          <s:element minOccurs="0" maxOccurs="1" name="AppKey" type="s:string"/>
+          <s:element minOccurs="0" maxOccurs="1" name="TimeStamp" type="s:string"/>
+          <s:element minOccurs="1" maxOccurs="1" name="PersonnalID" type="s:int"/>
+          <s:element minOccurs="0" maxOccurs="1" name="CardNo" type="s:string"/>
+          <s:element minOccurs="0" maxOccurs="1" name="ValidCode" type="s:string"/>
+        </s:sequence></s:complexType>
+      </s:element>
+      <s:element name="GetCardInfosResponse">
+        <s:complexType><s:sequence>
+          <s:element minOccurs="0" maxOccurs="1" name="GetCardInfosResult" type="s:string"/>
+        </s:sequence></s:complexType>
+      </s:element>
+      <s:element name="GetPersonAccessSecurityGroups">
+        <s:complexType><s:sequence>
+          <s:element minOccurs="0" maxOccurs="1" name="AppKey" type="s:string"/>
+          <s:element minOccurs="0" maxOccurs="1" name="TimeStamp" type="s:string"/>
+          <s:element minOccurs="1" maxOccurs="1" name="PersonnalID" type="s:int"/>
+          <s:element minOccurs="0" maxOccurs="1" name="ValidCode" type="s:string"/>
+        </s:sequence></s:complexType>
+      </s:element>
+      <s:element name="GetPersonAccessSecurityGroupsResponse">
+        <s:complexType><s:sequence>
+          <s:element minOccurs="0" maxOccurs="1" name="GetPersonAccessSecurityGroupsResult" type="s:string"/>
+        </s:sequence></s:complexType>
+      </s:element>
+    </s:schema>
+  </wsdl:types>
+  <wsdl:message name="GetCardInfosSoapIn"><wsdl:part name="parameters" element="tns:GetCardInfos"/></wsdl:message>
+  <wsdl:message name="GetCardInfosSoapOut"><wsdl:part name="parameters" element="tns:GetCardInfosResponse"/></wsdl:message>
+  <wsdl:message name="GetPersonAccessSecurityGroupsSoapIn">
+    <wsdl:part name="parameters" element="tns:GetPersonAccessSecurityGroups"/>
+  </wsdl:message>
+  <wsdl:message name="GetPersonAccessSecurityGroupsSoapOut">
+    <wsdl:part name="parameters" element="tns:GetPersonAccessSecurityGroupsResponse"/>
+  </wsdl:message>
+  <wsdl:portType name="AccessWSSoap">
+    <wsdl:operation name="GetCardInfos">
+      <wsdl:input message="tns:GetCardInfosSoapIn"/><wsdl:output message="tns:GetCardInfosSoapOut"/>
+    </wsdl:operation>
+    <wsdl:operation name="GetPersonAccessSecurityGroups">
+      <wsdl:input message="tns:GetPersonAccessSecurityGroupsSoapIn"/>
+      <wsdl:output message="tns:GetPersonAccessSecurityGroupsSoapOut"/>
+    </wsdl:operation>
+  </wsdl:portType>
+  <wsdl:binding name="AccessWSSoap" type="tns:AccessWSSoap">
+    <soap:binding transport="http://schemas.xmlsoap.org/soap/http"/>
+    <wsdl:operation name="GetCardInfos">
+      <soap:operation soapAction="{ns}GetCardInfos" style="document"/>
+      <wsdl:input><soap:body use="literal"/></wsdl:input><wsdl:output><soap:body use="literal"/></wsdl:output>
+    </wsdl:operation>
+    <wsdl:operation name="GetPersonAccessSecurityGroups">
+      <soap:operation soapAction="{ns}GetPersonAccessSecurityGroups" style="document"/>
+      <wsdl:input><soap:body use="literal"/></wsdl:input><wsdl:output><soap:body use="literal"/></wsdl:output>
+    </wsdl:operation>
+  </wsdl:binding>
+  <wsdl:service name="AccessWS">
+    <wsdl:port name="AccessWSSoap" binding="tns:AccessWSSoap"><soap:address location="{address}"/></wsdl:port>
+  </wsdl:service>
+</wsdl:definitions>
+"""
+
+    __ENVELOPE_TEMPLATE = ('<?xml version="1.0" encoding="utf-8"?>'
+                           '<soap:Envelope xmlns:soap="http://schemas.xmlsoap.org/soap/envelope/">'
+                           '<soap:Body><{method}Response xmlns="{ns}"><{method}Result>{result}</{method}Result>'
+                           '</{method}Response></soap:Body></soap:Envelope>')
+
+#-----------------------------------------------------------------------------------------------------------------------
+    class _RequestHandler(http.server.BaseHTTPRequestHandler):
+
+        protocol_version = 'HTTP/1.1'
+
+        def do_GET(self):
+            if self.path.split('?')[0] != self.server.PATH:
+                self.__reply(404, b'', 'text/plain')
+            else:
+                self.__reply(200, self.server.wsdl.encode('utf-8'), 'text/xml; charset=utf-8')
+
+        def do_POST(self):
+            payload = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+            status, body = self.server._handleSoapRequest(payload)
+            self.__reply(status, body, 'text/xml; charset=utf-8')
+
+        def log_message(self, format, *args):
+            if self.server.verbose:
+                super().log_message(format, *args)
+
+        def __reply(self, status, body, contentType):
+            self.send_response(status)
+            self.send_header('Content-Type', contentType)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+#-----------------------------------------------------------------------------------------------------------------------
+    def __init__(self, serverAddress, fixture, latency, httpErrorRate = 0.0, apiErrorRate = 0.0, password = None,
+                 seed = None, verbose = False):
+        """ C'tor
+        Params:
+            serverAddress: (host, port) tuple to listen on
+            fixture: Fixture dataset dictionary, see module documentation
+            latency: LatencyDistribution applied to every SOAP call
+            httpErrorRate: Probability of replying with an HTTP 500 instead of a SOAP response
+            apiErrorRate: Probability of replying with a Secusys API error code
+            password: If given, ValidCode of every request is verified against it
+            seed: Random seed for reproducible runs
+            verbose: Log every HTTP request
+        """
+        super().__init__(serverAddress, self._RequestHandler)
+
+        self.verbose = verbose
+        self.wsdl = self.__WSDL_TEMPLATE.format(ns = self.NAMESPACE, address = self.endpoint)
+        self.__cards = {int(k): v for k, v in fixture.get('cards', {}).items()}
+        self.__persons = {int(k): v for k, v in fixture.get('persons', {}).items()}
+        self.__latency = latency
+        self.__httpErrorRate = httpErrorRate
+        self.__apiErrorRate = apiErrorRate
+        self.__password = password
+        self.__random = random.Random(seed)
+        self.__randomLock = threading.Lock()
+        self.__requestsCount = 0
+        self.__handlers = {'GetCardInfos' : self.__handleGetCardInfos,
+                           'GetPersonAccessSecurityGroups' : self.__handleGetPersonAccessSecurityGroups}
+
+#-----------------------------------------------------------------------------------------------------------------------
+    @property
+    def endpoint(self):
+        return 'http://%s:%s%s' % (self.server_address[0], self.server_address[1], self.PATH)
+
+#-----------------------------------------------------------------------------------------------------------------------
+    @property
+    def wsdlUrl(self):
+        return self.endpoint + '?WSDL'
+
+#-----------------------------------------------------------------------------------------------------------------------
+    @property
+    def requestsCount(self):
+        """ Amount of SOAP requests received, WSDL loads excluded
+        """
+        return self.__requestsCount
+
+#-----------------------------------------------------------------------------------------------------------------------
+    def setErrorRates(self, httpErrorRate, apiErrorRate):
+        """ Change the injected error rates while serving, e.g. to simulate an outage
+        Params:
+            httpErrorRate: Probability of replying with an HTTP 500 instead of a SOAP response
+            apiErrorRate: Probability of replying with a Secusys API error code
+        """
+        with self.__randomLock:
+            self.__httpErrorRate = httpErrorRate
+            self.__apiErrorRate = apiErrorRate
+
+#-----------------------------------------------------------------------------------------------------------------------
+    def _handleSoapRequest(self, payload):
+        time.sleep(self.__latency.sample())
+
+        with self.__randomLock:
+            self.__requestsCount = self.__requestsCount + 1
+            isHttpError = self.__random.random() < self.__httpErrorRate
+            isApiError = self.__random.random() < self.__apiErrorRate
+
+        if isHttpError:
+            return (500, b'')
+
+        try:
+            envelope = xml.etree.ElementTree.fromstring(payload)
+            operation = envelope.find('{%s}Body' % self.__SOAP_NAMESPACE)[0]
+            methodName = operation.tag.split('}')[-1]
+            fields = {x.tag.split('}')[-1]: (x.text or '') for x in operation}
+            handler = self.__handlers[methodName]
+
+        except Exception:
+            return (500, b'')
+
+        if isApiError:
+            result = self.__renderResult(methodName, -99, 'Stub injected error', [])
+
+        elif self.__password is not None and not self.__isValidCode(fields):
+            result = self.__renderResult(methodName, -2, 'Invalid ValidCode', [])
+
+        else:
+            result = handler(methodName, fields)
+
+        body = self.__ENVELOPE_TEMPLATE.format(method = methodName, ns = self.NAMESPACE,
+                                               result = xml.sax.saxutils.escape(result))
+
+        return (200, body.encode('utf-8'))
+
+#-----------------------------------------------------------------------------------------------------------------------
+    def __handleGetCardInfos(self, methodName, fields):
+        personalIds = self.__cards.get(int(fields.get('CardNo') or 0), None)
+
+        if personalIds is None:
+            return self.__renderResult(methodName, -1, 'No data', [])
+
+        if not isinstance(personalIds, list):
+            personalIds = [personalIds]
+
+        return self.__renderResult(methodName, 0, '',
+                                   [(('PersonnalID', x), ('CardNo', fields.get('CardNo'))) for x in personalIds])
+
+#-----------------------------------------------------------------------------------------------------------------------
+    def __handleGetPersonAccessSecurityGroups(self, methodName, fields):
+        groups = self.__persons.get(int(fields.get('PersonnalID') or 0), None)
+
+        if not groups:
+            return self.__renderResult(methodName, -1, 'No data', [])
+
+        return self.__renderResult(methodName, 0, '', [(('SecurityGroupName', x),) for x in groups])
+
+#-----------------------------------------------------------------------------------------------------------------------
+    def __isValidCode(self, fields):
+        expected = hashlib.md5((fields.get('TimeStamp', '') + self.__password).encode('utf-8')).hexdigest()
+
+        return fields.get('ValidCode', '') == expected
+
+#-----------------------------------------------------------------------------------------------------------------------
+    def __renderResult(self, methodName, errorCode, errorMessage, items):
+        escape = xml.sax.saxutils.escape
+        body = ''.join('<Item>%s</Item>' % ''.join('<%s>%s</%s>' % (k, escape(str(v)), k) for k, v in item)
+                       for item in items)
+
+        return ('<Integration><%s><Head><ErrCode>%s</ErrCode><ErrMsg>%s</ErrMsg></Head><Body>%s</Body></%s>'
+                '</Integration>' % (methodName, errorCode, escape(errorMessage), body, methodName))
+
+#======================================================================================================================
+def generateFixture(cardsCount, groups, seed = None):
+    """ Generate a synthetic fixture
+    Params:
+        cardsCount: Amount of cards, numbered from 1, each owned by a distinct person
+        groups: List of security group names to randomly assign from
+        seed: Random seed
+    Return: Fixture dictionary
+    """
+    rng = random.Random(seed)
+    cards = {}
+    persons = {}
+
+    for cardNo in range(1, cardsCount + 1):
+        personalId = 100000 + cardNo
+        cards[str(cardNo)] = personalId
+        persons[str(personalId)] = rng.sample(groups, rng.randint(1, len(groups)))
+
+    return {'cards': cards, 'persons': persons}
+
+#======================================================================================================================
+def main():
+    parser = argparse.ArgumentParser(description = 'Local Secusys SOAP API stand-in')
+    parser.add_argument('--host', default = '127.0.0.1')
+    parser.add_argument('--port', type = int, default = 7070)
+    parser.add_argument('--fixture', help = 'Fixture JSON file path')
+    parser.add_argument('--generate', type = int, default = 0, help = 'Generate a fixture with this amount of cards')
+    parser.add_argument('--groups', default = 'DDS.LZ,DDS.MZ,DDS.HZ,Other',
+                        help = 'Comma separated groups for generated fixtures')
+    parser.add_argument('--latency', default = 'fixed:0', help = 'Latency distribution, e.g. uniform:0.01,0.05')
+    parser.add_argument('--http-error-rate', type = float, default = 0.0)
+    parser.add_argument('--api-error-rate', type = float, default = 0.0)
+    parser.add_argument('--password', help = 'Verify ValidCode against this password')
+    parser.add_argument('--seed', type = int)
+    parser.add_argument('--verbose', action = 'store_true')
+    args = parser.parse_args()
+
+    if args.fixture:
+        with open(args.fixture) as fixtureFile:
+            fixture = json.load(fixtureFile)
+    else:
+        fixture = generateFixture(args.generate, args.groups.split(','), args.seed)
+
+    server = SecusysStubServer((args.host, args.port),
+                               fixture,
+                               LatencyDistribution(args.latency, args.seed),
+                               args.http_error_rate,
+                               args.api_error_rate,
+                               args.password,
+                               args.seed,
+                               args.verbose)
+
+    print("Serving Secusys stand-in: wsdl=%s cards=%s latency=%s" % (server.wsdlUrl, len(fixture.get('cards', {})),
+                                                                     args.latency))
+
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+if __name__ == '__main__':
+    main()